@@ -0,0 +1,152 @@
+import json
+import logging
+import sqlite3
+import threading
+import time as time_module
+from collections import OrderedDict
+
+from attendance_record import AttendanceReport
+
+logger = logging.getLogger(__name__)
+
+
+class CachedAttendance:
+    """A cache lookup result, `data` is an AttendanceReport"""
+
+    __slots__ = ('data', 'fetched_at', 'fresh')
+
+    def __init__(self, data, fetched_at, fresh):
+        self.data = data
+        self.fetched_at = fetched_at
+        self.fresh = fresh
+
+    @property
+    def age(self):
+        return time_module.time() - self.fetched_at
+
+
+class AttendanceCache:
+    """Bounded LRU attendance cache persisted to SQLite
+
+    Entries younger than `ttl` are fresh. Entries younger than `stale_ttl`
+    are still returned (marked stale) so the caller can answer right away
+    and refresh in the background. Older entries count as misses.
+    """
+
+    def __init__(self, path, max_entries=500, ttl=300, stale_ttl=12 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # user_id -> (data, fetched_at), least recent first
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS attendance_cache ("
+            " user_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        """Load the most recent entries back from disk"""
+        cutoff = time_module.time() - self.stale_ttl
+        with self._lock:
+            self._db.execute("DELETE FROM attendance_cache WHERE fetched_at < ?", (cutoff,))
+            rows = self._db.execute(
+                "SELECT user_id, data, fetched_at FROM attendance_cache"
+                " ORDER BY fetched_at DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+            for user_id, data, fetched_at in reversed(rows):
+                try:
+                    self._entries[user_id] = (AttendanceReport.from_json(json.loads(data)), fetched_at)
+                except (ValueError, TypeError, KeyError):
+                    logger.error(f"Dropping unreadable cache entry for user {user_id}")
+            self._db.commit()
+        logger.info(f"Loaded {len(self._entries)} cached attendance entries from disk")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        """Return a CachedAttendance, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            data, fetched_at = entry
+            age = time_module.time() - fetched_at
+            if age >= self.stale_ttl:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            if age < self.ttl:
+                self.hits += 1
+                return CachedAttendance(data, fetched_at, True)
+            self.stale_hits += 1
+            return CachedAttendance(data, fetched_at, False)
+
+    def last_known(self, user_id):
+        """The newest entry whatever its age, for when the ERP cannot be reached"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return CachedAttendance(entry[0], entry[1], False)
+
+    def is_fresh(self, user_id):
+        """Check freshness without touching LRU order or counters"""
+        entry = self._entries.get(user_id)
+        return entry is not None and time_module.time() - entry[1] < self.ttl
+
+    def put(self, user_id, data, fetched_at=None):
+        """Store an AttendanceReport for a user, evicting the least recently used entries"""
+        fetched_at = fetched_at or time_module.time()
+        with self._lock:
+            self._entries[user_id] = (data, fetched_at)
+            self._entries.move_to_end(user_id)
+
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted_id, _ = self._entries.popitem(last=False)
+                evicted.append((evicted_id,))
+            self.evictions += len(evicted)
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO attendance_cache (user_id, data, fetched_at)"
+                " VALUES (?, ?, ?)",
+                (user_id, json.dumps(data.to_json(), separators=(',', ':'), ensure_ascii=False), fetched_at)
+            )
+            if evicted:
+                self._db.executemany("DELETE FROM attendance_cache WHERE user_id = ?", evicted)
+            self._db.commit()
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._db.execute("DELETE FROM attendance_cache WHERE user_id = ?", (user_id,))
+            self._db.commit()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
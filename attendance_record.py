@@ -0,0 +1,147 @@
+import re
+import sys
+
+# Attendance below this percentage is flagged with 🔴
+ATTENDANCE_THRESHOLD = 75.0
+
+# Order of the sections in replies, whatever order they were scraped in
+# (the same as http_scraper.ATTENDANCE_GRIDS); other types go last
+SECTION_ORDER = ("Theory", "Practical", "Tutorial")
+
+
+def section_rank(attendance_type):
+    try:
+        return SECTION_ORDER.index(attendance_type)
+    except ValueError:
+        return len(SECTION_ORDER)
+
+
+def parse_count(text):
+    match = re.search(r"\d+", text or "")
+    return int(match.group()) if match else 0
+
+
+def parse_percentage(text):
+    match = re.search(r"\d+(?:\.\d+)?", text or "")
+    return float(match.group()) if match else None
+
+
+class SubjectAttendance:
+    """One subject's attendance with numeric fields, parsed once after scraping"""
+
+    __slots__ = ('subject', 'total', 'present', 'absent', 'percentage')
+
+    def __init__(self, subject, total, present, absent, percentage):
+        # Every user taking a course shares one copy of its name
+        self.subject = sys.intern(subject)
+        self.total = total
+        self.present = present
+        self.absent = absent
+        self.percentage = percentage
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a scraped row of strings ({'subject', 'total_lectures', ...})"""
+        total = parse_count(row['total_lectures'])
+        present = parse_count(row['present'])
+        percentage = parse_percentage(row['percentage'])
+        if percentage is None:
+            percentage = present * 100 / total if total else 0.0
+        return cls(row['subject'], total, present, parse_count(row['absent']), percentage)
+
+    def to_list(self):
+        return [self.subject, self.total, self.present, self.absent, self.percentage]
+
+    @property
+    def below_threshold(self):
+        return self.percentage < ATTENDANCE_THRESHOLD
+
+    def __eq__(self, other):
+        return isinstance(other, SubjectAttendance) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        return f"SubjectAttendance({self.subject!r}, {self.present}/{self.total}, {self.percentage:.2f}%)"
+
+
+def normalize_rows(rows):
+    """Scraped rows -> tuple of SubjectAttendance"""
+    return tuple(SubjectAttendance.from_row(row) for row in rows)
+
+
+def render_section(attendance_type, subjects):
+    """Render one attendance type as message text"""
+    lines = [f"📊 {attendance_type} Classes:\n"]
+    for subject in subjects:
+        emoji = "🔴" if subject.below_threshold else "🟢"
+        lines.append(
+            f"{emoji} {subject.subject}\n"
+            f"├─ Present: {subject.present}/{subject.total}\n"
+            f"├─ Absent: {subject.absent}\n"
+            f"└─ Attendance: {subject.percentage:.2f} %\n"
+        )
+    return "\n".join(lines) + "\n"
+
+
+class AttendanceReport:
+    """All attendance types for one user, with each type's reply pre-rendered
+
+    Sections are kept in SECTION_ORDER, so grids that were scraped in
+    parallel and finished out of order still list Theory first. The reply
+    is rendered once when a section is added, so serving a cached report
+    needs no parsing or formatting. It is kept UTF-8 encoded: the emoji
+    would otherwise make Python store every character in four bytes.
+    """
+
+    __slots__ = ('sections', '_rendered')
+
+    def __init__(self):
+        self.sections = {}  # attendance_type -> tuple of SubjectAttendance
+        self._rendered = {}  # attendance_type -> UTF-8 message text
+
+    def add(self, attendance_type, subjects):
+        subjects = tuple(subjects)
+        self.sections[attendance_type] = subjects
+        self._rendered[attendance_type] = render_section(attendance_type, subjects).encode()
+        order = sorted(self.sections, key=section_rank)
+        if list(self.sections) != order:
+            self.sections = {key: self.sections[key] for key in order}
+            self._rendered = {key: self._rendered[key] for key in order}
+
+    def text(self, attendance_type):
+        """The rendered reply for one attendance type"""
+        return self._rendered[attendance_type].decode()
+
+    def texts(self):
+        """Rendered replies for every attendance type, in order"""
+        return [text.decode() for text in self._rendered.values()]
+
+    def items(self):
+        return self.sections.items()
+
+    def __contains__(self, attendance_type):
+        return attendance_type in self.sections
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __bool__(self):
+        return any(self.sections.values())
+
+    def to_json(self):
+        """Compact form: [[type, [[subject, total, present, absent, percentage], ...]], ...]"""
+        return [
+            [attendance_type, [subject.to_list() for subject in subjects]]
+            for attendance_type, subjects in self.sections.items()
+        ]
+
+    @classmethod
+    def from_json(cls, data):
+        """Inverse of to_json; also accepts the old {type: [row dicts]} cache format"""
+        report = cls()
+        if isinstance(data, dict):
+            for attendance_type, rows in data.items():
+                report.add(attendance_type, normalize_rows(rows))
+            return report
+        for attendance_type, subjects in data:
+            report.add(attendance_type, (SubjectAttendance(*subject) for subject in subjects))
+        return report
@@ -0,0 +1,327 @@
+"""End-to-end benchmark of the attendance backends against a local stub ERP
+
+Usage: python benchmarks/bench_backends.py [--backends http,selenium]
+           [--users 1,5,20] [--requests 3] [--latency-ms 50]
+           [--captcha-delay 0] [--browser-profile full|lean]
+           [--output results.json]
+
+Starts benchmarks/stub_erp.py on a free port, then for every backend and
+every concurrency level runs N simulated users, each fetching attendance
+`--requests` times, both with a fresh login per request ("login") and
+with the ERP session kept between requests ("resume"). Captchas come from
+a CaptchaPool backed by FakeCaptchaSolver.
+
+Reports per-request latency (mean/p50/p95/max), throughput, and the
+Python heap allocated by one request (tracemalloc peak). For Selenium it
+also reports the median dashboard load time and Chrome's resident
+memory after each login, for the --browser-profile in use. Prints JSON.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import sys
+import time as time_module
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from captcha_pool import CaptchaPool, FakeCaptchaSolver
+from stub_erp import StubERPServer
+
+SCENARIOS = ("login", "resume")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class HttpBackend:
+    name = "http"
+
+    def __init__(self, login_url, parallel_postbacks=True):
+        from http_scraper import HttpERPScraper
+        self.scraper = HttpERPScraper(login_url, parallel_postbacks=parallel_postbacks)
+
+    async def start(self, concurrency):
+        pass
+
+    async def fetch(self, username, get_captcha_token, session):
+        return await self.scraper.fetch_attendance(lambda: (username, "password"), get_captcha_token, session)
+
+    async def close(self):
+        await self.scraper.aclose()
+
+
+class SeleniumBackend:
+    """Pooled headless Chrome, logging in the same way ERPBot._scrape_attendance does"""
+
+    name = "selenium"
+
+    LOGIN_JS = """
+    document.getElementById('txtUSERNAME').value = arguments[0];
+    document.getElementById('txtPASSWORD').value = arguments[1];
+    document.getElementById('g-recaptcha-response').innerHTML = arguments[2];
+    document.getElementById('btnSUBMIT').click();
+    """
+
+    def __init__(self, login_url, extraction="tabs", profile="full"):
+        from driver_adapter import DriverCallMetrics
+        self.login_url = login_url
+        self.extraction = extraction
+        self.profile = profile
+        self.page_loads = []  # (load_ms, chrome bytes) after each fresh login
+        self.executor = None
+        self.metrics = DriverCallMetrics()
+        self.pool = None
+
+    def _start_chrome(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from browser_profile import apply_profile, chrome_arguments
+        options = Options()
+        for argument in chrome_arguments(self.profile):
+            options.add_argument(argument)
+        chrome = webdriver.Chrome(options=options)
+        apply_profile(chrome, self.profile)
+        return chrome
+
+    async def _launch(self, slot):
+        from driver_adapter import AsyncDriver, run_blocking
+        chrome = await run_blocking(self.executor, self.metrics, 'launch', self._start_chrome)
+        driver = AsyncDriver(chrome, self.executor, self.metrics)
+        await driver.get(self.login_url)
+        return driver
+
+    async def _check(self, driver):
+        try:
+            await driver.current_url()
+            return True
+        except Exception:
+            return False
+
+    async def _close(self, slot, driver):
+        await driver.quit()
+
+    async def start(self, concurrency):
+        from browser_pool import BrowserPool
+        from driver_adapter import create_executor
+        self.executor = create_executor(concurrency)
+        self.pool = BrowserPool(
+            launch=self._launch, check=self._check, close=self._close,
+            size=concurrency, max_uses=1000, max_waiters=1000,
+        )
+        await self.pool.start()
+
+    async def fetch(self, username, get_captcha_token, session):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from browser_profile import apply_profile
+        from grid_extraction import extract_grids_in_tabs, extract_grids_sequential
+
+        async with self.pool.browser() as driver:
+            resumed = False
+            if session:
+                for cookie in session['cookies']:
+                    await driver.add_cookie(cookie)
+                await driver.get(session['url'])
+                resumed = "Dashboard.aspx" in await driver.current_url()
+            if not resumed:
+                await driver.execute_script(self.LOGIN_JS, username, "password", await get_captcha_token())
+            await driver.wait_until(EC.presence_of_element_located((By.CLASS_NAME, "attendanceW")))
+            if not resumed:
+                await self._record_page_load(driver)
+            dashboard_url = await driver.current_url()
+            if self.extraction == "tabs":
+                data = await extract_grids_in_tabs(
+                    driver, dashboard_url,
+                    prepare_tab=lambda: driver.run('apply_profile', apply_profile, driver.driver, self.profile),
+                )
+            else:
+                data = await extract_grids_sequential(driver, self.extraction)
+            session = {
+                'url': dashboard_url,
+                'cookies': [
+                    {key: cookie[key] for key in ('name', 'value', 'path') if key in cookie}
+                    for cookie in await driver.get_cookies()
+                ],
+            }
+            await driver.delete_all_cookies()
+            await driver.get(self.login_url)
+        return data, session
+
+    async def _record_page_load(self, driver):
+        from browser_profile import PAGE_STATS_JS, chrome_memory_bytes
+        stats = await driver.execute_script(PAGE_STATS_JS)
+        memory = await driver.run('memory', chrome_memory_bytes, driver.driver)
+        self.page_loads.append((stats.get('load_ms'), memory))
+
+    def page_load_summary(self):
+        """Median dashboard load and Chrome memory over the logins so far"""
+        loads = [load_ms for load_ms, _ in self.page_loads if load_ms is not None]
+        memory = [rss for _, rss in self.page_loads if rss is not None]
+        summary = {'browser_profile': self.profile}
+        if loads:
+            summary['page_load_p50_ms'] = percentile(loads, 0.5)
+        if memory:
+            summary['chrome_rss_p50_mb'] = round(percentile(memory, 0.5) / 1024 / 1024, 1)
+        return summary
+
+    async def close(self):
+        if self.pool:
+            await self.pool.shutdown()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+
+def create_backend(name, login_url, args):
+    if name == "http":
+        return HttpBackend(login_url, parallel_postbacks=not args.sequential_postbacks)
+    if name == "selenium":
+        return SeleniumBackend(login_url, extraction=args.extraction, profile=args.browser_profile)
+    raise ValueError(f"Unknown backend {name}")
+
+
+async def run_load(backend, captcha_pool, users, requests_per_user, scenario):
+    """N users fetching concurrently; returns latencies and wall time"""
+    latencies = []
+    failures = []
+
+    async def user(index):
+        session = None
+        for _ in range(requests_per_user):
+            start = time_module.perf_counter()
+            try:
+                data, new_session = await backend.fetch(f"user{index}", captcha_pool.get_token, session)
+                if not data:
+                    raise RuntimeError("no attendance data")
+                latencies.append(time_module.perf_counter() - start)
+                if scenario == "resume":
+                    session = new_session
+            except Exception as e:
+                failures.append(f"{type(e).__name__}: {e}")
+
+    start = time_module.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(users)))
+    return latencies, failures, time_module.perf_counter() - start
+
+
+async def measure_memory(backend, captcha_pool, scenario):
+    """Peak Python heap allocated while serving one request"""
+    session = None
+    if scenario == "resume":
+        _, session = await backend.fetch("memory", captcha_pool.get_token, None)
+    tracemalloc.start()
+    try:
+        await backend.fetch("memory", captcha_pool.get_token, session)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+async def bench_backend(name, server, args):
+    results = []
+    max_users = max(args.users)
+    backend = create_backend(name, server.login_url, args)
+    captcha_pool = CaptchaPool(
+        FakeCaptchaSolver(delay=args.captcha_delay),
+        min_size=max_users, max_size=max_users, max_concurrent_solves=max_users,
+    )
+    captcha_pool.start()
+    try:
+        await backend.start(max_users)
+        # Warm up connections, the browser pool and the captcha stock
+        await run_load(backend, captcha_pool, 1, 1, "login")
+
+        for scenario in SCENARIOS:
+            memory = await measure_memory(backend, captcha_pool, scenario)
+            for users in args.users:
+                logins_before = server.requests.get("login", 0)
+                if isinstance(backend, SeleniumBackend):
+                    backend.page_loads.clear()
+                latencies, failures, wall = await run_load(
+                    backend, captcha_pool, users, args.requests, scenario
+                )
+                result = {
+                    'backend': name,
+                    'scenario': scenario,
+                    'users': users,
+                    'requests': len(latencies) + len(failures),
+                    'failures': len(failures),
+                    'logins': server.requests.get("login", 0) - logins_before,
+                    'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+                    'python_heap_peak_kb': round(memory / 1024, 1),
+                }
+                if latencies:
+                    result.update({
+                        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1),
+                        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+                        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+                        'max_ms': round(max(latencies) * 1000, 1),
+                    })
+                if isinstance(backend, SeleniumBackend):
+                    result.update(backend.page_load_summary())
+                if failures:
+                    result['first_failure'] = failures[0]
+                results.append(result)
+    finally:
+        await captcha_pool.stop()
+        await backend.close()
+    return results
+
+
+async def run(args):
+    server = StubERPServer(latency=args.latency_ms / 1000).start()
+    results = []
+    try:
+        for name in args.backends:
+            results.extend(await bench_backend(name, server, args))
+    finally:
+        server.stop()
+
+    return {
+        'benchmark': 'attendance_backends',
+        'python': platform.python_version(),
+        'config': {
+            'users': args.users,
+            'requests_per_user': args.requests,
+            'server_latency_ms': args.latency_ms,
+            'captcha_delay_s': args.captcha_delay,
+            'parallel_postbacks': not args.sequential_postbacks,
+            'selenium_extraction': args.extraction,
+            'browser_profile': args.browser_profile,
+        },
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', default='http,selenium',
+                        type=lambda value: [name.strip() for name in value.split(',') if name.strip()])
+    parser.add_argument('--users', default='1,5,20',
+                        type=lambda value: [int(users) for users in value.split(',')])
+    parser.add_argument('--requests', type=int, default=3, help="requests per simulated user")
+    parser.add_argument('--latency-ms', type=float, default=50, help="stub ERP delay per response")
+    parser.add_argument('--captcha-delay', type=float, default=0.0, help="fake captcha solve time")
+    parser.add_argument('--sequential-postbacks', action='store_true')
+    parser.add_argument('--extraction', choices=['tabs', 'js', 'dom'], default='tabs',
+                        help="how the Selenium backend reads the grids")
+    parser.add_argument('--browser-profile', choices=['full', 'lean'], default='full',
+                        help="Chrome flags and request blocking for the Selenium backend")
+    parser.add_argument('--output', help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    output = json.dumps(asyncio.run(run(args)), indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
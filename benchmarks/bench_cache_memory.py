@@ -0,0 +1,115 @@
+"""Compare the memory and cache-hit cost of cached attendance representations
+
+Usage: python benchmarks/bench_cache_memory.py [--users 500] [--repeat 1000]
+
+Parses benchmarks/pages/{theory,practical,tutorial}.html with
+http_scraper.parse_grid, then caches the result for N users two ways:
+the old {type: [row dicts of strings]} payload, and an AttendanceReport
+of SubjectAttendance records with the reply text pre-rendered. Reports
+the Python heap per cached user (tracemalloc) and the time to build the
+reply for a cache hit. Prints JSON.
+"""
+import argparse
+import json
+import sys
+import time as time_module
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from attendance_record import AttendanceReport, normalize_rows
+from http_scraper import ATTENDANCE_GRIDS, parse_grid
+
+PAGES_DIR = Path(__file__).resolve().parent / "pages"
+
+
+def load_rows():
+    return {
+        attendance_type: parse_grid((PAGES_DIR / f"{attendance_type.lower()}.html").read_text(), table_id)
+        for attendance_type, table_id in ATTENDANCE_GRIDS.items()
+    }
+
+
+def format_rows(data_type, subjects):
+    """The reply renderer used before records, run on every cache hit"""
+    message = f"📊 {data_type} Classes:\n\n"
+    for subject in subjects:
+        try:
+            percentage_str = subject['percentage'].replace('%', '').strip()
+            percentage = float(percentage_str) if percentage_str else 0
+            emoji = "🟢" if percentage >= 75 else "🔴"
+        except (ValueError, TypeError):
+            emoji = "🔴"
+        message += f"{emoji} {subject['subject']}\n"
+        message += f"├─ Present: {subject['present']}/{subject['total_lectures']}\n"
+        message += f"├─ Absent: {subject['absent']}\n"
+        message += f"└─ Attendance: {subject['percentage']}\n\n"
+    return message
+
+
+def as_dicts(rows):
+    # Fresh strings per user, as they would come out of separate scrapes
+    return {
+        attendance_type: [{key: "".join(value) for key, value in row.items()} for row in subjects]
+        for attendance_type, subjects in rows.items()
+    }
+
+
+def as_report(rows):
+    report = AttendanceReport()
+    for attendance_type, subjects in as_dicts(rows).items():
+        report.add(attendance_type, normalize_rows(subjects))
+    return report
+
+
+def heap_per_user(build, rows, users):
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        cache = {user_id: build(rows) for user_id in range(users)}
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del cache
+    return (after - before) / users
+
+
+def time_per_hit(reply, repeat):
+    start = time_module.perf_counter()
+    for _ in range(repeat):
+        reply()
+    return (time_module.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500, help="cached users to measure")
+    parser.add_argument('--repeat', type=int, default=1000, help="cache hits to time")
+    args = parser.parse_args()
+
+    rows = load_rows()
+    dicts = as_dicts(rows)
+    report = as_report(rows)
+    results = {
+        'dicts': {
+            'bytes_per_user': round(heap_per_user(as_dicts, rows, args.users)),
+            'hit_us': round(time_per_hit(
+                lambda: [format_rows(t, s) for t, s in dicts.items()], args.repeat
+            ) * 1e6, 2),
+        },
+        'records': {
+            'bytes_per_user': round(heap_per_user(as_report, rows, args.users)),
+            'hit_us': round(time_per_hit(report.texts, args.repeat) * 1e6, 2),
+        },
+    }
+    print(json.dumps({
+        'benchmark': 'cache_memory',
+        'subjects': sum(len(subjects) for subjects in rows.values()),
+        'users': args.users,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare WebDriver round trips of the grid extraction modes on recorded ERP pages
+
+Usage: python benchmarks/bench_extraction.py [--repeat 5]
+
+Loads benchmarks/pages/{theory,practical,tutorial}.html in headless Chrome
+and extracts each grid with every mode in grid_extraction.EXTRACTORS,
+counting the WebDriver commands sent to chromedriver. Prints JSON.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time as time_module
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+from driver_adapter import AsyncDriver, DriverCallMetrics, create_executor
+from grid_extraction import EXTRACTORS
+from http_scraper import ATTENDANCE_GRIDS
+
+PAGES_DIR = Path(__file__).resolve().parent / "pages"
+
+
+def start_chrome():
+    options = Options()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--window-size=1920,1080')
+    return webdriver.Chrome(options=options)
+
+
+def count_commands(chrome):
+    """Wrap chromedriver's command executor and count every request it sends"""
+    counter = {'commands': 0}
+    execute = chrome.command_executor.execute
+
+    def counting_execute(command, params):
+        counter['commands'] += 1
+        return execute(command, params)
+
+    chrome.command_executor.execute = counting_execute
+    return counter
+
+
+async def run(repeat):
+    chrome = start_chrome()
+    counter = count_commands(chrome)
+    executor = create_executor(1)
+    driver = AsyncDriver(chrome, executor, DriverCallMetrics())
+    results = []
+    try:
+        for attendance_type, table_id in ATTENDANCE_GRIDS.items():
+            url = (PAGES_DIR / f"{attendance_type.lower()}.html").as_uri()
+            for mode, (_, extract_grid) in EXTRACTORS.items():
+                timings = []
+                commands = []
+                rows = 0
+                for _ in range(repeat):
+                    await driver.get(url)
+                    counter['commands'] = 0
+                    start = time_module.perf_counter()
+                    data = await extract_grid(driver, table_id, attendance_type)
+                    timings.append((time_module.perf_counter() - start) * 1000)
+                    commands.append(counter['commands'])
+                    rows = len(data)
+                results.append({
+                    'grid': attendance_type,
+                    'mode': mode,
+                    'rows': rows,
+                    'round_trips': max(commands),
+                    'median_ms': round(sorted(timings)[len(timings) // 2], 1),
+                })
+    finally:
+        await driver.quit()
+        executor.shutdown(wait=False)
+
+    summary = {}
+    for mode in EXTRACTORS:
+        mode_results = [r for r in results if r['mode'] == mode]
+        summary[mode] = {
+            'round_trips': sum(r['round_trips'] for r in mode_results),
+            'median_ms': round(sum(r['median_ms'] for r in mode_results), 1),
+        }
+    return {'benchmark': 'grid_extraction', 'repeat': repeat, 'results': results, 'total': summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.repeat)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
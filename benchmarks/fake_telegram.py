@@ -0,0 +1,142 @@
+"""Post fake Telegram updates to the bot's webhook, the way Telegram does
+
+Usage: python benchmarks/fake_telegram.py [--url http://127.0.0.1:8080/telegram]
+           --secret SECRET [--users 20] [--updates 5] [--text /attendance]
+           [--concurrency 10] [--output results.json]
+
+Sends `--updates` message updates from each of `--users` fake users, with
+the secret in the X-Telegram-Bot-Api-Secret-Token header (the bot's
+WEBHOOK_SECRET, which defaults to the SHA-256 hex digest of the bot
+token). Like Telegram, a 503 is retried after its Retry-After delay.
+Reports how many updates were accepted, refused and retried, and the
+webhook response latency. Prints JSON.
+
+The bot's replies to fake users go to the real Bot API and fail there;
+this exercises update intake and backpressure, not delivery.
+"""
+import argparse
+import asyncio
+import json
+import time as time_module
+from pathlib import Path
+
+import httpx
+
+# Fake user ids start here, well away from real ones
+FIRST_USER_ID = 9_000_000_000
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_update(update_id, user_id, text):
+    """A private-chat message update, with a bot_command entity for /commands"""
+    message = {
+        'message_id': update_id,
+        'date': int(time_module.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': f"User {user_id}"},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+class FakeTelegram:
+    """Delivers updates to a webhook one at a time per connection, retrying 503s"""
+
+    def __init__(self, url, secret, max_retries=10):
+        self.url = url
+        self.secret = secret
+        self.max_retries = max_retries
+        self.client = httpx.AsyncClient(timeout=60)
+        self.latencies = []
+        self.statuses = {}
+        self.retries = 0
+
+    async def post(self, update):
+        """POST one update until it is answered with something other than 503"""
+        for attempt in range(self.max_retries + 1):
+            start = time_module.perf_counter()
+            response = await self.client.post(
+                self.url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': self.secret}
+            )
+            self.latencies.append(time_module.perf_counter() - start)
+            self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+            if response.status_code != 503 or attempt == self.max_retries:
+                return response.status_code
+            self.retries += 1
+            await asyncio.sleep(float(response.headers.get('Retry-After', '1')))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+async def run(args):
+    telegram = FakeTelegram(args.url, args.secret, max_retries=args.max_retries)
+    updates = asyncio.Queue()
+    update_id = 1
+    for _ in range(args.updates):
+        for user in range(args.users):
+            updates.put_nowait(make_update(update_id, FIRST_USER_ID + user, args.text))
+            update_id += 1
+    delivered = {}
+
+    async def connection():
+        while not updates.empty():
+            status = await telegram.post(updates.get_nowait())
+            delivered[status] = delivered.get(status, 0) + 1
+
+    start = time_module.perf_counter()
+    try:
+        await asyncio.gather(*(connection() for _ in range(args.concurrency)))
+    finally:
+        await telegram.aclose()
+    wall = time_module.perf_counter() - start
+
+    result = {
+        'benchmark': 'webhook_intake',
+        'config': {
+            'users': args.users,
+            'updates_per_user': args.updates,
+            'text': args.text,
+            'concurrency': args.concurrency,
+        },
+        'updates': update_id - 1,
+        'final_status': {str(status): count for status, count in sorted(delivered.items())},
+        'responses': {str(status): count for status, count in sorted(telegram.statuses.items())},
+        'retries': telegram.retries,
+        'wall_s': round(wall, 3),
+    }
+    if telegram.latencies:
+        result.update({
+            'p50_ms': round(percentile(telegram.latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(telegram.latencies, 0.95) * 1000, 2),
+            'max_ms': round(max(telegram.latencies) * 1000, 2),
+        })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8080/telegram', help="the bot's webhook URL")
+    parser.add_argument('--secret', required=True, help="the bot's WEBHOOK_SECRET")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--updates', type=int, default=5, help="updates per fake user")
+    parser.add_argument('--text', default='/attendance', help="message text of every update")
+    parser.add_argument('--concurrency', type=int, default=10, help="parallel webhook connections")
+    parser.add_argument('--max-retries', type=int, default=10, help="retries of a refused update")
+    parser.add_argument('--output', help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    output = json.dumps(asyncio.run(run(args)), indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
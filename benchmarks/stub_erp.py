@@ -0,0 +1,185 @@
+"""Local stand-in for the ERP, serving the recorded pages in benchmarks/pages
+
+Usage: python benchmarks/stub_erp.py [--port 8081] [--latency-ms 0]
+
+Behaves like the real site as far as the scrapers can tell:
+  GET  /pLogin.aspx     login form
+  POST /pLogin.aspx     checks __VIEWSTATE, credentials and a fake captcha
+                        token, sets an ASP.NET_SessionId cookie and
+                        redirects to the dashboard; otherwise re-renders
+                        the login form
+  GET  /Dashboard.aspx  Theory grid, or a redirect to the login page
+                        without a valid session
+  POST /Dashboard.aspx  radio button postback, renders the grid named by
+                        __EVENTTARGET
+
+Point the bot at it with ERP_URL=http://127.0.0.1:8081/pLogin.aspx and
+CAPTCHA_PROVIDER=fake.
+"""
+import argparse
+import secrets
+import threading
+import time as time_module
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+PAGES_DIR = Path(__file__).resolve().parent / "pages"
+
+# Postback event target suffix -> recorded page
+POSTBACK_PAGES = {
+    "rblTheory": "theory.html",
+    "rblPractical": "practical.html",
+    "rblTutorial": "tutorial.html",
+}
+
+FAKE_CAPTCHA_PREFIX = "fake-captcha-token"
+
+
+class StubERPHandler(BaseHTTPRequestHandler):
+    server_version = "Microsoft-IIS/10.0"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def _page(self, name):
+        return self.server.pages[name]
+
+    def _send(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location, headers=()):
+        self._send(302, headers=[("Location", location), *headers])
+
+    def _session_id(self):
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "ASP.NET_SessionId":
+                return value
+        return None
+
+    def _has_session(self):
+        with self.server.lock:
+            return self._session_id() in self.server.sessions
+
+    def _form(self):
+        length = int(self.headers.get("Content-Length", 0))
+        fields = parse_qs(self.rfile.read(length).decode(), keep_blank_values=True)
+        return {name: values[-1] for name, values in fields.items()}
+
+    def _delay(self):
+        if self.server.latency:
+            time_module.sleep(self.server.latency)
+
+    def do_GET(self):
+        self._delay()
+        self.server.count("GET")
+        path = urlsplit(self.path).path
+        if path.endswith("/pLogin.aspx"):
+            self._send(200, self._page("login.html"))
+        elif path.endswith("/Dashboard.aspx"):
+            if self._has_session():
+                self._send(200, self._page("theory.html"))
+            else:
+                self._redirect("./pLogin.aspx")
+        else:
+            self._send(404, b"Not found")
+
+    def do_POST(self):
+        self._delay()
+        self.server.count("POST")
+        path = urlsplit(self.path).path
+        form = self._form()
+        if path.endswith("/pLogin.aspx"):
+            self._login(form)
+        elif path.endswith("/Dashboard.aspx"):
+            if not self._has_session() or not form.get("__VIEWSTATE"):
+                self._redirect("./pLogin.aspx")
+                return
+            target = form.get("__EVENTTARGET", "")
+            page = next(
+                (page for suffix, page in POSTBACK_PAGES.items() if target.endswith(suffix)),
+                "theory.html",
+            )
+            self._send(200, self._page(page))
+        else:
+            self._send(404, b"Not found")
+
+    def _login(self, form):
+        valid = (
+            form.get("__VIEWSTATE")
+            and form.get("__EVENTVALIDATION")
+            and form.get("txtUSERNAME")
+            and form.get("txtPASSWORD")
+            and form.get("g-recaptcha-response", "").startswith(FAKE_CAPTCHA_PREFIX)
+        )
+        if not valid:
+            self.server.count("rejected_login")
+            self._send(200, self._page("login.html"))
+            return
+        session_id = secrets.token_hex(12)
+        with self.server.lock:
+            self.server.sessions.add(session_id)
+        self.server.count("login")
+        self._redirect(
+            "./Dashboard.aspx",
+            headers=[("Set-Cookie", f"ASP.NET_SessionId={session_id}; path=/; HttpOnly")],
+        )
+
+
+class StubERPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0):
+        super().__init__(address, StubERPHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.requests = {}
+        self.pages = {path.name: path.read_bytes() for path in PAGES_DIR.glob("*.html")}
+        self._thread = None
+
+    @property
+    def login_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/pLogin.aspx"
+
+    def count(self, key):
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def start(self):
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-erp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0, help="delay added to every response")
+    args = parser.parse_args()
+    server = StubERPServer(("127.0.0.1", args.port), latency=args.latency_ms / 1000)
+    print(f"Stub ERP listening on {server.login_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
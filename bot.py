@@ -1,35 +1,50 @@
+import time as time_module
+# Startup phases are timed from the first import
+STARTUP_BEGAN = time_module.perf_counter()
 import asyncio
+import hashlib
+import signal
+import sys
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
-from crawl4ai import AsyncWebCrawler
 import json
-from twocaptcha import TwoCaptcha
 import os
 from datetime import datetime, time
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
 from cryptography.fernet import Fernet
-import pickle
 import base64
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import (
-    TimeoutException, 
-    NoSuchElementException, 
-    ElementNotInteractableException,
-    StaleElementReferenceException
-)
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+# Selenium, webdriver_manager, twocaptcha and apscheduler are imported
+# where they are first used, so polling starts without waiting for them
 import logging
-import time as time_module
 from pathlib import Path
 from dotenv import load_dotenv
 from config import TELEGRAM_TOKEN, CAPTCHA_API_KEY, ERP_URL
-from keep_alive import keep_alive
+from web_server import WebServer
+from browser_pool import BrowserPool
+from driver_adapter import AsyncDriver, DriverCallMetrics, create_executor, run_blocking
+from http_scraper import (
+    HttpERPScraper, ERPLoginError, ERPScrapeError, ERP_ERRORS, ERP_UNAVAILABLE, extract_aspnet_field
+)
+from chromedriver import invalidate_chromedriver, resolve_chromedriver
+from browser_profile import PAGE_STATS_JS, apply_profile, chrome_arguments, chrome_memory_bytes
+from captcha_pool import CaptchaPool, TwoCaptchaSolver, FakeCaptchaSolver
+from singleflight import SingleFlight
+from attendance_cache import AttendanceCache
+from attendance_record import AttendanceReport, normalize_rows
+from prefetch import PrefetchCrawler, parse_windows, in_window
+from user_store import UserStore
+from job_queue import JobQueue, JobWorker, JobFailed
+from subscriptions import SubscriptionStore
+from groups import GroupStore, aggregate, render_csv, render_summary
+from history import HistoryStore, percentage, sparkline, lectures_can_miss, lectures_needed
+from progressive_reply import ProgressiveReply, split_message
+from scheduler import RequestScheduler, RateLimited, SchedulerFull, PRIORITY_BACKGROUND
+from metrics import (
+    LOGIN_SECONDS, TELEGRAM_SEND_SECONDS, BROWSER_PAGE_LOAD_SECONDS, BROWSER_MEMORY_BYTES,
+    CACHE_HITS, CACHE_STALE_HITS, CACHE_MISSES, QUEUE_DEPTH, SCRAPES_RUNNING, BROWSERS_READY, CAPTCHA_TOKENS, ERP_CIRCUIT_OPEN
+)
+from resilience import ERP_LATENCY, CircuitBreaker, CircuitOpen
+import tracing
+from tracing import span, trace
 
 # Load environment variables
 load_dotenv()
@@ -39,6 +54,96 @@ TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 CAPTCHA_API_KEY = os.getenv('CAPTCHA_API_KEY')
 ERP_URL = os.getenv('ERP_URL', "https://isquareit.akronsystems.com/pLogin.aspx")
 
+# Browser pool settings
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))
+BROWSER_MAX_USES = int(os.getenv('BROWSER_MAX_USES', '25'))
+BROWSER_MAX_WAITERS = int(os.getenv('BROWSER_MAX_WAITERS', '20'))
+
+# Chrome flags and request blocking, see browser_profile.py: "full" loads
+# everything, "lean" blocks images, fonts, CSS and trackers (reCAPTCHA
+# still loads), trims Chrome features and uses a small window.
+# BROWSER_BLOCK_URLS adds comma separated URL patterns to block.
+BROWSER_PROFILE = os.getenv('BROWSER_PROFILE', 'full').lower()
+BROWSER_BLOCK_URLS = [pattern.strip() for pattern in os.getenv('BROWSER_BLOCK_URLS', '').split(',') if pattern.strip()]
+
+# Attendance backend: "http" posts the ASP.NET forms directly and falls back
+# to Selenium on failure, "selenium" always uses the browser pool
+ERP_BACKEND = os.getenv('ERP_BACKEND', 'http').lower()
+
+# How the Selenium backend reads grids: "js" returns each grid with one
+# execute_script, "dom" reads it cell by cell
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'js').lower()
+
+# Fetch the Theory, Practical and Tutorial grids concurrently (parallel
+# postbacks over HTTP, one tab per grid with Selenium in "js" mode)
+PARALLEL_GRIDS = os.getenv('PARALLEL_GRIDS', '1') == '1'
+
+# Captcha provider ("2captcha", or "fake" for local testing) and token stock
+# bounds while requests are coming in; an idle pool keeps CAPTCHA_POOL_IDLE_MIN
+# tokens (at most CAPTCHA_POOL_MIN), and one token is stocked at startup
+CAPTCHA_PROVIDER = os.getenv('CAPTCHA_PROVIDER', '2captcha').lower()
+CAPTCHA_POOL_MIN = int(os.getenv('CAPTCHA_POOL_MIN', '1'))
+CAPTCHA_POOL_MAX = int(os.getenv('CAPTCHA_POOL_MAX', '5'))
+CAPTCHA_POOL_IDLE_MIN = int(os.getenv('CAPTCHA_POOL_IDLE_MIN', '0'))
+
+# Attendance cache: entries are fresh for CACHE_TTL seconds and served as
+# stale (while refreshing in the background) up to CACHE_STALE_TTL seconds
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '500'))
+CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))
+CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', str(12 * 3600)))
+
+# Off-peak windows for batch pre-fetching every user's attendance,
+# e.g. "05:00-07:30,13:00-13:45". Empty disables pre-fetching.
+PREFETCH_WINDOWS = parse_windows(os.getenv('PREFETCH_WINDOWS', ''))
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', '2'))
+PREFETCH_MIN_INTERVAL = float(os.getenv('PREFETCH_MIN_INTERVAL', '5'))
+
+# Change notifications: subscribers' attendance is re-checked every
+# SUBSCRIPTION_INTERVAL minutes (0 disables the job)
+SUBSCRIPTION_INTERVAL = int(os.getenv('SUBSCRIPTION_INTERVAL', '60'))
+SUBSCRIPTION_CONCURRENCY = int(os.getenv('SUBSCRIPTION_CONCURRENCY', '2'))
+
+# Class groups: ADMIN_USER_IDS (comma separated Telegram ids) may create
+# groups and run /classreport, which fetches the attendance of every member
+# not in the cache, CLASSREPORT_CONCURRENCY at a time
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
+CLASSREPORT_CONCURRENCY = int(os.getenv('CLASSREPORT_CONCURRENCY', '2'))
+
+# Admission control: at most SCHEDULER_MAX_CONCURRENT scrapes at once, the
+# rest queue up to SCHEDULER_MAX_QUEUE. Each user may start USER_RATE_BURST
+# scrapes back to back, refilled at USER_RATE_PER_MINUTE.
+SCHEDULER_MAX_CONCURRENT = int(os.getenv('SCHEDULER_MAX_CONCURRENT', '4'))
+SCHEDULER_MAX_QUEUE = int(os.getenv('SCHEDULER_MAX_QUEUE', '50'))
+USER_RATE_BURST = int(os.getenv('USER_RATE_BURST', '3'))
+USER_RATE_PER_MINUTE = float(os.getenv('USER_RATE_PER_MINUTE', '1'))
+
+# Circuit breaker: after ERP_BREAKER_FAILURES failed scrapes in a row, stop
+# trying for ERP_BREAKER_RECOVERY seconds (doubling while the ERP stays
+# down) and answer from the cache
+ERP_BREAKER_FAILURES = int(os.getenv('ERP_BREAKER_FAILURES', '5'))
+ERP_BREAKER_RECOVERY = int(os.getenv('ERP_BREAKER_RECOVERY', '60'))
+
+# Scale-out: with JOB_QUEUE=1 the bot only enqueues scrapes into
+# data/jobs.db, and `python bot.py --worker` processes, each with its own
+# browsers and captcha tokens, run WORKER_CONCURRENCY of them at a time.
+# SCHEDULER_MAX_CONCURRENT then caps the jobs in flight across all workers.
+JOB_QUEUE = os.getenv('JOB_QUEUE', '0') == '1'
+JOB_VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', '120'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', str(BROWSER_POOL_SIZE)))
+
+# Updates arrive by webhook when WEBHOOK_URL (the public https base URL) is
+# set, otherwise by long polling. Either way one web server on PORT serves
+# /healthz and /metrics. Webhook updates are refused with 503 while the
+# scrape queue is full or WEBHOOK_MAX_PENDING updates are waiting.
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or (
+    hashlib.sha256(TELEGRAM_TOKEN.encode()).hexdigest() if TELEGRAM_TOKEN else None
+)
+WEBHOOK_MAX_PENDING = int(os.getenv('WEBHOOK_MAX_PENDING', '100'))
+PORT = int(os.getenv('PORT', '8080'))
+
 if not TELEGRAM_TOKEN or not CAPTCHA_API_KEY:
     raise ValueError("Missing required environment variables. Please check your .env file.")
 
@@ -58,12 +163,18 @@ def setup_directories():
 # Set up logging with proper directories
 data_dir, logs_dir = setup_directories()
 
+# chromedriver path remembered across restarts
+CHROMEDRIVER_CACHE_FILE = data_dir / "chromedriver_path.txt"
+
+# Handlers sit behind a queue so file writes happen off the event loop
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(logs_dir / 'bot.log'),
-        logging.StreamHandler()  # Keep console output too
+        tracing.queued(
+            logging.FileHandler(logs_dir / 'bot.log'),
+            logging.StreamHandler()  # Keep console output too
+        )
     ]
 )
 
@@ -72,52 +183,203 @@ user_logger = logging.getLogger('user_activities')
 user_logger.setLevel(logging.INFO)
 user_handler = logging.FileHandler(logs_dir / 'user_activities.log')
 user_handler.setFormatter(logging.Formatter('%(asctime)s - User %(message)s'))
-user_logger.addHandler(user_handler)
+user_logger.addHandler(tracing.queued(user_handler))
+
+# Span records for every /attendance, see `python tracing.py --help`
+tracing.configure(logs_dir / 'trace.jsonl')
 
 logger = logging.getLogger(__name__)
 
+def format_age(seconds):
+    """Human readable age like '5 min' or '2 h'"""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "less than a minute"
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h {minutes % 60} min"
+
 # States for conversation
 USERNAME, PASSWORD = range(2)
 
-# Store user data
-user_data = {}
-
 class ERPBot:
     def __init__(self, telegram_token, captcha_api_key, erp_url):
         """Initialize the bot with configuration"""
+        init_started = time_module.perf_counter()
+        self.startup_timings = {'imports': round(init_started - STARTUP_BEGAN, 3)}
         self.telegram_token = telegram_token
         self.captcha_api_key = captcha_api_key
         self.erp_url = erp_url
         self.application = None
-        self.captcha_solution = None
-        self.last_captcha_time = None
-        self.driver = None
-        self.is_browser_ready = False
         
-        # Initialize captcha queue and event
-        self.captcha_queue = asyncio.Queue()
-        self.captcha_ready = asyncio.Event()
-        self.captcha_task = None
+        # Blocking WebDriver calls run on a dedicated executor, one thread per browser
+        self.driver_executor = create_executor(BROWSER_POOL_SIZE)
+        self.driver_metrics = DriverCallMetrics()
+        
+        # Initialize pool of warm browsers
+        self.browser_pool = BrowserPool(
+            launch=self.launch_browser,
+            check=self.check_browser,
+            close=self.close_browser,
+            size=BROWSER_POOL_SIZE,
+            max_uses=BROWSER_MAX_USES,
+            max_waiters=BROWSER_MAX_WAITERS,
+            # A rejected login leaves the browser on the login page, ready for the next user
+            harmless=(ERPLoginError,),
+        )
+        
+        # Browserless backend for the attendance path
+        self.http_scraper = None
+        if ERP_BACKEND == 'http':
+            self.http_scraper = HttpERPScraper(erp_url, parallel_postbacks=PARALLEL_GRIDS)
+        
+        # Initialize pool of pre-solved captcha tokens
+        self.captcha_pool = CaptchaPool(
+            self.create_captcha_solver(),
+            min_size=CAPTCHA_POOL_MIN,
+            max_size=CAPTCHA_POOL_MAX,
+            idle_size=CAPTCHA_POOL_IDLE_MIN,
+        )
+        
+        # Initialize attendance cache, persisted so it survives restarts
+        self.attendance_cache = AttendanceCache(
+            data_dir / "attendance_cache.db",
+            max_entries=CACHE_MAX_ENTRIES,
+            ttl=CACHE_TTL,
+            stale_ttl=CACHE_STALE_TTL,
+        )
+        self.background_tasks = set()
+        
+        # Off-peak crawler that warms the cache for all registered users
+        self.prefetch_crawler = PrefetchCrawler(
+            fetch=self.prefetch_attendance,
+            list_users=lambda: self.users.user_ids(),
+            state_path=data_dir / "prefetch_state.json",
+            windows=PREFETCH_WINDOWS,
+            concurrency=PREFETCH_CONCURRENCY,
+            min_interval=PREFETCH_MIN_INTERVAL,
+        )
+        
+        # Concurrent fetches for the same user share one scrape
+        self.inflight = SingleFlight()
         
-        # Initialize attendance cache
-        self.attendance_cache = {}
-        self.cache_timeout = 300  # 5 minutes
+        # Per-user rate limits and a global cap on concurrent scrapes
+        self.scheduler = RequestScheduler(
+            max_concurrent=SCHEDULER_MAX_CONCURRENT,
+            rate=USER_RATE_PER_MINUTE / 60,
+            burst=USER_RATE_BURST,
+            max_queue=SCHEDULER_MAX_QUEUE,
+        )
         
         # Initialize encryption
         self.key = self.load_or_create_key()
         self.cipher_suite = Fernet(self.key)
         
-        # Load existing user data if available
-        self.load_user_data()
+        # Stop scraping (and spending captchas) while the ERP keeps failing;
+        # wrong credentials mean the ERP is up, and local problems (no free
+        # browser, no captcha token) say nothing about it
+        self.erp_breaker = CircuitBreaker(
+            failure_threshold=ERP_BREAKER_FAILURES,
+            recovery_time=ERP_BREAKER_RECOVERY,
+            ignore=(ERPLoginError,),
+            count=ERP_ERRORS,
+        )
+        
+        # Expose component state on /metrics
+        self.instrument()
+        
+        # Health, metrics and (in webhook mode) Telegram updates on one port
+        self.web_server = WebServer(
+            port=PORT,
+            health=self.health,
+            webhook_path=WEBHOOK_PATH if WEBHOOK_URL else None,
+            secret_token=WEBHOOK_SECRET,
+            on_update=self.receive_update,
+            overloaded=self.overloaded,
+        )
         
-        # Setup Chrome options for visible mode
-        self.chrome_options = Options()
-        self.chrome_options.add_argument('--headless')  # Run in headless mode
-        self.chrome_options.add_argument('--disable-gpu')
-        self.chrome_options.add_argument('--start-maximized')
-        self.chrome_options.add_argument('--disable-dev-shm-usage')
-        self.chrome_options.add_argument('--no-sandbox')
-        self.chrome_options.add_argument('--window-size=1920,1080')
+        # Credential store, importing the old pickle file on first run
+        self.users = UserStore(data_dir / "users.db", self.cipher_suite)
+        self.users.migrate_from_pickle(data_dir / "user_data.pkl")
+        
+        # Users who opted in to change notifications, with their last snapshot
+        self.subscriptions = SubscriptionStore(data_dir / "subscriptions.db")
+        
+        # Daily counts from every successful scrape, for /history and /trend
+        self.history = HistoryStore(data_dir / "history.db")
+        
+        # Class groups and the students who joined them, for /classreport
+        self.groups = GroupStore(data_dir / "groups.db")
+        
+        # Scrapes handed to worker processes, see run_worker
+        self.job_queue = self.open_job_queue() if JOB_QUEUE else None
+        
+        # Chrome arguments, turned into Options when the first browser launches
+        self.chrome_arguments = chrome_arguments(BROWSER_PROFILE)
+        
+        self.startup_timings['init'] = round(time_module.perf_counter() - init_started, 3)
+
+    @property
+    def is_browser_ready(self):
+        """True if at least one pooled browser is available"""
+        return self.browser_pool.ready_count > 0
+
+    def instrument(self):
+        """Read cache, queue, browser and captcha state into the metrics registry"""
+        CACHE_HITS.set_function(lambda: self.attendance_cache.hits)
+        CACHE_STALE_HITS.set_function(lambda: self.attendance_cache.stale_hits)
+        CACHE_MISSES.set_function(lambda: self.attendance_cache.misses)
+        QUEUE_DEPTH.set_function(lambda: self.scheduler.queue_depth)
+        SCRAPES_RUNNING.set_function(lambda: self.scheduler.running)
+        BROWSERS_READY.set_function(lambda: self.browser_pool.ready_count)
+        CAPTCHA_TOKENS.set_function(lambda: self.captcha_pool.available)
+        ERP_CIRCUIT_OPEN.set_function(lambda: 1 if self.erp_breaker.is_open else 0)
+
+    def health(self):
+        """Readiness of the browser pool and captcha stock, served on /healthz"""
+        if self.job_queue:
+            # Browsers and captchas live in the worker processes
+            return {
+                'status': 'ok',
+                'jobs': self.job_queue.stats(),
+                'queue_depth': self.scheduler.queue_depth,
+                'erp_circuit': self.erp_breaker.state,
+                'startup': self.startup_timings,
+            }
+        token_age = self.captcha_pool.newest_token_age()
+        # An idle pool only keeps its idle floor on purpose
+        captcha_ok = (
+            self.captcha_pool.available > 0
+            or self.captcha_pool.solving > 0
+            or self.captcha_pool.target_size() == 0
+        )
+        # The HTTP backend only needs a browser to fall back on
+        browser_ok = self.is_browser_ready or self.http_scraper is not None
+        return {
+            'status': 'ok' if browser_ok and captcha_ok else 'degraded',
+            'browser_ready': self.is_browser_ready,
+            'browsers': self.browser_pool.ready_count,
+            'backend': 'http' if self.http_scraper else 'selenium',
+            'captcha_tokens': self.captcha_pool.available,
+            'captcha_solving': self.captcha_pool.solving,
+            'captcha_token_age': round(token_age, 1) if token_age is not None else None,
+            'queue_depth': self.scheduler.queue_depth,
+            'erp_circuit': self.erp_breaker.state,
+            'startup': self.startup_timings,
+        }
+
+    def overloaded(self):
+        """Whether to refuse webhook updates for now; Telegram delivers them again later"""
+        if self.application is None or not self.application.running:
+            return True
+        return (
+            self.scheduler.queue_depth >= self.scheduler.max_queue
+            or self.application.update_queue.qsize() >= WEBHOOK_MAX_PENDING
+        )
+
+    async def receive_update(self, data):
+        """Hand an update posted to the webhook to the application's handlers"""
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
 
     def load_or_create_key(self):
         """Load existing key or create a new one"""
@@ -132,48 +394,6 @@ class ERPBot:
                 f.write(key)
             return key
             
-    def encrypt_data(self, data):
-        """Encrypt sensitive data"""
-        return self.cipher_suite.encrypt(data.encode()).decode()
-        
-    def decrypt_data(self, encrypted_data):
-        """Decrypt sensitive data"""
-        return self.cipher_suite.decrypt(encrypted_data.encode()).decode()
-        
-    def save_user_data(self):
-        """Save encrypted user data to file"""
-        encrypted_data = {}
-        for user_id, data in user_data.items():
-            encrypted_data[user_id] = {
-                'username': self.encrypt_data(data['username']),
-                'password': self.encrypt_data(data['password']),
-            }
-        
-        with open(Path("data/user_data.pkl"), 'wb') as f:
-            pickle.dump(encrypted_data, f)
-            
-    def load_user_data(self):
-        """Load and decrypt user data from file"""
-        global user_data
-        try:
-            with open(Path("data/user_data.pkl"), 'rb') as f:
-                encrypted_data = pickle.load(f)
-                
-            for user_id, data in encrypted_data.items():
-                user_data[user_id] = {
-                    'username': self.decrypt_data(data['username']),
-                    'password': self.decrypt_data(data['password']),
-                }
-        except FileNotFoundError:
-            user_data = {}
-        except Exception as e:
-            print(f"Error loading user data: {e}")
-            # If there's an error loading the data, start fresh
-            user_data = {}
-            # Remove corrupted data file
-            if os.path.exists(Path("data/user_data.pkl")):
-                os.remove(Path("data/user_data.pkl"))
-
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start the conversation and ask for username"""
         await update.message.reply_text(
@@ -183,20 +403,23 @@ class ERPBot:
 
     async def get_username(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Store username and ask for password"""
-        user_id = update.effective_user.id
         username = update.message.text
         
-        user_data[user_id] = {'username': username}
+        context.user_data['username'] = username
         await update.message.reply_text("Please enter your ERP password:")
         return PASSWORD
 
     async def get_password(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Store password and complete setup"""
         user_id = update.effective_user.id
-        user_data[user_id]['password'] = update.message.text
+        username = context.user_data.pop('username', None)
+        if username is None:
+            await update.message.reply_text("Please start again with /start")
+            return ConversationHandler.END
         
         # Save user data
-        self.save_user_data()
+        self.users.save(user_id, username, update.message.text)
+        self.attendance_cache.delete(user_id)
         
         await update.message.reply_text(
             "Setup complete! You can now use /attendance to check your attendance."
@@ -205,39 +428,94 @@ class ERPBot:
 
     async def attendance(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /attendance command"""
+        with trace('attendance', user_id=update.effective_user.id):
+            await self._handle_attendance(update, context)
+
+    async def _handle_attendance(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Reply with cached attendance, or scrape it and stream it in"""
         user_id = update.effective_user.id
         
-        if user_id not in user_data:
+        if user_id not in self.users:
             await update.message.reply_text(
                 "Please set up your credentials first using /start"
             )
             return
             
-        await update.message.reply_text("Fetching your attendance... Please wait.")
         user_logger.info(f"{user_id} - Requested attendance")
         
         try:
             # Check cache first
-            cached_data = self.get_cached_attendance(user_id)
-            if cached_data:
+            with span('cache_lookup') as lookup_span:
+                cached = self.get_cached_attendance(user_id)
+                lookup_span.set(result='miss' if not cached else 'hit' if cached.fresh else 'stale')
+            if cached:
                 user_logger.info(f"{user_id} - Using cached attendance data")
-                # Send cached data incrementally
-                for attendance_type, subjects in cached_data.items():
-                    await self.send_incremental_attendance(update, attendance_type, subjects)
+                note = None
+                if not cached.fresh:
+                    if self.erp_breaker.is_open:
+                        note = f"The ERP is not responding, showing attendance from {format_age(cached.age)} ago."
+                    elif self.refresh_in_background(user_id):
+                        # Reply instantly with the old data and refresh it in the background
+                        note = f"Showing attendance from {format_age(cached.age)} ago, refreshing in the background."
+                    else:
+                        note = f"Showing attendance from {format_age(cached.age)} ago."
+                await self.send_cached(update, cached, note)
+                return
+            
+            if self.erp_breaker.is_open:
+                await self.reply_erp_down(update, user_id, self.erp_breaker.retry_after)
                 return
             
-            print(f"Attempting login with username: {user_data[user_id]['username']}")
-            all_attendance_data = await self.check_attendance(user_id)
+            with TELEGRAM_SEND_SECONDS.labels(method="reply_text").time():
+                message = await update.message.reply_text("Fetching your attendance... Please wait.")
+            
+            # Edit the same message as each attendance type is scraped
+            reply = ProgressiveReply(message)
+            
+            async def show_section(attendance_type, text):
+                await reply.add(attendance_type, text)
+            
+            async def show_position(position):
+                user_logger.info(f"{user_id} - Queued at position {position}")
+                await reply.status(
+                    f"You are #{position} in the queue, your attendance will be fetched shortly..."
+                )
+            
+            try:
+                report = await self.fetch_attendance(
+                    user_id, on_section=show_section, on_queued=show_position, user_request=True
+                )
+            except RateLimited as e:
+                user_logger.info(f"{user_id} - Rate limited")
+                await reply.fail(
+                    f"You're checking too often. Please try again in {format_age(e.retry_after)}."
+                )
+                return
+            except SchedulerFull:
+                user_logger.info(f"{user_id} - Rejected, queue full")
+                await reply.fail("The bot is busy right now. Please try again in a few minutes.")
+                return
+            except CircuitOpen as e:
+                await reply.fail("The ERP is not responding right now.")
+                await self.reply_erp_down(update, user_id, e.retry_after)
+                return
+            except Exception as e:
+                logger.error(f"Error in attendance command: {str(e)}")
+                user_logger.error(f"{user_id} - Error fetching attendance: {str(e)}")
+                await reply.fail(
+                    "Sorry, there was an error fetching your attendance. Please try again later."
+                )
+                return
             
-            if all_attendance_data and len(all_attendance_data) > 0:
-                # Cache the new data
-                self.cache_attendance(user_id, all_attendance_data)
-                
-                # Send data incrementally by type
-                for attendance_type, subjects in all_attendance_data.items():
-                    await self.send_incremental_attendance(update, attendance_type, subjects)
+            if report:
+                # Add whatever was not streamed (e.g. when joining another fetch)
+                for attendance_type in report.sections:
+                    if attendance_type not in reply:
+                        await show_section(attendance_type, report.text(attendance_type))
+                await reply.finish()
+                user_logger.info(f"{user_id} - Sent attendance data in {reply.edits} edits")
             else:
-                await update.message.reply_text(
+                await reply.fail(
                     "Sorry, I couldn't fetch your attendance data. Please try again later."
                 )
                 user_logger.error(f"{user_id} - No attendance data retrieved")
@@ -248,298 +526,733 @@ class ERPBot:
                 "Sorry, there was an error fetching your attendance. Please try again later."
             )
 
-    async def captcha_worker(self):
-        """Background worker for solving captchas"""
-        logger.info("Starting captcha worker")
-        while True:
+    async def send_cached(self, update, cached, note=None):
+        """Send cached attendance, with an optional note on top, in as few messages as possible"""
+        parts = [note + "\n\n"] if note else []
+        # Replies are rendered when the data is cached
+        parts.extend(cached.data.texts())
+        for message in split_message(parts):
+            with TELEGRAM_SEND_SECONDS.labels(method="reply_text").time():
+                await update.message.reply_text(message)
+
+    async def reply_erp_down(self, update, user_id, retry_after):
+        """Answer from the last known attendance, however old, while the ERP is down"""
+        user_logger.info(f"{user_id} - ERP circuit open")
+        cached = self.attendance_cache.last_known(user_id)
+        if cached:
+            await self.send_cached(
+                update, cached, f"The ERP is not responding, showing attendance from {format_age(cached.age)} ago."
+            )
+        else:
+            await update.message.reply_text(
+                f"The ERP is not responding right now. Please try again in {format_age(retry_after)}."
+            )
+
+    async def fetch_attendance(self, user_id, on_section=None, on_queued=None, priority=None,
+                               user_request=False):
+        """Fetch attendance, joining a fetch for the same user that is already running
+
+        New fetches go through the scheduler; `user_request` charges the
+        user's rate limit. `on_section` and `on_queued` only see events when
+        this call starts the fetch.
+        """
+        # Fail fast while the ERP is down, before charging the rate limit
+        self.erp_breaker.check()
+        if user_request and not self.inflight.in_flight(user_id):
+            self.scheduler.check_rate(user_id)
+        if priority is None:
+            priority = self.scheduler.priority_for(user_id)
+        
+        return await self.inflight.do(user_id, lambda: self.scheduler.run(
+            user_id,
+            lambda: self._fetch_and_cache(user_id, on_section, priority),
+            priority=priority,
+            on_queued=on_queued,
+        ))
+
+    def refresh_in_background(self, user_id):
+        """Refresh a user's cached attendance without waiting for it
+
+        The refresh is a scrape the user asked for, so it is charged to
+        their rate limit. Returns False when it was not started because the
+        user is rate limited.
+        """
+        if self.inflight.in_flight(user_id):
+            return True
+        try:
+            self.scheduler.check_rate(user_id)
+        except RateLimited:
+            user_logger.info(f"{user_id} - Rate limited, not refreshing stale attendance")
+            return False
+        
+        async def refresh():
             try:
-                # Get the next captcha solving request
-                await self.captcha_queue.get()
-                
-                # Solve the captcha
-                logger.info("Solving captcha in background...")
-                solver = TwoCaptcha(self.captcha_api_key)
-                
-                result = solver.recaptcha(
-                    sitekey="6Le73cMbAAAAANUPFMh89e5vPsfwqyiwAh8x4ylp",
-                    url=self.erp_url,
-                    version='v2'
-                )
-                
-                # Update the solution
-                self.captcha_solution = result['code']
-                self.last_captcha_time = datetime.now()
-                logger.info("Captcha solved successfully in background")
-                
-                # Signal that a new captcha is ready
-                self.captcha_ready.set()
-                
-                # Clear the queue of any pending requests while we have a fresh solution
-                while not self.captcha_queue.empty():
-                    try:
-                        self.captcha_queue.get_nowait()
-                    except asyncio.QueueEmpty:
-                        break
-                        
+                await self.fetch_attendance(user_id, priority=self.scheduler.priority_for(user_id, cached=True))
+                user_logger.info(f"{user_id} - Refreshed stale attendance in background")
             except Exception as e:
-                logger.error(f"Error in captcha worker: {str(e)}")
-                # Reset the event in case of error
-                self.captcha_ready.clear()
-            finally:
-                # Mark the task as done
-                self.captcha_queue.task_done()
-
-    async def solve_captcha(self):
-        """Request a captcha solution asynchronously"""
-        try:
-            # Clear previous ready state
-            self.captcha_ready.clear()
-            
-            # Queue a captcha solving request
-            await self.captcha_queue.put(True)
+                user_logger.error(f"{user_id} - Background refresh failed: {str(e)}")
+        
+        task = asyncio.create_task(refresh())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return True
+
+    async def prefetch_attendance(self, user_id):
+        """Warm the cache for a user unless it is already fresh"""
+        if user_id not in self.users or self.attendance_cache.is_fresh(user_id):
+            return
+        with trace('prefetch', user_id=user_id):
+            await self.fetch_attendance(user_id, priority=PRIORITY_BACKGROUND)
+
+    async def _fetch_and_cache(self, user_id, on_section=None, priority=0):
+        """Scrape attendance once and fill the cache with the result
+
+        Returns an AttendanceReport. `on_section` gets each type's rendered
+        text as soon as it is scraped, or all at once from a worker.
+        """
+        if self.job_queue:
+            report = await self.erp_breaker.call(lambda: self.run_job(user_id, priority))
+            if on_section:
+                for attendance_type in report.sections:
+                    await on_section(attendance_type, report.text(attendance_type))
+        else:
+            report = await self.erp_breaker.call(lambda: self.scrape(user_id, on_section))
+        
+        if report:
+            self.cache_attendance(user_id, report)
+            self.history.record(user_id, report)
             
-            # Wait for the solution with a timeout
+            # Push changes the user has not seen; /attendance replies show them already
+            changes = self.subscriptions.update(user_id, report)
+            if changes and on_section is None:
+                await self.notify_changes(user_id, changes)
+        return report
+
+    def open_job_queue(self):
+        return JobQueue(
+            data_dir / "jobs.db",
+            visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+            max_attempts=JOB_MAX_ATTEMPTS,
+        )
+
+    async def run_job(self, user_id, priority):
+        """Have a worker process scrape attendance and wait for its report"""
+        job_id = self.job_queue.enqueue(user_id, priority)
+        with span('job', job_id=job_id):
             try:
-                await asyncio.wait_for(self.captcha_ready.wait(), timeout=30)
-                return True
-            except asyncio.TimeoutError:
-                logger.error("Captcha solving timed out")
-                return False
-                
+                # Room for every attempt to time out, plus time spent queued
+                result = await self.job_queue.wait(job_id, timeout=JOB_VISIBILITY_TIMEOUT * (JOB_MAX_ATTEMPTS + 1))
+            except JobFailed as e:
+                # Re-raise the worker's ERP errors as themselves, for the breaker and the reply
+                message = str(e).partition(": ")[2]
+                if e.error_type == CircuitOpen.__name__:
+                    # The worker's circuit is open: answer from the cache like the in-process path
+                    raise CircuitOpen(e.retry_after if e.retry_after is not None else ERP_BREAKER_RECOVERY) from e
+                if e.error_type == ERPLoginError.__name__:
+                    raise ERPLoginError(message) from e
+                if e.error_type == ERPScrapeError.__name__:
+                    raise ERPScrapeError(message) from e
+                raise
+        return AttendanceReport.from_json(result)
+
+    async def scrape(self, user_id, on_section=None):
+        """Scrape attendance into an AttendanceReport, passing each rendered section to `on_section`"""
+        report = AttendanceReport()
+        async for attendance_type, subjects in self.check_attendance(user_id):
+            report.add(attendance_type, subjects)
+            if on_section:
+                await on_section(attendance_type, report.text(attendance_type))
+        return report
+
+    async def scrape_job(self, job):
+        """Worker side of run_job: scrape one user and return the report as JSON"""
+        with trace('job', user_id=job.user_id, job_id=job.job_id, attempt=job.attempts):
+            # A worker's breaker refuses jobs while the ERP is down; run_worker defers
+            # them until the circuit half-opens, without using up their attempts
+            report = await self.erp_breaker.call(lambda: self.scrape(job.user_id))
+        if not report:
+            raise RuntimeError("No attendance data retrieved")
+        return report.to_json()
+
+    async def subscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Opt in to attendance change notifications"""
+        user_id = update.effective_user.id
+        
+        if user_id not in self.users:
+            await update.message.reply_text(
+                "Please set up your credentials first using /start"
+            )
+            return
+        
+        # Whatever is cached is the baseline, otherwise the first check sets it
+        cached = self.attendance_cache.get(user_id)
+        self.subscriptions.subscribe(user_id, cached.data if cached else None)
+        user_logger.info(f"{user_id} - Subscribed to attendance changes")
+        await update.message.reply_text(
+            "Subscribed! I'll message you when your attendance changes. Use /unsubscribe to stop."
+        )
+
+    async def unsubscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Stop attendance change notifications"""
+        user_id = update.effective_user.id
+        self.subscriptions.unsubscribe(user_id)
+        user_logger.info(f"{user_id} - Unsubscribed from attendance changes")
+        await update.message.reply_text("You will no longer get attendance change notifications.")
+
+    async def show_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /history [days]: attendance percentage over time, from stored scrapes"""
+        user_id = update.effective_user.id
+        days = 30
+        if context.args:
+            try:
+                days = max(1, min(365, int(context.args[0])))
+            except ValueError:
+                await update.message.reply_text("Usage: /history [days], e.g. /history 30")
+                return
+        
+        series = self.history.series(user_id, days)
+        if not series:
+            await update.message.reply_text(
+                "No attendance history yet. Use /attendance and check back later."
+            )
+            return
+        
+        parts = [f"📈 Attendance over the last {days} days:\n\n"]
+        current_type = None
+        for (attendance_type, subject), points in series.items():
+            if attendance_type != current_type:
+                current_type = attendance_type
+                parts.append(f"📊 {attendance_type}\n")
+            _, first_total, first_present = points[0]
+            _, last_total, last_present = points[-1]
+            line = f"{subject}\n{sparkline([percentage(p, t) for _, t, p in points])} "
+            line += f"{percentage(first_present, first_total):.1f}% → {percentage(last_present, last_total):.1f}%"
+            if last_total > first_total:
+                line += f" ({last_present - first_present}/{last_total - first_total} attended)"
+            parts.append(line + "\n\n")
+        
+        for message in split_message(parts):
+            await update.message.reply_text(message)
+        user_logger.info(f"{user_id} - Viewed {days} day history")
+
+    async def show_trend(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /trend: how many lectures can be missed while staying at 75%"""
+        user_id = update.effective_user.id
+        latest = self.history.latest(user_id)
+        if not latest:
+            await update.message.reply_text(
+                "No attendance history yet. Use /attendance and check back later."
+            )
+            return
+        
+        parts = ["🎯 Staying at 75%:\n\n"]
+        current_type = None
+        for (attendance_type, subject), (_, total, present) in latest.items():
+            if attendance_type != current_type:
+                current_type = attendance_type
+                parts.append(f"📊 {attendance_type}\n")
+            if not total:
+                parts.append(f"⚪ {subject}: no lectures yet\n")
+                continue
+            current = percentage(present, total)
+            if current >= 75:
+                advice = f"can miss {lectures_can_miss(present, total)} more"
+                emoji = "🟢"
+            else:
+                advice = f"attend the next {lectures_needed(present, total)} to reach 75%"
+                emoji = "🔴"
+            parts.append(f"{emoji} {subject}: {current:.1f}% ({present}/{total}), {advice}\n")
+        
+        for message in split_message(parts):
+            await update.message.reply_text(message)
+        user_logger.info(f"{user_id} - Viewed attendance trend")
+
+    async def new_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /newgroup <name>: create a class group (admins only)"""
+        user_id = update.effective_user.id
+        if user_id not in ADMIN_USER_IDS:
+            await update.message.reply_text("Only admins can create groups.")
+            return
+        if not context.args:
+            await update.message.reply_text("Usage: /newgroup <name>, e.g. /newgroup SE-A")
+            return
+        
+        name = " ".join(context.args)
+        join_code = self.groups.create(name, user_id)
+        if join_code is None:
+            await update.message.reply_text(f"A group called {name} already exists.")
+            return
+        user_logger.info(f"{user_id} - Created group {name}")
+        await update.message.reply_text(
+            f"Group {name} created. Students join it with:\n\n/join {join_code}\n\n"
+            f"Then use /classreport {name} for their attendance."
+        )
+
+    async def list_groups(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /groups: the admin's groups with their join codes"""
+        user_id = update.effective_user.id
+        if user_id not in ADMIN_USER_IDS:
+            await update.message.reply_text("Only admins have groups.")
+            return
+        groups = self.groups.admin_groups(user_id)
+        if not groups:
+            await update.message.reply_text("You have no groups yet. Create one with /newgroup <name>")
+            return
+        parts = ["👥 Your groups:\n\n"]
+        for name, join_code, members in groups:
+            parts.append(f"{name}: {members} students, join with /join {join_code}\n")
+        for message in split_message(parts):
+            await update.message.reply_text(message)
+
+    async def join_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /join <code>: let a group's admin see your attendance"""
+        user_id = update.effective_user.id
+        if user_id not in self.users:
+            await update.message.reply_text(
+                "Please set up your credentials first using /start"
+            )
+            return
+        if not context.args:
+            await update.message.reply_text("Usage: /join <code>, with the code from your class representative")
+            return
+        
+        name = self.groups.join(context.args[0], user_id)
+        if name is None:
+            await update.message.reply_text("Unknown group code.")
+            return
+        user_logger.info(f"{user_id} - Joined group {name}")
+        await update.message.reply_text(
+            f"You joined {name}. Its admin can now include your attendance in class reports. "
+            f"Use /leave {name} to opt out."
+        )
+
+    async def leave_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /leave <name>: stop sharing attendance with a group"""
+        user_id = update.effective_user.id
+        if not context.args:
+            await update.message.reply_text("Usage: /leave <group name>")
+            return
+        name = " ".join(context.args)
+        if self.groups.leave(name, user_id):
+            user_logger.info(f"{user_id} - Left group {name}")
+            await update.message.reply_text(f"You left {name}.")
+        else:
+            await update.message.reply_text(f"You are not in a group called {name}.")
+
+    async def group_reports(self, user_ids):
+        """AttendanceReports for many users, cached ones first, the rest fetched in the background
+
+        Users whose attendance cannot be fetched are left out.
+        """
+        semaphore = asyncio.Semaphore(CLASSREPORT_CONCURRENCY)
+        
+        async def report_for(user_id):
+            # Stale entries are fine for a class overview and cost no login
+            cached = self.attendance_cache.get(user_id)
+            if cached:
+                return cached.data
+            if user_id not in self.users:
+                return None
+            async with semaphore:
+                try:
+                    return await self.fetch_attendance(user_id, priority=PRIORITY_BACKGROUND)
+                except Exception as e:
+                    user_logger.error(f"{user_id} - Class report fetch failed: {str(e)}")
+                    return None
+        
+        reports = await asyncio.gather(*(report_for(user_id) for user_id in user_ids))
+        return [report for report in reports if report]
+
+    async def class_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /classreport <name> [csv]: per-subject attendance across a group"""
+        user_id = update.effective_user.id
+        args = list(context.args or ())
+        as_csv = bool(args) and args[-1].lower() == 'csv'
+        if as_csv:
+            args.pop()
+        if not args:
+            await update.message.reply_text("Usage: /classreport <group name> [csv]")
+            return
+        
+        name = " ".join(args)
+        group = self.groups.get(name)
+        if group is None or group[3] != user_id:
+            await update.message.reply_text(f"You have no group called {name}. See /groups")
+            return
+        group_id, name = group[0], group[1]
+        members = self.groups.members(group_id)
+        if not members:
+            await update.message.reply_text(f"Nobody has joined {name} yet. See /groups for its join code.")
+            return
+        
+        await update.message.reply_text(f"Collecting attendance for {len(members)} students...")
+        with trace('classreport', user_id=user_id, students=len(members)):
+            reports = await self.group_reports(members)
+            stats = aggregate(reports)
+        if not stats:
+            await update.message.reply_text("Could not fetch anyone's attendance. Please try again later.")
+            return
+        
+        if as_csv:
+            await update.message.reply_document(
+                document=render_csv(stats),
+                filename=f"{name}.csv",
+                caption=f"{name}: {len(reports)}/{len(members)} students",
+            )
+        else:
+            for message in split_message(render_summary(name, stats, len(reports), len(members))):
+                await update.message.reply_text(message)
+        user_logger.info(f"{user_id} - Class report for {name}, {len(reports)}/{len(members)} students")
+
+    async def check_subscriptions(self):
+        """Re-fetch every subscriber's attendance so changes get pushed"""
+        semaphore = asyncio.Semaphore(SUBSCRIPTION_CONCURRENCY)
+        
+        async def check(user_id):
+            async with semaphore:
+                if user_id not in self.users:
+                    self.subscriptions.unsubscribe(user_id)
+                    return
+                # A fresh cache entry was already diffed when it was fetched
+                if self.attendance_cache.is_fresh(user_id):
+                    return
+                try:
+                    with trace('subscription', user_id=user_id):
+                        await self.fetch_attendance(user_id, priority=PRIORITY_BACKGROUND)
+                except Exception as e:
+                    user_logger.error(f"{user_id} - Subscription check failed: {str(e)}")
+        
+        user_ids = self.subscriptions.user_ids()
+        logger.info(f"Checking attendance changes for {len(user_ids)} subscribers")
+        await asyncio.gather(*(check(user_id) for user_id in user_ids))
+
+    async def notify_changes(self, user_id, changes):
+        """Send a subscriber the list of changes"""
+        text = "📬 Attendance update:\n\n" + "\n".join(changes)
+        try:
+            for message in split_message([text]):
+                with TELEGRAM_SEND_SECONDS.labels(method="send_message").time():
+                    await self.application.bot.send_message(chat_id=user_id, text=message)
+            user_logger.info(f"{user_id} - Notified of {len(changes)} attendance changes")
         except Exception as e:
-            logger.error(f"Error requesting captcha solution: {str(e)}")
-            return False
+            user_logger.error(f"{user_id} - Error sending change notification: {str(e)}")
 
-    async def refresh_captcha(self):
-        """Refresh captcha solution if it's older than 110 seconds"""
-        if (not self.last_captcha_time or 
-            (datetime.now() - self.last_captcha_time).total_seconds() > 110):
-            # Queue a new captcha solution request
-            await self.solve_captcha()
+    def create_captcha_solver(self):
+        """Create the configured captcha provider"""
+        if CAPTCHA_PROVIDER == 'fake':
+            logger.warning("Using fake captcha solver, logins will fail against the real ERP")
+            return FakeCaptchaSolver()
+        return TwoCaptchaSolver(self.captcha_api_key, self.erp_url)
 
-    async def initialize_browser(self):
-        """Initialize browser and load login page"""
+    async def launch_browser(self, slot):
+        """Launch a browser for a pool slot and load the login page"""
+        from selenium.webdriver.common.by import By
+        
+        driver = None
         try:
-            if self.driver:
-                try:
-                    await self.save_cookies()  # Save cookies before quitting
-                    self.driver.quit()
-                except:
-                    pass
-            
-            logger.info("Initializing browser...")
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=self.chrome_options)
+            logger.info(f"Initializing browser {slot}...")
+            chrome = await self._run_blocking('launch', self._start_chrome)
+            driver = AsyncDriver(chrome, self.driver_executor, self.driver_metrics)
             
             # Navigate to login page
-            logger.info("Pre-loading login page...")
-            self.driver.get(self.erp_url)
-            
-            # Try to load cookies
-            cookies_loaded = await self.load_cookies()
-            if cookies_loaded:
-                # Refresh page to apply cookies
-                self.driver.refresh()
+            logger.info(f"Pre-loading login page in browser {slot}...")
+            await driver.get(self.erp_url)
             
             # Wait for login form to be ready
-            await self._wait_for_element(self.driver, By.ID, "txtUSERNAME")
-            await self._wait_for_element(self.driver, By.ID, "txtPASSWORD")
-            
-            # Pre-solve captcha
-            await self.solve_captcha()
-            
-            self.is_browser_ready = True
-            logger.info("Browser initialized and ready")
-            return True
-        except Exception as e:
-            logger.error(f"Error initializing browser: {str(e)}")
-            self.is_browser_ready = False
-            if self.driver:
+            await self._wait_for_element(driver, By.ID, "txtUSERNAME")
+            await self._wait_for_element(driver, By.ID, "txtPASSWORD")
+            return driver
+        except Exception:
+            if driver:
                 try:
-                    self.driver.quit()
+                    await driver.quit()
                 except:
                     pass
-            self.driver = None
+            raise
+
+    def _start_chrome(self):
+        """Start a Chrome process (blocking, runs on the driver executor)"""
+        from selenium import webdriver
+        from selenium.common.exceptions import SessionNotCreatedException
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        
+        chrome_options = Options()
+        for argument in self.chrome_arguments:
+            chrome_options.add_argument(argument)
+        path = self.chromedriver_path()
+        try:
+            chrome = webdriver.Chrome(service=Service(path), options=chrome_options)
+        except SessionNotCreatedException:
+            # The remembered driver no longer matches Chrome, resolve it once more
+            invalidate_chromedriver(CHROMEDRIVER_CACHE_FILE)
+            retry_path = self.chromedriver_path()
+            if retry_path == path:
+                raise
+            logger.warning(f"chromedriver at {path} could not start Chrome, retrying with {retry_path}")
+            chrome = webdriver.Chrome(service=Service(retry_path), options=chrome_options)
+        try:
+            apply_profile(chrome, BROWSER_PROFILE, BROWSER_BLOCK_URLS)
+        except Exception:
+            chrome.quit()
+            raise
+        return chrome
+
+    async def report_page_load(self, driver):
+        """Record the dashboard's load time and Chrome's memory after a login"""
+        try:
+            stats = await driver.execute_script(PAGE_STATS_JS)
+            memory = await driver.run('memory', chrome_memory_bytes, driver.driver)
+        except Exception as e:
+            logger.warning(f"Could not read page load stats: {str(e)}")
+            return
+        if stats.get('load_ms') is not None:
+            BROWSER_PAGE_LOAD_SECONDS.labels(profile=BROWSER_PROFILE).observe(stats['load_ms'] / 1000)
+        if memory is not None:
+            BROWSER_MEMORY_BYTES.labels(profile=BROWSER_PROFILE).observe(memory)
+            stats['chrome_mb'] = round(memory / 1024 / 1024, 1)
+        logger.info(f"Dashboard load ({BROWSER_PROFILE} profile): {stats}")
+
+    def chromedriver_path(self):
+        """Resolve chromedriver once, reusing the path from earlier runs (blocking)"""
+        return resolve_chromedriver(CHROMEDRIVER_CACHE_FILE)
+
+    async def _run_blocking(self, operation, fn, *args):
+        """Run a blocking call on the driver executor"""
+        return await run_blocking(self.driver_executor, self.driver_metrics, operation, fn, *args)
+
+    async def check_browser(self, driver):
+        """Check that a browser is responsive and sitting on the login page"""
+        from selenium.webdriver.common.by import By
+        
+        try:
+            current_url = await driver.current_url()
+        except Exception:
             return False
+        
+        # Go back to login page if we're not on it
+        if self.erp_url not in current_url:
+            await driver.get(self.erp_url)
+            await self._wait_for_element(driver, By.ID, "txtUSERNAME")
+        return True
 
-    async def refresh_browser_session(self):
-        """Refresh browser session if needed"""
+    async def close_browser(self, slot, driver):
+        """Quit a browser"""
         try:
-            if not self.driver or not self.is_browser_ready:
-                return await self.initialize_browser()
-            
-            # Check if browser is still responsive
-            try:
-                self.driver.current_url
-                # Refresh page if we're not on login page
-                if self.erp_url not in self.driver.current_url:
-                    await self.save_cookies()  # Save cookies before navigating
-                    self.driver.get(self.erp_url)
-                    await self.load_cookies()  # Load cookies after navigation
-                    await self._wait_for_element(self.driver, By.ID, "txtUSERNAME")
-                return True
-            except:
-                return await self.initialize_browser()
+            await driver.quit()
         except:
-            return await self.initialize_browser()
+            pass
 
     async def check_attendance(self, user_id):
-        """Check attendance using Selenium with improved error handling"""
+        """Yield (attendance_type, subjects) as each section is scraped
+
+        Scraped rows are parsed into SubjectAttendance records here, once.
+        """
+        sections = asyncio.Queue()
+        
+        async def on_section(attendance_type, rows):
+            sections.put_nowait((attendance_type, normalize_rows(rows)))
+        
+        scrape = asyncio.create_task(self._scrape_sections(user_id, on_section))
+        scrape.add_done_callback(lambda _: sections.put_nowait(None))
+        try:
+            while True:
+                section = await sections.get()
+                if section is None:
+                    break
+                yield section
+            # Surface scraping errors to the consumer
+            await scrape
+        finally:
+            if not scrape.done():
+                scrape.cancel()
+
+    async def _scrape_sections(self, user_id, on_section):
+        """Check attendance over HTTP, falling back to a pooled Selenium browser"""
         try:
-            # Ensure browser is ready
-            if not await self.refresh_browser_session():
-                raise Exception("Browser initialization failed")
-
-            # Ensure we have a fresh captcha solution
-            await self.refresh_captcha()
-            if not self.captcha_solution:
-                raise Exception("No valid captcha solution available")
+            if user_id not in self.users:
+                raise Exception("No credentials stored for this user")
+            
+            # Credentials are only decrypted when a login actually needs them
+            def get_credentials():
+                credentials = self.users.get_credentials(user_id)
+                if not credentials:
+                    raise Exception("No credentials stored for this user")
+                logger.debug(f"Logging in user {user_id}")
+                return credentials
+            
+            # Reuse the user's ERP session if we have one, a captcha token
+            # (each one is only used once) is only taken on a fresh login
+            session = self.users.get_session(user_id)
+            
+            async def get_captcha_token():
+                with span('captcha', pooled=self.captcha_pool.available):
+                    return await self.captcha_pool.get_token()
+            
+            if self.http_scraper:
+                try:
+                    with span('backend', backend='http'):
+                        _, session = await self.http_scraper.fetch_attendance(
+                            get_credentials, get_captcha_token, session, on_section
+                        )
+                    self.users.save_session(user_id, session)
+                    return
+                except ERPLoginError:
+                    self.users.delete_session(user_id)
+                    raise
+                except ERP_UNAVAILABLE:
+                    # The ERP is down for the browser too; let the breaker see it
+                    raise
+                except Exception as e:
+                    # Pages the parser did not expect may still work in a browser
+                    logger.error(f"HTTP backend failed, falling back to Selenium: {str(e)}")
+            
+            # Check out a warm browser sitting on the login page
+            with span('backend', backend='selenium'):
+                async with self.browser_pool.browser() as driver:
+                    _, session = await self._scrape_attendance(
+                        driver, get_credentials, get_captcha_token, session, on_section
+                    )
+            self.users.save_session(user_id, session)
+            
+        except Exception as e:
+            logger.error(f"Error during attendance check: {str(e)}")
+            raise
+
+    async def _resume_session(self, driver, session):
+        """Open the dashboard with a user's stored cookies, False if the session expired"""
+        from selenium.webdriver.common.by import By
+        
+        # The browser sits on the login page, so cookies for the ERP domain can be set
+        await driver.delete_all_cookies()
+        for cookie in session.get('cookies', []):
+            await driver.add_cookie(cookie)
+        await driver.get(session['url'])
+        
+        if await driver.find_elements(By.ID, "txtPASSWORD"):
+            logger.info("Stored ERP session expired")
+            await driver.delete_all_cookies()
+            await driver.get(self.erp_url)
+            await self._wait_for_element(driver, By.ID, "txtUSERNAME")
+            return False
+        
+        logger.info("Reusing stored ERP session")
+        return True
+
+    async def _scrape_attendance(self, driver, get_credentials, get_captcha_token, session=None,
+                                 on_section=None):
+        """Log in with a pooled browser and extract all attendance tables"""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from grid_extraction import extract_grids_in_tabs, extract_grids_sequential
+        
+        login_started = None
+        resumed = False
+        if session:
+            with span('resume_session', backend='selenium') as resume_span:
+                resumed = await self._resume_session(driver, session)
+                resume_span.set(resumed=resumed)
+        if not resumed:
+            username, password = get_credentials()
+            captcha_token = await get_captcha_token()
+            login_started = time_module.perf_counter()
+            submitted_at_ms = time_module.time() * 1000
             
             # Fill credentials and submit form with captcha in one go
-            self.driver.execute_script(
+            await driver.execute_script(
                 """
                 document.getElementById('txtUSERNAME').value = arguments[0];
                 document.getElementById('txtPASSWORD').value = arguments[1];
                 document.getElementById('g-recaptcha-response').innerHTML = arguments[2];
                 document.getElementById('btnSUBMIT').click();
                 """,
-                user_data[user_id]["username"],
-                user_data[user_id]["password"],
-                self.captcha_solution
+                username,
+                password,
+                captcha_token
             )
             logger.info("Login submitted with pre-solved captcha")
-            
-            # Brief wait for page load
-            await asyncio.sleep(1)  # Reduced from 2s to 1s for optimization
-
-            # Dictionary to store all attendance data
-            all_attendance_data = {}
-            
-            # Function to extract data from a table
-            async def extract_table_data(table_id, attendance_type):
-                try:
-                    # Wait for table to be present and visible
-                    table = WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.ID, table_id))
-                    )
-                    
-                    # Wait for table to be visible
-                    WebDriverWait(self.driver, 10).until(
-                        EC.visibility_of_element_located((By.ID, table_id))
-                    )
-                    
-                    # Scroll to table and reduced wait
-                    self.driver.execute_script("arguments[0].scrollIntoView(true);", table)
-                    await asyncio.sleep(0.5)  # Back to 0.5s wait after scroll
-                    
-                    # Wait for table data
-                    WebDriverWait(self.driver, 10).until(
-                        lambda d: len(d.find_element(By.ID, table_id).find_elements(By.TAG_NAME, "tr")) > 1 and
-                                len(d.find_element(By.ID, table_id).find_elements(By.TAG_NAME, "td")) > 0
-                    )
-                    
-                    # Optimized retry mechanism
-                    max_retries = 2
-                    for attempt in range(max_retries):
-                        attendance_data = []
-                        rows = table.find_elements(By.TAG_NAME, "tr")
-                        
-                        # Skip header row
-                        for row in rows[1:]:
-                            cells = row.find_elements(By.TAG_NAME, "td")
-                            if len(cells) >= 6:
-                                subject = cells[1].text.strip()
-                                # Only add if we have actual subject text
-                                if subject:
-                                    attendance_data.append({
-                                        "subject": subject,
-                                        "total_lectures": cells[2].text.strip(),
-                                        "present": cells[3].text.strip(),
-                                        "absent": cells[4].text.strip(),
-                                        "percentage": cells[5].text.strip()
-                                    })
-                        
-                        # If we got data, return it
-                        if attendance_data:
-                            return attendance_data
-                        
-                        # If no data, wait and retry
-                        await asyncio.sleep(0.5)
-                    
-                    logger.error(f"Failed to get data for {attendance_type} table after {max_retries} attempts")
-                    return []
-                    
-                except Exception as e:
-                    logger.error(f"Error finding {attendance_type} table: {str(e)}")
-                    return []
 
-            # Wait for the attendance section
-            try:
-                attendance_section = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, "attendanceW"))
+        # Wait for the attendance section, polling instead of a fixed sleep
+        try:
+            step = 'page' if resumed else 'login'
+            with ERP_LATENCY.measure(step):
+                attendance_section = await driver.wait_until(
+                    EC.presence_of_element_located((By.CLASS_NAME, "attendanceW")),
+                    timeout=ERP_LATENCY.timeout(step),
                 )
+            if login_started is not None:
+                login_seconds = time_module.perf_counter() - login_started
+                LOGIN_SECONDS.labels(backend="selenium").observe(login_seconds)
+                logger.info(f"Selenium login took {login_seconds:.1f}s")
+                await self.report_page_load(driver)
+            dashboard_url = await driver.current_url()
+            
+            if EXTRACTION_MODE == 'dom':
                 # Scroll to attendance section
-                self.driver.execute_script("arguments[0].scrollIntoView(true);", attendance_section)
+                await driver.execute_script("arguments[0].scrollIntoView(true);", attendance_section)
                 await asyncio.sleep(0.5)  # Back to 0.5s wait after scroll
 
-                # Get Theory attendance
-                logger.info("Extracting Theory attendance")
-                theory_data = await extract_table_data("ctl00_ContentPlaceHolder1_ctl03_grdTHERORY", "Theory")
-                if theory_data:
-                    all_attendance_data["Theory"] = theory_data
+            # Collect the grid for every attendance type
+            if PARALLEL_GRIDS and EXTRACTION_MODE == 'js':
+                all_attendance_data = await extract_grids_in_tabs(
+                    driver, dashboard_url, on_section,
+                    prepare_tab=lambda: driver.run(
+                        'apply_profile', apply_profile, driver.driver, BROWSER_PROFILE, BROWSER_BLOCK_URLS
+                    ),
+                )
+            else:
+                all_attendance_data = await extract_grids_sequential(driver, EXTRACTION_MODE, on_section)
 
-                # Click Practical radio button and get Practical attendance
-                logger.info("Extracting Practical attendance")
-                try:
-                    practical_radio = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, "//input[@type='radio' and following-sibling::text()='Practical']"))
-                    )
-                    self.driver.execute_script("arguments[0].click();", practical_radio)
-                    await asyncio.sleep(0.2)  # Wait after click
-                    practical_data = await extract_table_data("ctl00_ContentPlaceHolder1_ctl03_grdpract", "Practical")
-                    if practical_data:
-                        all_attendance_data["Practical"] = practical_data
-                except Exception as e:
-                    logger.error(f"Error getting practical attendance: {str(e)}")
+        except TimeoutException as e:
+            if login_started is not None and await self._back_on_login_page(driver, submitted_at_ms):
+                raise ERPLoginError("ERP returned the login page after submitting credentials") from e
+            logger.error("Could not find attendance section")
+            raise ERPScrapeError("Attendance page did not load in time") from e
+        except Exception as e:
+            logger.error("Could not find attendance section")
+            raise ERPScrapeError("Failed to load attendance page") from e
 
-                # Click Tutorial radio button and get Tutorial attendance
-                logger.info("Extracting Tutorial attendance")
-                try:
-                    tutorial_radio = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, "//input[@type='radio' and following-sibling::text()='Tutorial']"))
-                    )
-                    self.driver.execute_script("arguments[0].click();", tutorial_radio)
-                    await asyncio.sleep(0.2)  # Wait after click
-                    tutorial_data = await extract_table_data("ctl00_ContentPlaceHolder1_ctl03_grdtut", "Tutorial")
-                    if tutorial_data:
-                        all_attendance_data["Tutorial"] = tutorial_data
-                except Exception as e:
-                    logger.error(f"Error getting tutorial attendance: {str(e)}")
+        # Verify we have some valid data
+        if not any(all_attendance_data.values()):
+            raise ERPScrapeError("No attendance data could be retrieved")
 
-            except Exception as e:
-                logger.error("Could not find attendance section")
-                raise Exception("Failed to load attendance page")
+        # Keep the user's session, then clear it from the browser and
+        # return to login page for next request
+        session = {
+            'url': dashboard_url,
+            'cookies': [
+                {key: cookie[key] for key in ('name', 'value', 'domain', 'path') if key in cookie}
+                for cookie in await driver.get_cookies()
+            ],
+        }
+        await driver.delete_all_cookies()
+        await driver.get(self.erp_url)
+        await self._wait_for_element(driver, By.ID, "txtUSERNAME")
+        
+        return all_attendance_data, session
 
-            # Verify we have some valid data
-            if not any(all_attendance_data.values()):
-                raise Exception("No attendance data could be retrieved")
+    async def _back_on_login_page(self, driver, submitted_at_ms):
+        """Whether the ERP answered a login by serving the login page again
 
-            # Return to login page for next request
-            self.driver.get(self.erp_url)
-            await self._wait_for_element(self.driver, By.ID, "txtUSERNAME")
-            
-            return all_attendance_data
-            
-        except Exception as e:
-            logger.error(f"Error during attendance check: {str(e)}")
-            self.is_browser_ready = False
-            raise
+        A slow ERP also leaves the login form on screen, but that is still
+        the page loaded before the credentials were submitted.
+        """
+        try:
+            loaded_at_ms = await driver.execute_script(
+                "return document.getElementById('txtUSERNAME') ? performance.timing.navigationStart : null;"
+            )
+        except Exception:
+            return False
+        return loaded_at_ms is not None and loaded_at_ms >= submitted_at_ms
 
-    async def _wait_for_element(self, driver, by, value, timeout=5):
+    async def _wait_for_element(self, driver, by, value, timeout=None):
         """Helper method to wait for and return an element"""
-        return WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((by, value))
-        )
+        from selenium.webdriver.support import expected_conditions as EC
+        with ERP_LATENCY.measure('page'):
+            return await driver.wait_until(
+                EC.presence_of_element_located((by, value)), timeout=timeout or ERP_LATENCY.timeout('page')
+            )
 
     def extract_site_key(self, html):
         """Extract reCAPTCHA site key from login page"""
@@ -550,51 +1263,86 @@ class ERPBot:
 
     def extract_aspnet_field(self, html, field_name):
         """Extract ASP.NET form field value"""
-        import re
-        # Look for both id and name attributes since ASP.NET can use either
-        patterns = [
-            f'id="{field_name}" value="([^"]+)"',
-            f'name="{field_name}" value="([^"]+)"',
-            f'id="{field_name}".*?value="([^"]+)"',
-            f'name="{field_name}".*?value="([^"]+)"'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, html, re.DOTALL)
-            if match:
-                return match.group(1)
-                
-        print(f"Warning: Could not find {field_name} in form")
-        return ""
+        return extract_aspnet_field(html, field_name)
 
     async def reset(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Reset user credentials"""
         user_id = update.effective_user.id
         
         # Clear existing credentials for this user
-        if user_id in user_data:
-            del user_data[user_id]
-            self.save_user_data()
+        if user_id in self.users:
+            self.users.delete(user_id)
+        self.attendance_cache.delete(user_id)
+        self.subscriptions.unsubscribe(user_id)
+        self.history.delete(user_id)
+        self.groups.delete_user(user_id)
         
         await update.message.reply_text(
             "Your credentials have been reset. Please use /start to enter new credentials."
         )
         return ConversationHandler.END
 
+    async def warm_up(self):
+        """Resolve chromedriver, launch browsers and stock a first captcha token, all at once"""
+        async def timed(phase, coro):
+            started = time_module.perf_counter()
+            try:
+                await coro
+            except Exception as e:
+                logger.error(f"Warm-up phase {phase} failed: {str(e)}")
+            self.startup_timings[phase] = round(time_module.perf_counter() - started, 3)
+        
+        phases = [
+            timed('chromedriver', self._run_blocking('chromedriver', self.chromedriver_path)),
+            timed('first_captcha', self.captcha_pool.wait_until_stocked()),
+        ]
+        # With the HTTP backend browsers are only launched on first fallback
+        if not self.http_scraper:
+            phases.append(timed('browser_pool', self.browser_pool.start()))
+        await asyncio.gather(*phases)
+        
+        self.startup_timings['warm'] = round(time_module.perf_counter() - STARTUP_BEGAN, 3)
+        logger.info(f"Warm-up finished: {self.startup_timings}")
+
     async def run(self):
         """Run the bot"""
-        # Start the captcha worker
-        self.captcha_task = asyncio.create_task(self.captcha_worker())
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        from apscheduler.triggers.cron import CronTrigger
         
-        # Initialize browser and pre-solve captcha when starting the server
-        await self.initialize_browser()
+        # Serve /healthz and /metrics from the start
+        await self.web_server.start()
         
-        # Set up periodic captcha refresh and browser check (every 110 seconds)
         scheduler = AsyncIOScheduler()
-        scheduler.add_job(self.refresh_browser_session, 'interval', seconds=110)
+        if self.job_queue:
+            # Workers own the browsers and captchas; just drop old results
+            scheduler.add_job(self.job_queue.purge, 'interval', minutes=10)
+        else:
+            # Start pre-solving captchas in the background
+            self.captcha_pool.start()
+            
+            # Set up periodic browser health checks (every 110 seconds)
+            scheduler.add_job(self.browser_pool.maintain, 'interval', seconds=110)
+        scheduler.add_job(self.log_metrics, 'interval', seconds=600)
+        if SUBSCRIPTION_INTERVAL > 0:
+            scheduler.add_job(self.check_subscriptions, 'interval', minutes=SUBSCRIPTION_INTERVAL)
+        
+        # Batch pre-fetch at the start of every off-peak window
+        for window_start, window_end in PREFETCH_WINDOWS:
+            scheduler.add_job(
+                self.prefetch_crawler.run_once,
+                CronTrigger(hour=window_start.hour, minute=window_start.minute)
+            )
         scheduler.start()
         
-        self.application = Application.builder().token(self.telegram_token).build()
+        # Resume a crawl that was interrupted by a crash or restart
+        if self.prefetch_crawler.has_unfinished_run and in_window(PREFETCH_WINDOWS):
+            scheduler.add_job(self.prefetch_crawler.run_once)
+        
+        builder = Application.builder().token(self.telegram_token)
+        if WEBHOOK_URL:
+            # Updates come from the web server instead of an Updater
+            builder = builder.updater(None)
+        self.application = builder.build()
 
         # Add conversation handler for initial setup
         conv_handler = ConversationHandler(
@@ -613,110 +1361,152 @@ class ERPBot:
         self.application.add_handler(conv_handler)
         self.application.add_handler(CommandHandler('attendance', self.attendance))
         self.application.add_handler(CommandHandler('reset', self.reset))
+        self.application.add_handler(CommandHandler('subscribe', self.subscribe))
+        self.application.add_handler(CommandHandler('unsubscribe', self.unsubscribe))
+        self.application.add_handler(CommandHandler('history', self.show_history))
+        self.application.add_handler(CommandHandler('trend', self.show_trend))
+        self.application.add_handler(CommandHandler('newgroup', self.new_group))
+        self.application.add_handler(CommandHandler('groups', self.list_groups))
+        self.application.add_handler(CommandHandler('join', self.join_group))
+        self.application.add_handler(CommandHandler('leave', self.leave_group))
+        self.application.add_handler(CommandHandler('classreport', self.class_report))
         
-        # Start the bot
+        # Start the bot before anything slow so users get answers right away
+        telegram_started = time_module.perf_counter()
         await self.application.initialize()
         await self.application.start()
-        await self.application.updater.start_polling()
+        if WEBHOOK_URL:
+            await self.application.bot.set_webhook(
+                WEBHOOK_URL + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            mode = 'webhook'
+        else:
+            await self.application.updater.start_polling()
+            mode = 'polling'
+        self.startup_timings['telegram'] = round(time_module.perf_counter() - telegram_started, 3)
+        self.startup_timings[mode] = round(time_module.perf_counter() - STARTUP_BEGAN, 3)
+        logger.info(f"Receiving updates by {mode} {self.startup_timings[mode]}s after launch: {self.startup_timings}")
+        
+        # Browsers, chromedriver and the first captcha warm up in the background
+        warm_up = None if self.job_queue else asyncio.create_task(self.warm_up())
         
         try:
-            # Keep the bot running
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
-            pass
+            await self.stop_signal().wait()
         finally:
-            # Cancel the captcha worker task
-            if self.captcha_task:
-                self.captcha_task.cancel()
-                try:
-                    await self.captcha_task
-                except asyncio.CancelledError:
-                    pass
+            if warm_up:
+                warm_up.cancel()
+            
+            # Stop taking updates; in webhook mode Telegram holds them until the next start
+            await self.web_server.stop()
+            
+            # Stop the captcha pool
+            await self.captcha_pool.stop()
             
             # Properly shut down the application
-            if self.application.updater.running:
+            if self.application.updater and self.application.updater.running:
                 await self.application.updater.stop()
             await self.application.stop()
             await self.application.shutdown()
+            
+            # Close all pooled browsers
+            scheduler.shutdown(wait=False)
+            await self.browser_pool.shutdown()
+            if self.http_scraper:
+                await self.http_scraper.aclose()
+            self.attendance_cache.close()
+            self.users.close()
+            self.subscriptions.close()
+            self.history.close()
+            self.groups.close()
+            if self.job_queue:
+                self.job_queue.close()
+            self.driver_executor.shutdown(wait=False)
 
-    async def save_cookies(self):
-        """Save browser cookies for session persistence"""
-        if self.driver:
-            try:
-                cookies = self.driver.get_cookies()
-                with open(Path("data/browser_cookies.pkl"), 'wb') as f:
-                    pickle.dump(cookies, f)
-                logger.info("Browser cookies saved successfully")
-            except Exception as e:
-                logger.error(f"Error saving cookies: {str(e)}")
+    def stop_signal(self):
+        """An event that is set on SIGINT or SIGTERM"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        return stop
 
-    async def load_cookies(self):
-        """Load saved browser cookies"""
+    async def run_worker(self):
+        """Run as a scraping worker: pull jobs from the shared queue, no Telegram"""
+        self.job_queue = self.job_queue or self.open_job_queue()
+        self.captcha_pool.start()
+        warm_up = asyncio.create_task(self.warm_up())
+        # Retrying a rejected login would only spend more captchas
+        worker = JobWorker(
+            self.job_queue, self.scrape_job, concurrency=WORKER_CONCURRENCY,
+            permanent=(ERPLoginError,), defer=(CircuitOpen,),
+        )
+        
         try:
-            with open(Path("data/browser_cookies.pkl"), 'rb') as f:
-                cookies = pickle.load(f)
-                for cookie in cookies:
-                    self.driver.add_cookie(cookie)
-            logger.info("Browser cookies loaded successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Error loading cookies: {str(e)}")
-            return False
+            await worker.run(self.stop_signal())
+        finally:
+            warm_up.cancel()
+            await self.captcha_pool.stop()
+            await self.browser_pool.shutdown()
+            if self.http_scraper:
+                await self.http_scraper.aclose()
+            self.job_queue.close()
+            self.attendance_cache.close()
+            self.users.close()
+            self.subscriptions.close()
+            self.history.close()
+            self.groups.close()
+            self.driver_executor.shutdown(wait=False)
+
+    def log_metrics(self):
+        """Log cache counters and per-call WebDriver latency stats"""
+        stats = self.attendance_cache.stats()
+        logger.info(
+            f"Attendance cache: {stats['entries']} entries, {stats['hits']} hits, "
+            f"{stats['stale_hits']} stale hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions"
+        )
+        logger.info(f"Request scheduler: {self.scheduler.stats()}")
+        logger.info(f"ERP circuit {self.erp_breaker.state}, step latency: {ERP_LATENCY.snapshot()}")
+        if self.job_queue:
+            logger.info(f"Job queue: {self.job_queue.stats()}")
+        if PREFETCH_WINDOWS:
+            logger.info(f"Prefetch progress: {self.prefetch_crawler.progress()}")
+        for operation, stats in sorted(self.driver_metrics.snapshot().items()):
+            logger.info(
+                f"WebDriver {operation}: {stats['count']} calls, "
+                f"avg {stats['avg_ms']}ms, max {stats['max_ms']}ms"
+            )
 
     def get_cached_attendance(self, user_id):
-        """Get cached attendance data if available and not expired"""
-        current_time = time_module.time()
-        if user_id in self.attendance_cache:
-            cached_data, timestamp = self.attendance_cache[user_id]
-            if current_time - timestamp < self.cache_timeout:
-                logger.info(f"Returning cached attendance data for user {user_id}")
-                return cached_data
-        return None
-
-    def cache_attendance(self, user_id, attendance_data):
-        """Cache attendance data with timestamp"""
-        current_time = time_module.time()
-        self.attendance_cache[user_id] = (attendance_data, current_time)
+        """Get cached attendance (fresh or stale) if available"""
+        cached = self.attendance_cache.get(user_id)
+        if cached:
+            logger.info(f"Returning cached attendance data for user {user_id}")
+        return cached
+
+    def cache_attendance(self, user_id, report):
+        """Cache an AttendanceReport with timestamp"""
+        self.attendance_cache.put(user_id, report)
         logger.info(f"Cached attendance data for user {user_id}")
 
-    async def send_incremental_attendance(self, update: Update, data_type: str, subjects: list):
-        """Send attendance data incrementally by type"""
-        if subjects:
-            message = f"📊 {data_type} Classes:\n\n"
-            for subject in subjects:
-                try:
-                    percentage_str = subject['percentage'].replace('%', '').strip()
-                    percentage = float(percentage_str) if percentage_str else 0
-                    emoji = "🟢" if percentage >= 75 else "🔴"
-                except (ValueError, TypeError):
-                    emoji = "🔴"
-                    
-                message += f"{emoji} {subject['subject']}\n"
-                message += f"├─ Present: {subject['present']}/{subject['total_lectures']}\n"
-                message += f"├─ Absent: {subject['absent']}\n"
-                message += f"└─ Attendance: {subject['percentage']}\n\n"
-            
-            await update.message.reply_text(message)
-            user_logger.info(f"{update.effective_user.id} - Sent {data_type} attendance data")
 
 if __name__ == "__main__":
-    # Start the keep_alive server
-    keep_alive()
-    
     bot = ERPBot(TELEGRAM_TOKEN, CAPTCHA_API_KEY, ERP_URL)
     
     # Set up and run the event loop
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
-        loop.run_until_complete(bot.run())
+        loop.run_until_complete(bot.run_worker() if '--worker' in sys.argv[1:] else bot.run())
     except KeyboardInterrupt:
         pass
     finally:
         loop.close()
 
     # Test 2captcha balance
+    from twocaptcha import TwoCaptcha
     solver = TwoCaptcha(CAPTCHA_API_KEY)
     balance = solver.balance()
     print(f"2captcha balance: {balance}")
\ No newline at end of file
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import time as time_module
+from contextlib import asynccontextmanager
+
+from metrics import BROWSER_RESTARTS
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolExhausted(Exception):
+    """Raised when no browser could be checked out of the pool"""
+
+
+class PooledBrowser:
+    """A warm browser owned by the pool"""
+
+    def __init__(self, slot, driver):
+        self.slot = slot
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time_module.time()
+
+
+class BrowserPool:
+    """Pool of pre-warmed browsers that are checked out per request
+
+    The pool does not know how to drive Chrome itself. It is given three
+    coroutine functions:
+      - launch(slot): start a browser sitting on the login page
+      - check(driver): return True if the browser is still usable
+      - close(slot, driver): shut a browser down
+
+    A block that raises recycles its browser, unless the exception is one
+    of `harmless` (e.g. a rejected login, which leaves the browser on the
+    login page).
+    """
+
+    def __init__(self, launch, check, close, size=2, max_uses=25,
+                 max_waiters=20, acquire_timeout=90, harmless=()):
+        self.launch = launch
+        self.check = check
+        self.close = close
+        self.harmless = harmless
+        self.size = size
+        self.max_uses = max_uses
+        self.max_waiters = max_waiters
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = asyncio.Queue()
+        self._browsers = {}  # slot -> PooledBrowser, idle or checked out
+        self._launching = set()
+        self._recycling = set()  # keeps recycle tasks referenced until they finish
+        self._waiters = 0
+        self._closed = False
+        self.started = False
+
+    @property
+    def ready_count(self):
+        """Number of live browsers, idle or checked out"""
+        return len(self._browsers)
+
+    @property
+    def idle_count(self):
+        return self._idle.qsize()
+
+    @property
+    def waiting_count(self):
+        return self._waiters
+
+    async def start(self):
+        """Launch browsers concurrently until the pool is full"""
+        self.started = True
+        await self.fill()
+        logger.info(f"Browser pool started with {self.ready_count}/{self.size} browsers")
+        return self.ready_count > 0
+
+    async def fill(self):
+        """Launch browsers for every empty slot"""
+        free_slots = [
+            slot for slot in range(self.size)
+            if slot not in self._browsers and slot not in self._launching
+        ]
+        if free_slots:
+            await asyncio.gather(*(self._launch_slot(slot) for slot in free_slots))
+
+    async def _launch_slot(self, slot):
+        """Start a browser for a slot and make it available"""
+        self._launching.add(slot)
+        try:
+            driver = await self.launch(slot)
+        except Exception as e:
+            logger.error(f"Error launching browser {slot}: {str(e)}")
+            return None
+        finally:
+            self._launching.discard(slot)
+
+        if self._closed:
+            await self._close_driver(slot, driver)
+            return None
+
+        browser = PooledBrowser(slot, driver)
+        self._browsers[slot] = browser
+        self._idle.put_nowait(browser)
+        logger.info(f"Browser {slot} ready")
+        return browser
+
+    async def _close_driver(self, slot, driver):
+        try:
+            await self.close(slot, driver)
+        except Exception as e:
+            logger.error(f"Error closing browser {slot}: {str(e)}")
+
+    async def _retire(self, browser):
+        """Close a browser and free its slot"""
+        self._browsers.pop(browser.slot, None)
+        await self._close_driver(browser.slot, browser.driver)
+
+    async def _recycle(self, browser):
+        """Replace a browser with a freshly launched one"""
+        BROWSER_RESTARTS.inc()
+        await self._retire(browser)
+        if not self._closed:
+            await self._launch_slot(browser.slot)
+
+    def _recycle_in_background(self, browser):
+        task = asyncio.create_task(self._recycle(browser))
+        self._recycling.add(task)
+        task.add_done_callback(self._recycling.discard)
+
+    async def acquire(self):
+        """Check out a healthy browser, waiting in a bounded queue if none is idle"""
+        if self._closed:
+            raise BrowserPoolExhausted("Browser pool is closed")
+        if self._idle.empty() and self._waiters >= self.max_waiters:
+            raise BrowserPoolExhausted("Too many requests are waiting for a browser")
+
+        if not self._browsers and not self._launching:
+            # Pool was never started or every launch failed so far, so
+            # launch now rather than waiting forever
+            self.started = True
+            await self.fill()
+
+        deadline = time_module.monotonic() + self.acquire_timeout
+        self._waiters += 1
+        try:
+            while True:
+                remaining = deadline - time_module.monotonic()
+                if remaining <= 0:
+                    raise BrowserPoolExhausted("Timed out waiting for a browser")
+                try:
+                    browser = await asyncio.wait_for(self._idle.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise BrowserPoolExhausted("Timed out waiting for a browser")
+
+                if browser.slot not in self._browsers:
+                    # Retired while sitting in the queue
+                    continue
+
+                if await self._is_healthy(browser):
+                    browser.uses += 1
+                    return browser
+
+                logger.warning(f"Browser {browser.slot} failed health check, recycling")
+                self._recycle_in_background(browser)
+        finally:
+            self._waiters -= 1
+
+    async def release(self, browser, healthy=True):
+        """Return a browser to the pool, recycling it if it is worn out or broken"""
+        if self._closed:
+            await self._retire(browser)
+            return
+
+        if not healthy:
+            logger.info(f"Recycling browser {browser.slot} after a failed request")
+            self._recycle_in_background(browser)
+        elif browser.uses >= self.max_uses:
+            logger.info(f"Recycling browser {browser.slot} after {browser.uses} uses")
+            self._recycle_in_background(browser)
+        else:
+            self._idle.put_nowait(browser)
+
+    @asynccontextmanager
+    async def browser(self):
+        """Check out a browser for the duration of a block"""
+        browser = await self.acquire()
+        healthy = True
+        try:
+            yield browser.driver
+        except BaseException as e:
+            healthy = isinstance(e, self.harmless)
+            raise
+        finally:
+            await self.release(browser, healthy)
+
+    async def _is_healthy(self, browser):
+        try:
+            return await self.check(browser.driver)
+        except Exception as e:
+            logger.error(f"Health check for browser {browser.slot} failed: {str(e)}")
+            return False
+
+    async def maintain(self):
+        """Health-check idle browsers and relaunch any empty slots"""
+        if not self.started:
+            return
+
+        idle = []
+        while not self._idle.empty():
+            idle.append(self._idle.get_nowait())
+
+        for browser in idle:
+            if browser.slot not in self._browsers:
+                continue
+            if await self._is_healthy(browser):
+                self._idle.put_nowait(browser)
+            else:
+                logger.warning(f"Idle browser {browser.slot} is unhealthy, recycling")
+                await self._retire(browser)
+
+        await self.fill()
+
+    async def shutdown(self):
+        """Close every browser in the pool"""
+        self._closed = True
+        browsers = list(self._browsers.values())
+        self._browsers.clear()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        for browser in browsers:
+            await self._close_driver(browser.slot, browser.driver)
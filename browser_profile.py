@@ -0,0 +1,131 @@
+import os
+
+# Chrome flags per BROWSER_PROFILE
+PROFILES = {
+    # Everything loads, as in a desktop browser
+    'full': [
+        '--headless',
+        '--disable-gpu',
+        '--start-maximized',
+        '--disable-dev-shm-usage',
+        '--no-sandbox',
+        '--window-size=1920,1080',
+    ],
+    # Just enough browser to log in and read three tables
+    'lean': [
+        '--headless',
+        '--disable-gpu',
+        '--disable-dev-shm-usage',
+        '--no-sandbox',
+        '--window-size=800,600',
+        '--blink-settings=imagesEnabled=false',
+        '--disable-extensions',
+        '--disable-background-networking',
+        '--disable-component-update',
+        '--disable-default-apps',
+        '--disable-sync',
+        '--disable-translate',
+        '--disable-notifications',
+        '--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication,InterestFeedContentSuggestions',
+        '--no-first-run',
+        '--no-default-browser-check',
+        '--mute-audio',
+        '--metrics-recording-only',
+        '--password-store=basic',
+        # Grid tabs load in the background, keep them at full speed
+        '--disable-background-timer-throttling',
+        '--disable-backgrounding-occluded-windows',
+        '--disable-renderer-backgrounding',
+    ],
+}
+
+# Requests the lean profile refuses (CDP Network.setBlockedURLs wildcards).
+# reCAPTCHA (google.com/recaptcha, gstatic.com/recaptcha) must keep loading
+# its scripts, it creates the g-recaptcha-response field the login fills in.
+BLOCKED_URL_PATTERNS = [
+    # Images
+    '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.svg*', '*.ico*', '*.webp*', '*.bmp*',
+    # Fonts
+    '*.woff*', '*.ttf*', '*.otf*', '*.eot*',
+    # Stylesheets
+    '*.css*',
+    # Third-party scripts and trackers
+    '*fonts.googleapis.com*', '*google-analytics.com*', '*googletagmanager.com*',
+    '*doubleclick.net*', '*connect.facebook.net*', '*hotjar.com*', '*clarity.ms*',
+]
+
+# Navigation timing and transfer size of the page in the current tab
+PAGE_STATS_JS = """
+var navigation = performance.getEntriesByType('navigation')[0];
+var resources = performance.getEntriesByType('resource');
+var bytes = navigation ? navigation.transferSize : 0;
+for (var i = 0; i < resources.length; i++) {
+    bytes += resources[i].transferSize || 0;
+}
+return {
+    load_ms: navigation && navigation.loadEventEnd ? Math.round(navigation.loadEventEnd - navigation.startTime) : null,
+    dom_ready_ms: navigation && navigation.domContentLoadedEventEnd
+        ? Math.round(navigation.domContentLoadedEventEnd - navigation.startTime) : null,
+    resources: resources.length,
+    transfer_kb: Math.round(bytes / 1024)
+};
+"""
+
+
+def chrome_arguments(profile):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown browser profile {profile}, expected one of {', '.join(PROFILES)}")
+    return list(PROFILES[profile])
+
+
+def apply_profile(chrome, profile, extra_blocked=()):
+    """Set up request blocking in Chrome's current tab (blocking)
+
+    Chrome keeps blocked URLs per tab, so this runs once at launch for the
+    tab that logs in and reads Theory, and again in each tab opened for
+    the other grids before it loads anything.
+    """
+    if profile != 'lean':
+        return
+    chrome.execute_cdp_cmd('Network.enable', {})
+    chrome.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS + list(extra_blocked)})
+
+
+def _descendants(root_pid):
+    """Pids of a process and everything it started, from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, the fields after it do not
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, ()))
+    return pids
+
+
+def chrome_memory_bytes(chrome):
+    """Resident memory of chromedriver and every Chrome process under it, None if unknown
+
+    Reads /proc, so it only works on Linux. Blocking.
+    """
+    process = getattr(getattr(chrome, 'service', None), 'process', None)
+    if process is None or not os.path.isdir('/proc'):
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    for pid in _descendants(process.pid):
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
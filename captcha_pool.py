@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import math
+import time as time_module
+from collections import deque
+
+from metrics import CAPTCHA_FAILURES, CAPTCHA_SOLVE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# reCAPTCHA site key of the ERP login page
+ERP_SITE_KEY = "6Le73cMbAAAAANUPFMh89e5vPsfwqyiwAh8x4ylp"
+
+
+class CaptchaUnavailable(Exception):
+    """Raised when no captcha token could be obtained in time"""
+
+
+class TwoCaptchaSolver:
+    """Solve the ERP reCAPTCHA with 2captcha, off the event loop"""
+
+    def __init__(self, api_key, page_url, site_key=ERP_SITE_KEY):
+        self.api_key = api_key
+        self.page_url = page_url
+        self.site_key = site_key
+        self.client = None
+
+    def _solve_blocking(self):
+        if self.client is None:
+            # Imported on first solve, off the event loop
+            from twocaptcha import TwoCaptcha
+            self.client = TwoCaptcha(self.api_key)
+        result = self.client.recaptcha(
+            sitekey=self.site_key,
+            url=self.page_url,
+            version='v2'
+        )
+        return result['code']
+
+    async def solve(self):
+        return await asyncio.to_thread(self._solve_blocking)
+
+
+class FakeCaptchaSolver:
+    """Local solver that hands out dummy tokens, for tests and benchmarks"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.solved = 0
+
+    async def solve(self):
+        await asyncio.sleep(self.delay)
+        self.solved += 1
+        return f"fake-captcha-token-{self.solved}"
+
+
+class CaptchaPool:
+    """Keeps a stock of unexpired captcha tokens and hands each out exactly once
+
+    The target stock follows the recent request rate: enough tokens to
+    cover the requests expected while a replacement is being solved,
+    bounded by min_size and max_size. With no requests in the last
+    `rate_window` seconds the target drops to idle_size (zero by default):
+    stocked tokens would only expire unused, so the next request is solved
+    on demand.
+    """
+
+    def __init__(self, solver, token_ttl=110, min_size=1, max_size=5,
+                 max_concurrent_solves=3, rate_window=300, idle_size=0):
+        self.solver = solver
+        self.token_ttl = token_ttl
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_size = min(idle_size, min_size)
+        self.max_concurrent_solves = max_concurrent_solves
+        self.rate_window = rate_window
+
+        self._tokens = deque()  # (token, solved_at), oldest first
+        self._waiters = deque()  # futures of callers waiting for a token
+        self._requests = deque()  # timestamps of recent token requests
+        self._solve_times = deque(maxlen=20)
+        self._solving = set()
+        self._task = None
+
+        # Counters
+        self.solved = 0
+        self.failed = 0
+        self.expired = 0
+        self.served = 0
+
+    @property
+    def available(self):
+        return len(self._tokens)
+
+    @property
+    def solving(self):
+        return len(self._solving)
+
+    def newest_token_age(self):
+        """Age in seconds of the freshest token, or None if the pool is empty"""
+        if not self._tokens:
+            return None
+        return time_module.time() - self._tokens[-1][1]
+
+    def average_solve_time(self):
+        if not self._solve_times:
+            return 30.0
+        return sum(self._solve_times) / len(self._solve_times)
+
+    def request_rate(self):
+        """Token requests per second over the rate window"""
+        self._prune_requests()
+        return len(self._requests) / self.rate_window
+
+    def target_size(self):
+        rate = self.request_rate()
+        if not rate:
+            return self.idle_size
+        expected = math.ceil(rate * self.average_solve_time())
+        return max(self.min_size, min(self.max_size, expected))
+
+    def _prune_requests(self):
+        cutoff = time_module.time() - self.rate_window
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+
+    def _prune_tokens(self):
+        cutoff = time_module.time() - self.token_ttl
+        while self._tokens and self._tokens[0][1] < cutoff:
+            self._tokens.popleft()
+            self.expired += 1
+
+    def _top_up(self, minimum=0):
+        """Start enough concurrent solves to reach the target stock"""
+        self._prune_tokens()
+        waiting = sum(1 for waiter in self._waiters if not waiter.done())
+        wanted = max(self.target_size(), minimum) + waiting
+        while (len(self._tokens) + len(self._solving) < wanted
+               and len(self._solving) < self.max_concurrent_solves):
+            task = asyncio.create_task(self._solve_one())
+            self._solving.add(task)
+            task.add_done_callback(self._solving.discard)
+
+    async def _solve_one(self):
+        start = time_module.monotonic()
+        try:
+            token = await self.solver.solve()
+        except Exception as e:
+            self.failed += 1
+            CAPTCHA_FAILURES.inc()
+            logger.error(f"Error solving captcha: {str(e)}")
+            return
+
+        solve_time = time_module.monotonic() - start
+        self._solve_times.append(solve_time)
+        CAPTCHA_SOLVE_SECONDS.observe(solve_time)
+        self.solved += 1
+        logger.info("Captcha solved successfully in background")
+
+        # Hand the token straight to a waiting caller if there is one
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.served += 1
+                waiter.set_result(token)
+                self._top_up()
+                return
+        self._tokens.append((token, time_module.time()))
+        self._top_up()
+
+    async def get_token(self, timeout=90):
+        """Take an unexpired token, waiting for a solve if the pool is empty"""
+        self._requests.append(time_module.time())
+        self._prune_tokens()
+
+        if self._tokens:
+            token, _ = self._tokens.popleft()
+            self.served += 1
+            self._top_up()
+            return token
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._top_up()
+        try:
+            return await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise CaptchaUnavailable("Timed out waiting for a captcha token")
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    async def wait_until_stocked(self, timeout=120, interval=0.25):
+        """Stock at least one token, True if one was solved in time
+
+        Used at startup so the first login does not wait for a solve, even
+        though an idle pool would otherwise stock nothing.
+        """
+        deadline = time_module.monotonic() + timeout
+        while not self.solved and time_module.monotonic() < deadline:
+            self._top_up(minimum=1)
+            await asyncio.sleep(interval)
+        return self.solved > 0
+
+    async def run(self):
+        """Keep the stock topped up and drop expired tokens"""
+        logger.info("Starting captcha pool")
+        while True:
+            self._top_up()
+            await asyncio.sleep(5)
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = list(self._solving)
+        if self._task:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,64 @@
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_resolved = None
+
+
+def _usable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def resolve_chromedriver(cache_file):
+    """Path of the chromedriver binary, resolved once and remembered across restarts
+
+    Tries, in order: the CHROMEDRIVER_PATH environment variable, the path
+    cached in `cache_file` by an earlier run, a chromedriver on PATH (the
+    Replit nix environment ships one), and finally webdriver_manager,
+    which may download a driver. Blocking; call it off the event loop.
+    """
+    global _resolved
+    with _lock:
+        if _usable(_resolved):
+            return _resolved
+
+        cache_file = Path(cache_file)
+        path = os.getenv('CHROMEDRIVER_PATH')
+        source = "CHROMEDRIVER_PATH"
+        if not _usable(path):
+            path = cache_file.read_text().strip() if cache_file.exists() else None
+            source = "cache"
+        if not _usable(path):
+            path = shutil.which("chromedriver")
+            source = "PATH"
+        if not _usable(path):
+            from webdriver_manager.chrome import ChromeDriverManager
+            path = ChromeDriverManager().install()
+            source = "webdriver_manager"
+
+        if source in ("PATH", "webdriver_manager"):
+            try:
+                cache_file.write_text(path)
+            except OSError as e:
+                logger.warning(f"Could not cache chromedriver path: {str(e)}")
+        logger.info(f"Using chromedriver at {path} (from {source})")
+        _resolved = path
+        return path
+
+
+def invalidate_chromedriver(cache_file):
+    """Forget the resolved path, e.g. after Chrome updated past the cached driver"""
+    global _resolved
+    with _lock:
+        _resolved = None
+        try:
+            Path(cache_file).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove cached chromedriver path: {str(e)}")
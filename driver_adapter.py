@@ -0,0 +1,121 @@
+import asyncio
+import functools
+import logging
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class DriverCallMetrics:
+    """Per-operation latency stats for blocking WebDriver calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}  # operation -> [count, total_seconds, max_seconds]
+
+    def record(self, operation, seconds):
+        with self._lock:
+            stats = self._stats.setdefault(operation, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def snapshot(self):
+        """Return {operation: {count, total_ms, avg_ms, max_ms}}"""
+        with self._lock:
+            return {
+                operation: {
+                    'count': count,
+                    'total_ms': round(total * 1000, 1),
+                    'avg_ms': round(total * 1000 / count, 1) if count else 0.0,
+                    'max_ms': round(maximum * 1000, 1),
+                }
+                for operation, (count, total, maximum) in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def create_executor(max_workers):
+    """Thread pool for blocking WebDriver calls, one thread per browser"""
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webdriver")
+
+
+async def run_blocking(executor, metrics, operation, fn, *args, **kwargs):
+    """Run a blocking call on the executor and record how long it took"""
+    loop = asyncio.get_running_loop()
+    start = time_module.perf_counter()
+    try:
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    finally:
+        elapsed = time_module.perf_counter() - start
+        metrics.record(operation, elapsed)
+        logger.debug(f"WebDriver {operation} took {elapsed * 1000:.0f}ms")
+
+
+class AsyncDriver:
+    """Async facade over a Selenium WebDriver
+
+    Every call is pushed to the shared executor so the event loop is never
+    blocked by the browser.
+    """
+
+    def __init__(self, driver, executor, metrics):
+        self.driver = driver
+        self.executor = executor
+        self.metrics = metrics
+
+    async def run(self, operation, fn, *args, **kwargs):
+        """Run an arbitrary blocking function (e.g. on a WebElement) off the loop"""
+        return await run_blocking(self.executor, self.metrics, operation, fn, *args, **kwargs)
+
+    async def get(self, url):
+        return await self.run('get', self.driver.get, url)
+
+    async def refresh(self):
+        return await self.run('refresh', self.driver.refresh)
+
+    async def current_url(self):
+        return await self.run('current_url', lambda: self.driver.current_url)
+
+    async def execute_script(self, script, *args):
+        return await self.run('execute_script', self.driver.execute_script, script, *args)
+
+    async def find_element(self, by, value):
+        return await self.run('find_element', self.driver.find_element, by, value)
+
+    async def find_elements(self, by, value):
+        return await self.run('find_elements', self.driver.find_elements, by, value)
+
+    async def wait_until(self, condition, timeout=10, poll_frequency=0.5, operation='wait'):
+        """Block (off the loop) until an expected condition holds"""
+        from selenium.webdriver.support.ui import WebDriverWait
+        return await self.run(
+            operation,
+            lambda: WebDriverWait(self.driver, timeout, poll_frequency=poll_frequency).until(condition)
+        )
+
+    async def get_cookies(self):
+        return await self.run('get_cookies', self.driver.get_cookies)
+
+    async def add_cookie(self, cookie):
+        return await self.run('add_cookie', self.driver.add_cookie, cookie)
+
+    async def delete_all_cookies(self):
+        return await self.run('delete_all_cookies', self.driver.delete_all_cookies)
+
+    async def window_handles(self):
+        return await self.run('window_handles', lambda: self.driver.window_handles)
+
+    async def switch_to_window(self, handle):
+        return await self.run('switch_to_window', self.driver.switch_to.window, handle)
+
+    async def close_window(self):
+        return await self.run('close_window', self.driver.close)
+
+    async def quit(self):
+        return await self.run('quit', self.driver.quit)
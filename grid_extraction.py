@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import time as time_module
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+
+from http_scraper import ATTENDANCE_GRIDS, notify_section, ordered_sections
+from metrics import GRID_EXTRACTION_SECONDS
+from resilience import ERP_LATENCY, backoff_delays
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Returns every data row of a grid in one round trip as {rows: [...]}, or
+# null while the grid is missing or still the one that was on screen before
+# a postback. A grid without data rows (nothing recorded for that type)
+# comes back with no rows, wrapped so the wait still sees a result.
+GRID_ROWS_JS = """
+var table = document.getElementById(arguments[0]);
+if (!table || table.getAttribute('data-erpbot-seen')) {
+    return null;
+}
+var text = function (cell) {
+    return (cell.innerText || cell.textContent || '').replace(/\\s+/g, ' ').trim();
+};
+var rows = table.getElementsByTagName('tr');
+var data = [];
+for (var i = 1; i < rows.length; i++) {
+    var cells = rows[i].getElementsByTagName('td');
+    if (cells.length < 6) {
+        continue;
+    }
+    var subject = text(cells[1]);
+    if (subject) {
+        data.push({
+            subject: subject,
+            total_lectures: text(cells[2]),
+            present: text(cells[3]),
+            absent: text(cells[4]),
+            percentage: text(cells[5])
+        });
+    }
+}
+table.setAttribute('data-erpbot-seen', '1');
+return {rows: data};
+"""
+
+# Marks the grids currently on screen and clicks the radio for an attendance
+# type, so the next GRID_ROWS_JS poll only accepts the grid rendered by the
+# postback. Returns null until the radio exists, 'disabled' if the student
+# has no attendance of that type, 'clicked' otherwise.
+SELECT_TYPE_JS = """
+var radio = document.evaluate(
+    "//input[@type='radio' and following-sibling::text()='" + arguments[0] + "']",
+    document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+if (!radio) {
+    return null;
+}
+if (radio.disabled) {
+    return 'disabled';
+}
+var grids = arguments[1];
+for (var i = 0; i < grids.length; i++) {
+    var grid = document.getElementById(grids[i]);
+    if (grid) {
+        grid.setAttribute('data-erpbot-seen', '1');
+    }
+}
+radio.click();
+return 'clicked';
+"""
+
+RADIO_XPATH = "//input[@type='radio' and following-sibling::text()='{}']"
+
+
+def read_table_rows(table):
+    """Read attendance rows from a table element, one WebDriver call per cell (blocking)"""
+    attendance_data = []
+    rows = table.find_elements(By.TAG_NAME, "tr")
+
+    # Skip header row
+    for row in rows[1:]:
+        cells = row.find_elements(By.TAG_NAME, "td")
+        if len(cells) >= 6:
+            subject = cells[1].text.strip()
+            # Only add if we have actual subject text
+            if subject:
+                attendance_data.append({
+                    "subject": subject,
+                    "total_lectures": cells[2].text.strip(),
+                    "present": cells[3].text.strip(),
+                    "absent": cells[4].text.strip(),
+                    "percentage": cells[5].text.strip()
+                })
+    return attendance_data
+
+
+async def extract_grid_js(driver, table_id, attendance_type, timeout=None):
+    """Wait for a grid and read all its rows with a single execute_script per poll"""
+    timeout = timeout or ERP_LATENCY.timeout('grid')
+    try:
+        with ERP_LATENCY.measure('grid'):
+            grid = await driver.wait_until(
+                lambda d: d.execute_script(GRID_ROWS_JS, table_id),
+                timeout=timeout,
+                poll_frequency=0.1,
+                operation='extract_grid',
+            )
+        return grid['rows']
+    except TimeoutException:
+        logger.error(f"Failed to get data for {attendance_type} table within {timeout}s")
+        return []
+
+
+async def extract_grid_dom(driver, table_id, attendance_type, timeout=None):
+    """Wait for a grid and read it element by element"""
+    timeout = timeout or ERP_LATENCY.timeout('grid')
+    try:
+        with ERP_LATENCY.measure('grid'):
+            # Wait for table to be present and visible
+            table = await driver.wait_until(
+                EC.presence_of_element_located((By.ID, table_id)), timeout=timeout
+            )
+
+            # Wait for table to be visible
+            await driver.wait_until(
+                EC.visibility_of_element_located((By.ID, table_id)), timeout=timeout
+            )
+
+            # Scroll to table and reduced wait
+            await driver.execute_script("arguments[0].scrollIntoView(true);", table)
+            await asyncio.sleep(0.5)  # Back to 0.5s wait after scroll
+
+            # Wait for table data
+            await driver.wait_until(
+                lambda d: len(d.find_element(By.ID, table_id).find_elements(By.TAG_NAME, "tr")) > 1 and
+                        len(d.find_element(By.ID, table_id).find_elements(By.TAG_NAME, "td")) > 0,
+                timeout=timeout
+            )
+
+        # Rows can still be filling in; retry with backoff instead of fixed sleeps
+        max_attempts = 3
+        delays = backoff_delays(max_attempts, base=0.1, cap=1.0)
+        while True:
+            attendance_data = await driver.run('read_table', read_table_rows, table)
+            if attendance_data:
+                return attendance_data
+            delay = next(delays, None)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        logger.error(f"Failed to get data for {attendance_type} table after {max_attempts} attempts")
+        return []
+
+    except Exception as e:
+        logger.error(f"Error finding {attendance_type} table: {str(e)}")
+        return []
+
+
+async def select_attendance_type_js(driver, attendance_type, timeout=None):
+    """Click the radio button for an attendance type in one round trip
+
+    Returns False, without clicking, when the radio button is disabled.
+    """
+    with ERP_LATENCY.measure('postback'):
+        result = await driver.wait_until(
+            lambda d: d.execute_script(SELECT_TYPE_JS, attendance_type, list(ATTENDANCE_GRIDS.values())),
+            timeout=timeout or ERP_LATENCY.timeout('postback'),
+            poll_frequency=0.1,
+            operation='select_type',
+        )
+    if result == 'disabled':
+        logger.info(f"No {attendance_type} attendance, its radio button is disabled")
+        return False
+    return True
+
+
+async def select_attendance_type_dom(driver, attendance_type, timeout=None):
+    """Click the radio button for an attendance type and give the postback a moment
+
+    Returns False, without clicking, when the radio button is disabled.
+    """
+    with ERP_LATENCY.measure('postback'):
+        radio = await driver.wait_until(
+            EC.presence_of_element_located((By.XPATH, RADIO_XPATH.format(attendance_type))),
+            timeout=timeout or ERP_LATENCY.timeout('postback')
+        )
+    if not await driver.run('is_enabled', radio.is_enabled):
+        logger.info(f"No {attendance_type} attendance, its radio button is disabled")
+        return False
+    await driver.execute_script("arguments[0].click();", radio)
+    await asyncio.sleep(0.2)  # Wait after click
+    return True
+
+
+EXTRACTORS = {
+    'js': (select_attendance_type_js, extract_grid_js),
+    'dom': (select_attendance_type_dom, extract_grid_dom),
+}
+
+
+async def extract_grids_sequential(driver, mode, on_section=None):
+    """Read Theory, then click through Practical and Tutorial one after another"""
+    select_attendance_type, extract_grid = EXTRACTORS[mode]
+    all_attendance_data = {}
+
+    # Theory is shown first, Practical and Tutorial need a radio button postback
+    for attendance_type, table_id in ATTENDANCE_GRIDS.items():
+        logger.info(f"Extracting {attendance_type} attendance")
+        try:
+            with span('grid', backend="selenium", type=attendance_type, mode=mode), \
+                    GRID_EXTRACTION_SECONDS.labels(backend="selenium", type=attendance_type).time():
+                if attendance_type != "Theory" and not await select_attendance_type(driver, attendance_type):
+                    continue
+                attendance_data = await extract_grid(driver, table_id, attendance_type)
+            if attendance_data:
+                all_attendance_data[attendance_type] = attendance_data
+                await notify_section(on_section, attendance_type, attendance_data)
+        except Exception as e:
+            logger.error(f"Error getting {attendance_type.lower()} attendance: {str(e)}")
+
+    return all_attendance_data
+
+
+async def extract_grids_in_tabs(driver, dashboard_url, on_section=None, prepare_tab=None):
+    """Fetch all grids at once: one tab per postback, all in flight together
+
+    The extra tabs load the dashboard while Theory is read in the current
+    tab, then the Practical and Tutorial postbacks are fired in their tabs
+    back to back and harvested afterwards. Tabs open blank; `prepare_tab()`
+    is awaited in each one (e.g. to block URLs, which Chrome sets per tab)
+    before it starts loading the dashboard.
+    """
+    main_handle = (await driver.window_handles())[0]
+    other_types = [attendance_type for attendance_type in ATTENDANCE_GRIDS if attendance_type != "Theory"]
+
+    await driver.execute_script(
+        "for (var i = 0; i < arguments[0]; i++) { window.open('about:blank', '_blank'); }",
+        len(other_types)
+    )
+    handles = [handle for handle in await driver.window_handles() if handle != main_handle]
+    tabs = dict(zip(other_types, handles))
+
+    all_attendance_data = {}
+    try:
+        # Start every tab loading without waiting for it, Theory is read meanwhile
+        for handle in tabs.values():
+            await driver.switch_to_window(handle)
+            if prepare_tab:
+                await prepare_tab()
+            await driver.execute_script("window.location.href = arguments[0];", dashboard_url)
+        await driver.switch_to_window(main_handle)
+
+        logger.info("Extracting Theory attendance")
+        with span('grid', backend="selenium", type="Theory", mode="tabs"), \
+                GRID_EXTRACTION_SECONDS.labels(backend="selenium", type="Theory").time():
+            theory_data = await extract_grid_js(driver, ATTENDANCE_GRIDS["Theory"], "Theory")
+        if theory_data:
+            all_attendance_data["Theory"] = theory_data
+            await notify_section(on_section, "Theory", theory_data)
+
+        # Fire the postbacks without waiting for them to finish
+        fired_at = {}
+        for attendance_type, handle in tabs.items():
+            try:
+                await driver.switch_to_window(handle)
+                fired_at[attendance_type] = time_module.perf_counter()
+                if not await select_attendance_type_js(driver, attendance_type):
+                    del fired_at[attendance_type]
+            except Exception as e:
+                logger.error(f"Error selecting {attendance_type.lower()} attendance: {str(e)}")
+
+        for attendance_type, handle in tabs.items():
+            if attendance_type not in fired_at:
+                continue
+            logger.info(f"Extracting {attendance_type} attendance")
+            await driver.switch_to_window(handle)
+            with span('grid', backend="selenium", type=attendance_type, mode="tabs"):
+                attendance_data = await extract_grid_js(driver, ATTENDANCE_GRIDS[attendance_type], attendance_type)
+            # Time from firing the postback, the grids load concurrently
+            GRID_EXTRACTION_SECONDS.labels(backend="selenium", type=attendance_type).observe(
+                time_module.perf_counter() - fired_at[attendance_type]
+            )
+            if attendance_data:
+                all_attendance_data[attendance_type] = attendance_data
+                await notify_section(on_section, attendance_type, attendance_data)
+    finally:
+        for handle in tabs.values():
+            try:
+                await driver.switch_to_window(handle)
+                await driver.close_window()
+            except Exception:
+                pass
+        await driver.switch_to_window(main_handle)
+
+    return ordered_sections(all_attendance_data)
@@ -0,0 +1,191 @@
+import csv
+import io
+import logging
+import secrets
+import sqlite3
+import threading
+import time as time_module
+
+from attendance_record import ATTENDANCE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class SubjectStats:
+    """Running per-subject aggregate over a class, filled in one pass"""
+
+    __slots__ = ('attendance_type', 'subject', 'students', 'total', 'lowest', 'highest', 'below')
+
+    def __init__(self, attendance_type, subject):
+        self.attendance_type = attendance_type
+        self.subject = subject
+        self.students = 0
+        self.total = 0.0
+        self.lowest = None
+        self.highest = None
+        self.below = 0
+
+    def add(self, percentage, threshold=ATTENDANCE_THRESHOLD):
+        self.students += 1
+        self.total += percentage
+        self.lowest = percentage if self.lowest is None else min(self.lowest, percentage)
+        self.highest = percentage if self.highest is None else max(self.highest, percentage)
+        if percentage < threshold:
+            self.below += 1
+
+    @property
+    def mean(self):
+        return self.total / self.students if self.students else 0.0
+
+
+def aggregate(reports, threshold=ATTENDANCE_THRESHOLD):
+    """Per-subject stats over many AttendanceReports, in the order subjects first appear
+
+    Subjects are keyed by (attendance_type, subject), so electives only
+    count the students who take them.
+    """
+    stats = {}
+    for report in reports:
+        for attendance_type, subjects in report.items():
+            for subject in subjects:
+                key = (attendance_type, subject.subject)
+                entry = stats.get(key)
+                if entry is None:
+                    entry = stats[key] = SubjectStats(attendance_type, subject.subject)
+                entry.add(subject.percentage, threshold)
+    return list(stats.values())
+
+
+def render_summary(name, stats, fetched, total, threshold=ATTENDANCE_THRESHOLD):
+    """Message parts for a class report"""
+    parts = [f"📋 Class report: {name}\n{fetched}/{total} students"]
+    if fetched < total:
+        parts[0] += f" ({total - fetched} could not be fetched)"
+    parts[0] += "\n\n"
+    current_type = None
+    for entry in stats:
+        if entry.attendance_type != current_type:
+            current_type = entry.attendance_type
+            parts.append(f"📊 {current_type}\n")
+        emoji = "🔴" if entry.mean < threshold else "🟢"
+        parts.append(
+            f"{emoji} {entry.subject}\n"
+            f"├─ Mean: {entry.mean:.1f}% (min {entry.lowest:.1f}%, max {entry.highest:.1f}%)\n"
+            f"└─ Below {threshold:g}%: {entry.below}/{entry.students}\n\n"
+        )
+    return parts
+
+
+def render_csv(stats, threshold=ATTENDANCE_THRESHOLD):
+    """CSV bytes with one row per subject"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([
+        'attendance_type', 'subject', 'students', 'mean_percentage',
+        'min_percentage', 'max_percentage', f'below_{threshold:g}',
+    ])
+    for entry in stats:
+        writer.writerow([
+            entry.attendance_type, entry.subject, entry.students, f"{entry.mean:.2f}",
+            f"{entry.lowest:.2f}", f"{entry.highest:.2f}", entry.below,
+        ])
+    return output.getvalue().encode('utf-8')
+
+
+class GroupStore:
+    """Class groups created by admins, and the students who joined them
+
+    Students opt in by sending the group's join code, which lets the
+    group's admin include their attendance in /classreport.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS groups ("
+                " group_id INTEGER PRIMARY KEY,"
+                " name TEXT NOT NULL UNIQUE COLLATE NOCASE,"
+                " join_code TEXT NOT NULL UNIQUE,"
+                " admin_id INTEGER NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS group_members ("
+                " group_id INTEGER NOT NULL,"
+                " user_id INTEGER NOT NULL,"
+                " joined_at REAL NOT NULL,"
+                " PRIMARY KEY (group_id, user_id)) WITHOUT ROWID"
+            )
+
+    def create(self, name, admin_id):
+        """Create a group and return its join code, or None if the name is taken"""
+        join_code = secrets.token_urlsafe(6)
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT INTO groups (name, join_code, admin_id, created_at) VALUES (?, ?, ?, ?)",
+                    (name, join_code, admin_id, time_module.time())
+                )
+        except sqlite3.IntegrityError:
+            return None
+        return join_code
+
+    def get(self, name):
+        """(group_id, name, join_code, admin_id) or None"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT group_id, name, join_code, admin_id FROM groups WHERE name = ?", (name,)
+            ).fetchone()
+
+    def admin_groups(self, admin_id):
+        """[(name, join_code, member count), ...] for the groups an admin created"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT g.name, g.join_code, COUNT(m.user_id) FROM groups g"
+                " LEFT JOIN group_members m ON m.group_id = g.group_id"
+                " WHERE g.admin_id = ? GROUP BY g.group_id ORDER BY g.name", (admin_id,)
+            ).fetchall()
+
+    def join(self, join_code, user_id):
+        """Add a user to the group with this code and return its name, None for an unknown code"""
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT group_id, name FROM groups WHERE join_code = ?", (join_code,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "INSERT OR IGNORE INTO group_members (group_id, user_id, joined_at) VALUES (?, ?, ?)",
+                (row[0], user_id, time_module.time())
+            )
+        return row[1]
+
+    def leave(self, name, user_id):
+        """Remove a user from a group, True if they were in it"""
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "DELETE FROM group_members WHERE user_id = ? AND group_id ="
+                " (SELECT group_id FROM groups WHERE name = ?)", (user_id, name)
+            )
+        return cursor.rowcount > 0
+
+    def members(self, group_id):
+        with self._lock:
+            return [
+                row[0] for row in self._db.execute(
+                    "SELECT user_id FROM group_members WHERE group_id = ? ORDER BY joined_at", (group_id,)
+                )
+            ]
+
+    def delete_user(self, user_id):
+        """Drop a user from every group"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM group_members WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,152 @@
+import logging
+import math
+import sqlite3
+import threading
+from datetime import date
+
+from attendance_record import ATTENDANCE_THRESHOLD
+from http_scraper import ATTENDANCE_GRIDS
+
+logger = logging.getLogger(__name__)
+
+# Block characters for sparklines, lowest to highest
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+
+def today():
+    """Today's date as a day number (date.toordinal)"""
+    return date.today().toordinal()
+
+
+def subject_order(key):
+    """Sort key for (attendance_type, subject): Theory/Practical/Tutorial, then by name"""
+    attendance_type, subject = key
+    types = list(ATTENDANCE_GRIDS)
+    return (types.index(attendance_type) if attendance_type in types else len(types), attendance_type, subject)
+
+
+def percentage(present, total):
+    return present * 100 / total if total else 0.0
+
+
+def sparkline(values):
+    """Render numbers as a one-line block chart"""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return "".join(SPARK_BLOCKS[round((value - low) / span * (len(SPARK_BLOCKS) - 1))] for value in values)
+
+
+def lectures_can_miss(present, total, threshold=ATTENDANCE_THRESHOLD):
+    """Consecutive lectures that can be missed while staying at or above the threshold"""
+    if not total or percentage(present, total) < threshold:
+        return 0
+    return math.floor(present * 100 / threshold - total + 1e-9)
+
+
+def lectures_needed(present, total, threshold=ATTENDANCE_THRESHOLD):
+    """Consecutive lectures to attend to get back to the threshold"""
+    if percentage(present, total) >= threshold:
+        return 0
+    fraction = threshold / 100
+    return math.ceil((fraction * total - present) / (1 - fraction) - 1e-9)
+
+
+class HistoryStore:
+    """Daily attendance counts per user and subject
+
+    Subjects are interned into a small lookup table, so each history row
+    is five integers. One row is kept per user, subject
+    and day (the day's last scrape wins). The primary key doubles as the
+    index for per-user range queries.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS subjects ("
+                " subject_id INTEGER PRIMARY KEY,"
+                " attendance_type TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " UNIQUE (attendance_type, name))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS attendance_history ("
+                " user_id INTEGER NOT NULL,"
+                " day INTEGER NOT NULL,"
+                " subject_id INTEGER NOT NULL,"
+                " total INTEGER NOT NULL,"
+                " present INTEGER NOT NULL,"
+                " PRIMARY KEY (user_id, day, subject_id)) WITHOUT ROWID"
+            )
+        self._subject_ids = {
+            (attendance_type, name): subject_id
+            for subject_id, attendance_type, name
+            in self._db.execute("SELECT subject_id, attendance_type, name FROM subjects")
+        }
+        self._subjects = {subject_id: key for key, subject_id in self._subject_ids.items()}
+
+    def _subject_id(self, attendance_type, name):
+        key = (attendance_type, name)
+        subject_id = self._subject_ids.get(key)
+        if subject_id is None:
+            self._db.execute(
+                "INSERT OR IGNORE INTO subjects (attendance_type, name) VALUES (?, ?)", key
+            )
+            subject_id = self._db.execute(
+                "SELECT subject_id FROM subjects WHERE attendance_type = ? AND name = ?", key
+            ).fetchone()[0]
+            self._subject_ids[key] = subject_id
+            self._subjects[subject_id] = key
+        return subject_id
+
+    def record(self, user_id, report, day=None):
+        """Store today's counts from a successful scrape (an AttendanceReport)"""
+        day = today() if day is None else day
+        with self._lock, self._db:
+            rows = [
+                (user_id, day, self._subject_id(attendance_type, subject.subject), subject.total, subject.present)
+                for attendance_type, subjects in report.items()
+                for subject in subjects
+            ]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO attendance_history (user_id, day, subject_id, total, present)"
+                " VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def series(self, user_id, days=30):
+        """{(attendance_type, subject): [(day, total, present), ...]} for the last `days` days"""
+        since = today() - days
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT subject_id, day, total, present FROM attendance_history"
+                " WHERE user_id = ? AND day >= ? ORDER BY day", (user_id, since)
+            ).fetchall()
+        series = {}
+        for subject_id, day, total, present in rows:
+            series.setdefault(self._subjects[subject_id], []).append((day, total, present))
+        return {key: series[key] for key in sorted(series, key=subject_order)}
+
+    def latest(self, user_id):
+        """{(attendance_type, subject): (day, total, present)} from the most recent scrape"""
+        # SQLite fills the bare columns from the row holding MAX(day)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT subject_id, MAX(day), total, present FROM attendance_history"
+                " WHERE user_id = ? GROUP BY subject_id", (user_id,)
+            ).fetchall()
+        latest = {self._subjects[subject_id]: (day, total, present) for subject_id, day, total, present in rows}
+        return {key: latest[key] for key in sorted(latest, key=subject_order)}
+
+    def delete(self, user_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM attendance_history WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,436 @@
+import asyncio
+import logging
+import re
+from html.parser import HTMLParser
+
+import httpx
+
+from metrics import GRID_EXTRACTION_SECONDS, LOGIN_SECONDS
+from resilience import ERP_LATENCY, retry_async
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Attendance grids on the ERP dashboard, keyed by attendance type, in the
+# order replies show them (attendance_record.SECTION_ORDER)
+ATTENDANCE_GRIDS = {
+    "Theory": "ctl00_ContentPlaceHolder1_ctl03_grdTHERORY",
+    "Practical": "ctl00_ContentPlaceHolder1_ctl03_grdpract",
+    "Tutorial": "ctl00_ContentPlaceHolder1_ctl03_grdtut",
+}
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/116.0 Safari/537.36"
+)
+
+
+class ERPLoginError(Exception):
+    """The ERP rejected the login (bad credentials or captcha)"""
+
+
+class ERPScrapeError(Exception):
+    """The ERP returned a page we could not understand"""
+
+
+# The ERP cannot be reached, times out or answers with an HTTP error. A
+# browser would not do any better.
+ERP_UNAVAILABLE = (httpx.TransportError, httpx.HTTPStatusError)
+
+# Errors that mean the ERP itself is failing: unavailable, or answering
+# with pages that are not what we expect
+ERP_ERRORS = ERP_UNAVAILABLE + (ERPScrapeError,)
+
+
+def extract_aspnet_field(html, field_name):
+    """Extract ASP.NET form field value"""
+    # Look for both id and name attributes since ASP.NET can use either
+    patterns = [
+        f'id="{field_name}" value="([^"]*)"',
+        f'name="{field_name}" value="([^"]*)"',
+        f'id="{field_name}"[^>]*?value="([^"]*)"',
+        f'name="{field_name}"[^>]*?value="([^"]*)"'
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, html, re.DOTALL)
+        if match:
+            return match.group(1)
+
+    logger.warning(f"Could not find {field_name} in form")
+    return ""
+
+
+def _clean_text(parts):
+    return " ".join("".join(parts).split())
+
+
+class _FormParser(HTMLParser):
+    """Collect the values a browser would submit with the page's form"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields = {}
+        self.inputs = {}  # id -> attrs
+        self.radios = []  # attrs with an extra 'label' key
+        self._labels = {}  # for -> text
+        self._label_for = None
+        self._label_text = []
+        self._pending_radio = None
+        self._select = None
+        self._select_value = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or "" for name, value in attrs}
+        if tag == "input":
+            self._pending_radio = None
+            input_type = attrs.get("type", "text").lower()
+            name = attrs.get("name")
+            if attrs.get("id"):
+                self.inputs[attrs["id"]] = attrs
+            if input_type == "radio":
+                attrs["label"] = ""
+                self.radios.append(attrs)
+                self._pending_radio = attrs
+                if name and "checked" in attrs:
+                    self.fields[name] = attrs.get("value", "on")
+            elif input_type == "checkbox":
+                if name and "checked" in attrs:
+                    self.fields[name] = attrs.get("value", "on")
+            elif name and input_type not in ("submit", "button", "image", "reset", "file"):
+                self.fields[name] = attrs.get("value", "")
+        elif tag == "label":
+            self._label_for = attrs.get("for")
+            self._label_text = []
+        elif tag == "select":
+            self._select = attrs.get("name")
+            self._select_value = None
+        elif tag == "option" and self._select:
+            if self._select_value is None or "selected" in attrs:
+                self._select_value = attrs.get("value", "")
+        elif tag not in ("span", "b", "i", "font"):
+            self._pending_radio = None
+
+    def handle_endtag(self, tag):
+        if tag == "label" and self._label_for:
+            self._labels[self._label_for] = _clean_text(self._label_text)
+            self._label_for = None
+        elif tag == "select" and self._select:
+            if self._select_value is not None:
+                self.fields[self._select] = self._select_value
+            self._select = None
+
+    def handle_data(self, data):
+        if self._label_for is not None:
+            self._label_text.append(data)
+        if self._pending_radio is not None and data.strip() and not self._pending_radio["label"]:
+            self._pending_radio["label"] = data.strip()
+
+    def close(self):
+        super().close()
+        for radio in self.radios:
+            if not radio["label"] and radio.get("id") in self._labels:
+                radio["label"] = self._labels[radio["id"]]
+
+
+class _GridParser(HTMLParser):
+    """Collect cell text for every row of one table"""
+
+    def __init__(self, table_id):
+        super().__init__(convert_charrefs=True)
+        self.table_id = table_id
+        self.found = False
+        self.rows = []
+        self._depth = 0
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self._depth:
+                self._depth += 1
+            elif dict(attrs).get("id") == self.table_id:
+                self.found = True
+                self._depth = 1
+            return
+        if self._depth != 1:
+            return
+        if tag == "tr":
+            self.rows.append([])
+        elif tag in ("td", "th") and self.rows:
+            self._cell = (tag, [])
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self._depth:
+            self._depth -= 1
+        elif tag in ("td", "th") and self._cell is not None and self._depth == 1:
+            cell_tag, parts = self._cell
+            self.rows[-1].append((cell_tag, _clean_text(parts)))
+            self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell[1].append(data)
+
+
+def parse_form(html):
+    parser = _FormParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def parse_grid(html, table_id):
+    """Parse an attendance grid into the same rows the Selenium path returns"""
+    parser = _GridParser(table_id)
+    parser.feed(html)
+    parser.close()
+    if not parser.found:
+        return None
+
+    attendance_data = []
+    # Skip header row
+    for row in parser.rows[1:]:
+        cells = [text for tag, text in row if tag == "td"]
+        if len(cells) >= 6:
+            subject = cells[1].strip()
+            # Only add if we have actual subject text
+            if subject:
+                attendance_data.append({
+                    "subject": subject,
+                    "total_lectures": cells[2].strip(),
+                    "present": cells[3].strip(),
+                    "absent": cells[4].strip(),
+                    "percentage": cells[5].strip()
+                })
+    return attendance_data
+
+
+async def notify_section(on_section, attendance_type, rows):
+    """Hand one finished grid to the caller's callback, never failing the scrape"""
+    if not on_section:
+        return
+    try:
+        await on_section(attendance_type, rows)
+    except Exception as e:
+        logger.error(f"Error delivering {attendance_type} attendance: {str(e)}")
+
+
+def ordered_sections(all_attendance_data):
+    """Put sections back in Theory/Practical/Tutorial order"""
+    return {
+        attendance_type: all_attendance_data[attendance_type]
+        for attendance_type in ATTENDANCE_GRIDS
+        if attendance_type in all_attendance_data
+    }
+
+
+def find_postback(form, label):
+    """Return (event_target, field_name, field_value) for the radio labelled `label`"""
+    for radio in form.radios:
+        if radio["label"] == label:
+            name = radio.get("name", "")
+            match = re.search(r"__doPostBack\(\\?'([^'\\]+)\\?'", radio.get("onclick", ""))
+            event_target = match.group(1) if match else name
+            return event_target, name, radio.get("value", "on")
+    return None
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """Lets short-lived per-user clients share one connection pool"""
+
+    def __init__(self, transport):
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        # The pool is owned by HttpERPScraper
+        pass
+
+
+class HttpERPScraper:
+    """Scrape attendance by posting the ASP.NET forms directly, without a browser"""
+
+    def __init__(self, login_url, timeout=20, max_connections=20, parallel_postbacks=True):
+        self.login_url = login_url
+        self.timeout = timeout
+        self.parallel_postbacks = parallel_postbacks
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            retries=1,
+        )
+
+    def session(self):
+        """New client with its own cookie jar on top of the shared connection pool"""
+        return httpx.AsyncClient(
+            transport=_SharedTransport(self.transport),
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    async def request(self, client, method, url, retry=False, **kwargs):
+        """One ERP request, timed out from recent ERP latency
+
+        With `retry`, connection errors and timeouts are retried with
+        backoff; only use it for requests that are safe to repeat.
+        """
+        async def send():
+            with ERP_LATENCY.measure('http'):
+                response = await client.request(method, url, timeout=ERP_LATENCY.timeout('http'), **kwargs)
+            response.raise_for_status()
+            return response
+
+        if retry:
+            return await retry_async(send, retry_on=(httpx.TransportError,))
+        return await send()
+
+    async def login_form(self, client, username, password):
+        """Fetch the login page and fill in everything but the captcha
+
+        Returns (form URL, fields). Done before a captcha token is taken,
+        so a login page that cannot be loaded costs no token.
+        """
+        response = await self.request(client, "GET", self.login_url, retry=True)
+        html = response.text
+
+        if not extract_aspnet_field(html, "__VIEWSTATE"):
+            raise ERPScrapeError("Login page has no __VIEWSTATE")
+
+        form = parse_form(html)
+        fields = dict(form.fields)
+        fields["__VIEWSTATE"] = extract_aspnet_field(html, "__VIEWSTATE")
+        fields["__EVENTVALIDATION"] = extract_aspnet_field(html, "__EVENTVALIDATION")
+
+        def field_name(element_id):
+            return form.inputs.get(element_id, {}).get("name", element_id)
+
+        fields[field_name("txtUSERNAME")] = username
+        fields[field_name("txtPASSWORD")] = password
+        submit = form.inputs.get("btnSUBMIT", {})
+        fields[submit.get("name", "btnSUBMIT")] = submit.get("value", "Login")
+        return str(response.url), fields
+
+    async def login(self, client, form_url, fields, captcha_token):
+        """Submit a filled-in login form and return the dashboard response"""
+        fields = dict(fields, **{"g-recaptcha-response": captcha_token})
+
+        # Not retried: the captcha token is only good for one submit
+        response = await self.request(client, "POST", form_url, data=fields)
+
+        if "txtPASSWORD" in response.text:
+            raise ERPLoginError("ERP returned the login page after submitting credentials")
+        logger.info("HTTP login succeeded")
+        return response
+
+    async def resume(self, client, session):
+        """Reopen the dashboard with stored cookies, or return None if the session expired"""
+        for cookie in session.get('cookies', []):
+            client.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/')
+            )
+        response = await self.request(client, "GET", session['url'], retry=True)
+        if "txtPASSWORD" in response.text:
+            logger.info("Stored ERP session expired")
+            client.cookies.clear()
+            return None
+        logger.info("Reusing stored ERP session")
+        return response
+
+    def export_session(self, client, page):
+        """Cookies and dashboard URL needed to skip the next login"""
+        return {
+            'url': str(page.url),
+            'cookies': [
+                {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path}
+                for c in client.cookies.jar
+            ],
+        }
+
+    async def postback(self, client, page, label):
+        """Select the attendance type radio button labelled `label`"""
+        form = parse_form(page.text)
+        target = find_postback(form, label)
+        if not target:
+            raise ERPScrapeError(f"No {label} radio button on dashboard")
+
+        event_target, name, value = target
+        fields = dict(form.fields)
+        fields["__EVENTTARGET"] = event_target
+        fields["__EVENTARGUMENT"] = ""
+        if name:
+            fields[name] = value
+
+        # Postbacks only select what to show, so repeating one is harmless
+        return await self.request(client, "POST", str(page.url), retry=True, data=fields)
+
+    async def fetch_attendance(self, get_credentials, get_captcha_token, session=None,
+                               on_section=None):
+        """Return ({attendance_type: [subject rows]}, session)
+
+        A stored session is tried first. `get_credentials()` (returning
+        username and password) is only called when a fresh login is needed,
+        and `get_captcha_token` is only awaited once the login page has
+        loaded. The Practical and Tutorial postbacks are issued concurrently
+        from the dashboard page, and each grid is passed to
+        `on_section(attendance_type, rows)` as soon as it is parsed.
+        """
+        all_attendance_data = {}
+        unavailable = []
+        async with self.session() as client:
+            page = None
+            if session:
+                with span('resume_session', backend="http") as resume_span:
+                    page = await self.resume(client, session)
+                    resume_span.set(resumed=page is not None)
+            if page is None:
+                username, password = get_credentials()
+                form_url, fields = await self.login_form(client, username, password)
+                # Only now that the ERP has answered is a token worth spending
+                captcha_token = await get_captcha_token()
+                with span('login', backend="http"), LOGIN_SECONDS.labels(backend="http").time():
+                    page = await self.login(client, form_url, fields, captcha_token)
+            new_session = self.export_session(client, page)
+
+            async def fetch_grid(attendance_type, table_id):
+                try:
+                    with span('grid', backend="http", type=attendance_type), \
+                            GRID_EXTRACTION_SECONDS.labels(backend="http", type=attendance_type).time():
+                        response = page
+                        if attendance_type != "Theory":
+                            response = await self.postback(client, page, attendance_type)
+                        logger.info(f"Extracting {attendance_type} attendance")
+                        rows = parse_grid(response.text, table_id)
+                    if rows:
+                        all_attendance_data[attendance_type] = rows
+                        await notify_section(on_section, attendance_type, rows)
+                    elif rows is None:
+                        logger.error(f"{attendance_type} table not found in response")
+                except (httpx.HTTPError, ERPScrapeError) as e:
+                    logger.error(f"Error getting {attendance_type.lower()} attendance: {str(e)}")
+                    if isinstance(e, ERP_UNAVAILABLE):
+                        unavailable.append(e)
+
+            if self.parallel_postbacks:
+                await asyncio.gather(*(
+                    fetch_grid(attendance_type, table_id)
+                    for attendance_type, table_id in ATTENDANCE_GRIDS.items()
+                ))
+            else:
+                for attendance_type, table_id in ATTENDANCE_GRIDS.items():
+                    await fetch_grid(attendance_type, table_id)
+
+        if not any(all_attendance_data.values()):
+            if unavailable:
+                # Every grid failed and the ERP stopped answering, say so
+                raise unavailable[-1]
+            raise ERPScrapeError("No attendance data could be retrieved")
+        return ordered_sections(all_attendance_data), new_session
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time as time_module
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+# Handed back until a known time (e.g. the ERP circuit closes), attempts untouched
+DEFERRED = "deferred"
+
+
+class JobFailed(Exception):
+    """A job ran out of attempts, or its result did not arrive in time
+
+    `error_type` is the class name of the exception that failed the last
+    attempt, None when the job timed out. For a deferred job, `retry_after`
+    is the number of seconds until it will be tried again.
+    """
+
+    def __init__(self, message, error_type=None, retry_after=None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.retry_after = retry_after
+
+
+class Job:
+    """A claimed job; `lease` proves the claim when reporting back"""
+
+    __slots__ = ('job_id', 'user_id', 'attempts', 'lease')
+
+    def __init__(self, job_id, user_id, attempts, lease):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.attempts = attempts
+        self.lease = lease
+
+    def __repr__(self):
+        return f"Job({self.job_id}, user={self.user_id}, attempt={self.attempts})"
+
+
+class JobQueue:
+    """Attendance jobs in a SQLite file shared by the bot and its worker processes
+
+    The bot enqueues a job per scrape and polls for its result; workers
+    claim jobs, lowest priority value first. A claimed job is hidden for
+    `visibility_timeout` seconds. Workers extend that while they are
+    still busy. If a worker dies, the job becomes visible again and
+    another worker retries it, up to `max_attempts` in total. Failed
+    attempts are retried after `retry_delay` times the attempt number.
+    Deferred jobs wait for a given time without using up an attempt.
+    """
+
+    def __init__(self, path, visibility_timeout=120, max_attempts=3, retry_delay=5):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        # Other processes hold the write lock briefly; wait for it instead of failing
+        self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id INTEGER NOT NULL,"
+                " priority INTEGER NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " visible_at REAL NOT NULL,"
+                " lease TEXT,"
+                " worker TEXT,"
+                " enqueued_at REAL NOT NULL,"
+                " finished_at REAL,"
+                " result TEXT,"
+                " error TEXT)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, job_id)"
+            )
+
+    def enqueue(self, user_id, priority=0):
+        """Add a job for a user, or return the one already waiting or running"""
+        now = time_module.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT job_id FROM jobs WHERE user_id = ? AND status IN (?, ?, ?)",
+                (user_id, QUEUED, DEFERRED, RUNNING)
+            ).fetchone()
+            if row:
+                return row[0]
+            return self._db.execute(
+                "INSERT INTO jobs (user_id, priority, status, visible_at, enqueued_at)"
+                " VALUES (?, ?, ?, ?, ?)", (user_id, priority, QUEUED, now, now)
+            ).lastrowid
+
+    def claim(self, worker):
+        """Take the next visible job, or None if there is nothing to do"""
+        now = time_module.time()
+        lease = uuid.uuid4().hex
+        with self._lock, self._db:
+            # Jobs whose worker vanished on its last attempt have nobody left to retry them
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = 'visibility timeout'"
+                " WHERE status = ? AND visible_at <= ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now, self.max_attempts)
+            )
+            # One statement, so two workers can never claim the same job
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, visible_at = ?, lease = ?, worker = ?"
+                " WHERE job_id = ("
+                "  SELECT job_id FROM jobs WHERE status IN (?, ?, ?) AND visible_at <= ?"
+                "  ORDER BY priority, job_id LIMIT 1)",
+                (RUNNING, now + self.visibility_timeout, lease, worker, QUEUED, DEFERRED, RUNNING, now)
+            )
+            row = self._db.execute(
+                "SELECT job_id, user_id, attempts FROM jobs WHERE lease = ?", (lease,)
+            ).fetchone()
+        return Job(*row, lease) if row else None
+
+    def _update_leased(self, job, sql, params):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                sql + " WHERE job_id = ? AND lease = ? AND status = ?", (*params, job.job_id, job.lease, RUNNING)
+            )
+        # False when the lease expired and the job went to another worker
+        return cursor.rowcount == 1
+
+    def extend(self, job):
+        """Keep a job hidden for another visibility timeout"""
+        return self._update_leased(
+            job, "UPDATE jobs SET visible_at = ?", (time_module.time() + self.visibility_timeout,)
+        )
+
+    def complete(self, job, result):
+        """Post a job's result (anything JSON serialisable)"""
+        return self._update_leased(
+            job, "UPDATE jobs SET status = ?, finished_at = ?, result = ?, lease = NULL",
+            (DONE, time_module.time(), json.dumps(result, separators=(',', ':'), ensure_ascii=False))
+        )
+
+    def fail(self, job, error, retry=True):
+        """Record a failed attempt; the job is retried unless it is out of attempts or `retry` is False"""
+        now = time_module.time()
+        if not retry or job.attempts >= self.max_attempts:
+            return self._update_leased(
+                job, "UPDATE jobs SET status = ?, finished_at = ?, error = ?, lease = NULL",
+                (FAILED, now, error)
+            )
+        return self._update_leased(
+            job, "UPDATE jobs SET status = ?, visible_at = ?, error = ?, lease = NULL",
+            (QUEUED, now + self.retry_delay * job.attempts, error)
+        )
+
+    def release(self, job):
+        """Hand a job back untouched (e.g. the worker is shutting down)"""
+        return self._update_leased(
+            job, "UPDATE jobs SET status = ?, visible_at = ?, attempts = attempts - 1, lease = NULL",
+            (QUEUED, time_module.time())
+        )
+
+    def defer(self, job, delay, error):
+        """Hand a job back to be tried again in `delay` seconds, without using up an attempt"""
+        return self._update_leased(
+            job, "UPDATE jobs SET status = ?, visible_at = ?, attempts = attempts - 1, error = ?, lease = NULL",
+            (DEFERRED, time_module.time() + delay, error)
+        )
+
+    def status(self, job_id):
+        """(status, result, error) for a job, None if it does not exist"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, result, error FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, error = row
+        return status, json.loads(result) if result is not None else None, error
+
+    async def wait(self, job_id, timeout, poll_interval=0.2):
+        """Poll until a job is done and return its result, raising JobFailed otherwise"""
+        deadline = time_module.monotonic() + timeout
+        while True:
+            state = self.status(job_id)
+            if state is None:
+                raise JobFailed(f"Job {job_id} disappeared")
+            status, result, error = state
+            if status == DONE:
+                return result
+            if status in (FAILED, DEFERRED):
+                # Workers record errors as "ExceptionType: message"
+                error_type, separator, _ = (error or "").partition(": ")
+                # A deferred job stays queued and still runs later, but nobody should wait for it
+                raise JobFailed(
+                    error or f"Job {job_id} failed", error_type if separator else None,
+                    self._retry_after(job_id) if status == DEFERRED else None,
+                )
+            if time_module.monotonic() >= deadline:
+                raise JobFailed(f"Job {job_id} timed out while {status}")
+            await asyncio.sleep(poll_interval)
+
+    def _retry_after(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT visible_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return max(0.0, row[0] - time_module.time()) if row else 0.0
+
+    def purge(self, older_than=3600):
+        """Delete finished jobs older than `older_than` seconds"""
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, time_module.time() - older_than)
+            )
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {status: counts.get(status, 0) for status in (QUEUED, DEFERRED, RUNNING, DONE, FAILED)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobWorker:
+    """Claims jobs from a JobQueue and runs up to `concurrency` of them at once
+
+    `handle(job)` returns the job's result or raises to fail the attempt.
+    Exceptions in `permanent` (e.g. wrong credentials) fail the job without
+    a retry, since another attempt cannot succeed. Exceptions in `defer`
+    (e.g. an open circuit) hand it back for the exception's `retry_after`
+    seconds without using up an attempt. Leases are extended
+    while a job runs; on shutdown unfinished jobs are released so another
+    worker picks them up straight away.
+    """
+
+    def __init__(self, queue, handle, concurrency=2, poll_interval=0.5, name=None, permanent=(),
+                 defer=()):
+        self.queue = queue
+        self.handle = handle
+        self.permanent = permanent
+        self.defer = defer
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.completed = 0
+        self.failed = 0
+        self._tasks = set()
+
+    async def run(self, stop):
+        """Work until the `stop` event is set"""
+        slots = asyncio.Semaphore(self.concurrency)
+        logger.info(f"Worker {self.name} started with {self.concurrency} slots")
+        try:
+            while not stop.is_set():
+                await slots.acquire()
+                job = self.queue.claim(self.name)
+                if job is None:
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(stop.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                task = asyncio.create_task(self._process(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                task.add_done_callback(lambda _: slots.release())
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            logger.info(f"Worker {self.name} stopped: {self.completed} done, {self.failed} failed")
+
+    async def _keep_leased(self, job):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            if not self.queue.extend(job):
+                logger.warning(f"Lost the lease on {job}")
+                return
+
+    async def _process(self, job):
+        heartbeat = asyncio.create_task(self._keep_leased(job))
+        try:
+            result = await self.handle(job)
+        except asyncio.CancelledError:
+            self.queue.release(job)
+            raise
+        except self.defer as e:
+            delay = getattr(e, 'retry_after', None) or self.poll_interval
+            logger.info(f"{job} deferred for {delay:.0f}s: {str(e)}")
+            self.queue.defer(job, delay, f"{type(e).__name__}: {str(e)}")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"{job} failed: {str(e)}")
+            self.queue.fail(job, f"{type(e).__name__}: {str(e)}", retry=not isinstance(e, self.permanent))
+        else:
+            self.completed += 1
+            if not self.queue.complete(job, result):
+                logger.warning(f"{job} finished after its lease expired, result dropped")
+        finally:
+            heartbeat.cancel()
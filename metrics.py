@@ -0,0 +1,260 @@
+import math
+import threading
+import time as time_module
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cached reply up to a slow captcha solve
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """A metric family; labelled children are created on first use"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}  # label values -> child state
+        self._function = None
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+        return _Child(self, child, values)
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self.labels()
+
+    def set_function(self, function):
+        """Read the value from `function()` at scrape time instead of tracking it"""
+        self._function = function
+
+    def collect(self):
+        """Exposition lines for this family"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        if self._function is not None:
+            lines.append(f"{self.name} {_format_value(self._function())}")
+            return lines
+        with self._lock:
+            children = sorted(self._children.items())
+            for values, state in children:
+                lines.extend(self._collect_child(list(zip(self.labelnames, values)), state))
+        return lines
+
+
+class _Child:
+    """One labelled time series of a metric family"""
+
+    def __init__(self, metric, state, values):
+        self._metric = metric
+        self._state = state
+        self._values = values
+
+    def inc(self, amount=1):
+        self._metric._inc(self._state, amount)
+
+    def set(self, value):
+        self._metric._set(self._state, value)
+
+    def observe(self, value):
+        self._metric._observe(self._state, value)
+
+    @contextmanager
+    def time(self):
+        start = time_module.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time_module.perf_counter() - start)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return [0.0]
+
+    def _inc(self, state, amount):
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        with self._lock:
+            state[0] += amount
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _collect_child(self, labels, state):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(state[0])}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return [0.0]
+
+    def _inc(self, state, amount):
+        with self._lock:
+            state[0] += amount
+
+    def _set(self, state, value):
+        with self._lock:
+            state[0] = value
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def _collect_child(self, labels, state):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(state[0])}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_child(self):
+        # [per-bucket counts..., sum]
+        return [0] * len(self.buckets) + [0.0]
+
+    def _observe(self, state, value):
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-1] += value
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _collect_child(self, labels, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state):
+            cumulative += count
+            bucket_labels = labels + [("le", _format_value(bound))]
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(state[-1])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metric families and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Timings observed where the work happens
+LOGIN_SECONDS = REGISTRY.histogram(
+    "erpbot_login_seconds", "Time to log in to the ERP, captcha token in hand", ["backend"]
+)
+CAPTCHA_SOLVE_SECONDS = REGISTRY.histogram(
+    "erpbot_captcha_solve_seconds", "Time for the captcha provider to solve one reCAPTCHA"
+)
+GRID_EXTRACTION_SECONDS = REGISTRY.histogram(
+    "erpbot_grid_extraction_seconds", "Time to load and read one attendance grid", ["backend", "type"]
+)
+TELEGRAM_SEND_SECONDS = REGISTRY.histogram(
+    "erpbot_telegram_send_seconds", "Time for one Telegram send or edit call", ["method"]
+)
+BROWSER_PAGE_LOAD_SECONDS = REGISTRY.histogram(
+    "erpbot_browser_page_load_seconds", "Dashboard load time in Chrome after a login", ["profile"]
+)
+BROWSER_MEMORY_BYTES = REGISTRY.histogram(
+    "erpbot_browser_memory_bytes", "Resident memory of one pooled Chrome, sampled after each login", ["profile"],
+    buckets=tuple(megabytes * 1024 * 1024 for megabytes in (64, 128, 192, 256, 384, 512, 768, 1024, 1536)),
+)
+
+# Events counted as they happen
+BROWSER_RESTARTS = REGISTRY.counter(
+    "erpbot_browser_restarts_total", "Pooled browsers replaced after failing, wearing out or crashing"
+)
+CAPTCHA_FAILURES = REGISTRY.counter(
+    "erpbot_captcha_failures_total", "Captcha solves that raised an error"
+)
+WEBHOOK_UPDATES = REGISTRY.counter(
+    "erpbot_webhook_updates_total", "Telegram updates posted to the webhook, by outcome", ["result"]
+)
+
+# Read from the components at scrape time, see ERPBot.instrument
+CACHE_HITS = REGISTRY.counter("erpbot_cache_hits_total", "Attendance cache hits with fresh data")
+CACHE_STALE_HITS = REGISTRY.counter(
+    "erpbot_cache_stale_hits_total", "Attendance cache hits served stale while refreshing"
+)
+CACHE_MISSES = REGISTRY.counter("erpbot_cache_misses_total", "Attendance cache misses")
+QUEUE_DEPTH = REGISTRY.gauge("erpbot_queue_depth", "Scrape requests waiting in the scheduler")
+SCRAPES_RUNNING = REGISTRY.gauge("erpbot_scrapes_running", "Scrapes currently running")
+BROWSERS_READY = REGISTRY.gauge("erpbot_browsers_ready", "Live browsers in the pool")
+CAPTCHA_TOKENS = REGISTRY.gauge("erpbot_captcha_tokens_available", "Unexpired pre-solved captcha tokens")
+ERP_CIRCUIT_OPEN = REGISTRY.gauge("erpbot_erp_circuit_open", "1 while the ERP circuit breaker refuses scrapes")
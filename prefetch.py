@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import os
+import time as time_module
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def parse_windows(spec):
+    """Parse "02:00-05:00,13:30-14:00" into [(time(2, 0), time(5, 0)), ...]"""
+    windows = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, end = part.split('-')
+        windows.append((
+            datetime.strptime(start.strip(), "%H:%M").time(),
+            datetime.strptime(end.strip(), "%H:%M").time(),
+        ))
+    return windows
+
+
+def window_start(windows, now=None):
+    """When the window containing `now` opened, or None outside every window
+
+    Windows may wrap midnight.
+    """
+    now = now or datetime.now()
+    time_of_day = now.time()
+    for start, end in windows:
+        if start <= end:
+            if start <= time_of_day < end:
+                return datetime.combine(now.date(), start)
+        elif time_of_day >= start:
+            return datetime.combine(now.date(), start)
+        elif time_of_day < end:
+            return datetime.combine(now.date() - timedelta(days=1), start)
+    return None
+
+
+def in_window(windows, now=None):
+    """True if `now` falls inside any window (windows may wrap midnight)"""
+    return window_start(windows, now) is not None
+
+
+class PrefetchCrawler:
+    """Walks every registered user and refreshes their attendance into the cache
+
+    Progress is written to `state_path` after every user, so a crawl that
+    was interrupted by a crash resumes where it stopped instead of starting
+    over. A crawl left unfinished in an earlier window is dropped: its
+    users are refreshed by a new run rather than a day late.
+    """
+
+    def __init__(self, fetch, list_users, state_path, windows,
+                 concurrency=2, min_interval=5.0):
+        self.fetch = fetch
+        self.list_users = list_users
+        self.state_path = state_path
+        self.windows = windows
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+
+        self.running = False
+        self.state = self._load_state()
+        self._rate_lock = asyncio.Lock()
+        self._last_start = 0.0
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error loading prefetch state: {str(e)}")
+            return None
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    @property
+    def has_unfinished_run(self):
+        return bool(self.state) and not self.state.get('finished_at')
+
+    def progress(self):
+        """Progress of the current or last crawl"""
+        if not self.state:
+            return {'running': self.running}
+        return {
+            'running': self.running,
+            'run_id': self.state['run_id'],
+            'total': len(self.state['users']),
+            'done': len(self.state['done']),
+            'failed': len(self.state['failed']),
+            'started_at': self.state['started_at'],
+            'finished_at': self.state.get('finished_at'),
+        }
+
+    def _new_run(self):
+        self.state = {
+            'run_id': uuid.uuid4().hex[:8],
+            'started_at': time_module.time(),
+            'finished_at': None,
+            'users': list(self.list_users()),
+            'done': [],
+            'failed': [],
+        }
+        self._save_state()
+
+    async def _wait_turn(self):
+        """Space out logins so we never hammer the ERP"""
+        async with self._rate_lock:
+            delay = self._last_start + self.min_interval - time_module.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_start = time_module.monotonic()
+
+    async def _crawl_user(self, user_id, semaphore):
+        async with semaphore:
+            if not in_window(self.windows):
+                return
+            await self._wait_turn()
+            try:
+                await self.fetch(user_id)
+                self.state['done'].append(user_id)
+            except Exception as e:
+                logger.error(f"Prefetch failed for user {user_id}: {str(e)}")
+                self.state['failed'].append(user_id)
+            self._save_state()
+
+    async def run_once(self):
+        """Crawl (or resume crawling) all users while inside an off-peak window"""
+        opened = window_start(self.windows)
+        if self.running or opened is None:
+            return
+        self.running = True
+        try:
+            if self.has_unfinished_run and self.state['started_at'] >= opened.timestamp():
+                logger.info(f"Resuming prefetch run {self.state['run_id']}")
+            else:
+                if self.has_unfinished_run:
+                    logger.info(f"Discarding prefetch run {self.state['run_id']} from an earlier window")
+                self._new_run()
+                logger.info(f"Starting prefetch run {self.state['run_id']}")
+
+            handled = set(self.state['done']) | set(self.state['failed'])
+            pending = [user_id for user_id in self.state['users'] if user_id not in handled]
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._crawl_user(user_id, semaphore) for user_id in pending))
+
+            progress = self.progress()
+            if progress['done'] + progress['failed'] >= progress['total']:
+                self.state['finished_at'] = time_module.time()
+                self._save_state()
+                logger.info(
+                    f"Prefetch run {progress['run_id']} finished: "
+                    f"{progress['done']} refreshed, {progress['failed']} failed"
+                )
+            else:
+                logger.info(
+                    f"Prefetch run {progress['run_id']} paused outside its window at "
+                    f"{progress['done'] + progress['failed']}/{progress['total']}"
+                )
+        finally:
+            self.running = False
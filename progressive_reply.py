@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time as time_module
+
+from metrics import TELEGRAM_SEND_SECONDS
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Telegram's limit for a single text message
+MAX_MESSAGE_LENGTH = 4096
+
+
+def split_message(parts, limit=MAX_MESSAGE_LENGTH):
+    """Join text parts into as few messages as possible under the length limit"""
+    messages = []
+    current = ""
+    for part in parts:
+        if current and len(current) + len(part) > limit:
+            messages.append(current)
+            current = ""
+        current += part
+    if current:
+        messages.append(current)
+    return [message[:limit] for message in messages]
+
+
+class ProgressiveReply:
+    """A single Telegram message that is edited in place as sections arrive
+
+    Edits are throttled to one per `min_interval` seconds; sections that
+    arrive in between are folded into the next edit.
+    """
+
+    def __init__(self, message, pending_footer="⏳ Fetching the rest...", min_interval=1.0):
+        self.message = message
+        self.pending_footer = pending_footer
+        self.min_interval = min_interval
+        self.sections = {}  # title -> rendered text, in arrival order
+        self.edits = 0
+        self._shown = message.text if message else None
+        self._last_edit = 0.0
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+
+    def __contains__(self, title):
+        return title in self.sections
+
+    async def add(self, title, text):
+        """Add a rendered section and schedule a throttled edit"""
+        self.sections[title] = text
+        if self._flush_task is None or self._flush_task.done():
+            delay = max(0.0, self._last_edit + self.min_interval - time_module.monotonic())
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def status(self, text):
+        """Replace the placeholder text, only until the first section arrives"""
+        if self.sections:
+            return
+        try:
+            await self._edit(text)
+        except Exception as e:
+            logger.error(f"Error updating progressive reply: {str(e)}")
+
+    async def _flush_later(self, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        await self._flush(final=False)
+
+    async def _edit(self, text):
+        if text == self._shown:
+            return
+        async with self._lock:
+            with span('telegram', method="edit_text"), TELEGRAM_SEND_SECONDS.labels(method="edit_text").time():
+                await self.message.edit_text(text)
+            self._shown = text
+            self._last_edit = time_module.monotonic()
+            self.edits += 1
+
+    async def _flush(self, final):
+        parts = list(self.sections.values())
+        if not final and self.pending_footer:
+            parts.append(self.pending_footer)
+        messages = split_message(parts)
+        try:
+            await self._edit(messages[0])
+            if final:
+                # Anything that does not fit goes out as follow-up messages
+                for overflow in messages[1:]:
+                    with span('telegram', method="reply_text"), \
+                            TELEGRAM_SEND_SECONDS.labels(method="reply_text").time():
+                        await self.message.reply_text(overflow)
+        except Exception as e:
+            logger.error(f"Error updating progressive reply: {str(e)}")
+
+    async def _cancel_pending(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+
+    async def finish(self):
+        """Show every section without the pending footer"""
+        await self._cancel_pending()
+        if self.sections:
+            await self._flush(final=True)
+
+    async def fail(self, text):
+        """Report an error, keeping any sections that were already shown"""
+        await self._cancel_pending()
+        if self.sections:
+            await self._flush(final=True)
+            with span('telegram', method="reply_text"), TELEGRAM_SEND_SECONDS.labels(method="reply_text").time():
+                await self.message.reply_text(text)
+        else:
+            await self._edit(text)
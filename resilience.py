@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import random
+import threading
+import time as time_module
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# step -> (timeout before enough samples, lowest timeout, highest timeout), in seconds
+STEP_TIMEOUTS = {
+    'page': (5, 3, 30),        # login page or stored session loading in the browser
+    'login': (10, 5, 60),      # credentials submitted until the dashboard shows
+    'postback': (5, 2, 20),    # attendance type radio button clicked
+    'grid': (10, 3, 30),       # one attendance grid loaded and read
+    'http': (20, 5, 60),       # one request to the ERP without a browser
+}
+
+
+class LatencyTracker:
+    """Rolling latency samples per ERP step, turned into timeouts
+
+    Keeps the last `window` durations of each step. Once a step has
+    `min_samples` of them its timeout is `factor` times the 99th
+    percentile, clamped to the bounds in STEP_TIMEOUTS, so a slow ERP gets
+    more time and a fast one fails fast. Only steps that finished are
+    recorded: a wait that timed out says nothing about how long the step
+    takes, and would pull the timeout up to itself.
+    """
+
+    def __init__(self, window=200, min_samples=10, factor=2.0, steps=STEP_TIMEOUTS):
+        self.window = window
+        self.min_samples = min_samples
+        self.factor = factor
+        self.steps = steps
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def observe(self, step, seconds):
+        with self._lock:
+            samples = self._samples.get(step)
+            if samples is None:
+                samples = self._samples[step] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def measure(self, step):
+        """Record how long a block took, if it did not raise"""
+        started = time_module.perf_counter()
+        yield
+        self.observe(step, time_module.perf_counter() - started)
+
+    def percentile(self, step, fraction):
+        with self._lock:
+            samples = sorted(self._samples.get(step, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def timeout(self, step):
+        default, lowest, highest = self.steps[step]
+        with self._lock:
+            count = len(self._samples.get(step, ()))
+        if count < self.min_samples:
+            return default
+        return min(highest, max(lowest, self.percentile(step, 0.99) * self.factor))
+
+    def snapshot(self):
+        """{step: {'samples', 'p50', 'p95', 'p99', 'timeout'}} in seconds, for logs"""
+        with self._lock:
+            steps = list(self._samples)
+        return {
+            step: {
+                'samples': len(self._samples[step]),
+                'p50': round(self.percentile(step, 0.5), 3),
+                'p95': round(self.percentile(step, 0.95), 3),
+                'p99': round(self.percentile(step, 0.99), 3),
+                'timeout': round(self.timeout(step), 1),
+            }
+            for step in steps
+        }
+
+
+# Shared by the scrapers in this process
+ERP_LATENCY = LatencyTracker()
+
+
+def backoff_delays(attempts, base=0.25, cap=5.0):
+    """Delays before each retry: exponential with full jitter"""
+    for attempt in range(attempts - 1):
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def retry_async(func, attempts=3, base=0.25, cap=5.0, retry_on=(Exception,)):
+    """Await `func()` up to `attempts` times, backing off between failures"""
+    delays = backoff_delays(attempts, base, cap)
+    while True:
+        try:
+            return await func()
+        except retry_on as e:
+            delay = next(delays, None)
+            if delay is None:
+                raise
+            logger.warning(f"Retrying in {delay:.2f}s after {type(e).__name__}: {str(e)}")
+            await asyncio.sleep(delay)
+
+
+class CircuitOpen(Exception):
+    """The ERP is failing, so requests are refused without trying"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"ERP circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops scraping after `failure_threshold` consecutive ERP failures
+
+    While open, calls fail immediately with CircuitOpen, so no captcha is
+    spent on a login that cannot work. After `recovery_time` seconds one
+    trial call is let through (half open). If it succeeds the circuit
+    closes; if it fails the circuit opens again with the recovery time
+    doubled, up to `max_recovery_time`. Only exceptions in `count` are
+    failures. Exceptions in `ignore` (e.g. wrong credentials) mean the ERP
+    answered, and count as successes. Anything else (e.g. no browser free)
+    is a local problem and leaves the circuit as it is.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_time=60, max_recovery_time=600, ignore=(),
+                 count=(Exception,)):
+        self.failure_threshold = failure_threshold
+        self.base_recovery_time = recovery_time
+        self.max_recovery_time = max_recovery_time
+        self.ignore = ignore
+        self.count = count
+        self.recovery_time = recovery_time
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.retry_after > 0 or self._trial_running:
+            return "open"
+        return "half_open"
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+    @property
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.recovery_time - time_module.monotonic())
+
+    def check(self):
+        """Raise CircuitOpen if a call would be refused right now"""
+        if self.is_open:
+            raise CircuitOpen(self.retry_after or self.recovery_time)
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("ERP circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self.recovery_time = self.base_recovery_time
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None:
+            # The half-open trial failed
+            self.recovery_time = min(self.max_recovery_time, self.recovery_time * 2)
+            self.opened_at = time_module.monotonic()
+            logger.warning(f"ERP still failing, circuit open for {self.recovery_time:.0f}s")
+        elif self.failures >= self.failure_threshold:
+            self.opened_at = time_module.monotonic()
+            logger.warning(f"ERP failed {self.failures} times in a row, circuit open for {self.recovery_time:.0f}s")
+
+    async def call(self, func):
+        """Await `func()` through the breaker"""
+        self.check()
+        trial = self.opened_at is not None
+        if trial:
+            self._trial_running = True
+        try:
+            result = await func()
+        except self.ignore:
+            self.record_success()
+            raise
+        except asyncio.CancelledError:
+            raise
+        except self.count:
+            self.record_failure()
+            raise
+        else:
+            self.record_success()
+            return result
+        finally:
+            if trial:
+                self._trial_running = False
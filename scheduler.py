@@ -0,0 +1,204 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time as time_module
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_COLD = 0  # nothing cached for the user, they are staring at "Please wait"
+PRIORITY_WARM = 1  # the user was served recently or already has stale data on screen
+PRIORITY_BACKGROUND = 2  # pre-fetching and other work nobody is waiting for
+
+
+class RateLimited(Exception):
+    """The user has used up their request budget"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class SchedulerFull(Exception):
+    """Too many requests are already queued"""
+
+
+class TokenBucket:
+    """Classic token bucket: `burst` tokens, refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time_module.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Take a token, or return the seconds until one is available"""
+        now = time_module.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate else float('inf')
+
+    @property
+    def full(self):
+        self._refill(time_module.monotonic())
+        return self.tokens >= self.burst
+
+
+class RequestScheduler:
+    """Admission control in front of the scraping backends
+
+    Each user has a token bucket that limits how often they can start a
+    scrape. At most `max_concurrent` scrapes run at once; the rest wait in
+    a priority queue (cold users first, then warm, then background work,
+    FIFO within a priority) that holds at most `max_queue` requests.
+    """
+
+    def __init__(self, max_concurrent=4, rate=1 / 60, burst=3, max_queue=50, recent_window=600):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.recent_window = recent_window
+
+        self._buckets = {}  # user_id -> TokenBucket
+        self._last_served = {}  # user_id -> monotonic time of the last finished scrape
+        self._queue = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._running = 0
+
+        self.admitted = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def queue_depth(self):
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def check_rate(self, user_id):
+        """Charge one request to the user's bucket, raising RateLimited if it is empty"""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+        retry_after = bucket.take()
+        if retry_after:
+            self.rate_limited += 1
+            raise RateLimited(retry_after)
+        self._forget_idle_users()
+
+    def _forget_idle_users(self):
+        # Full buckets and old scrapes carry no state, drop them so the dicts do not grow forever
+        if len(self._buckets) > 1000:
+            for user_id in [u for u, bucket in self._buckets.items() if bucket.full]:
+                del self._buckets[user_id]
+        if len(self._last_served) > 1000:
+            cutoff = time_module.monotonic() - self.recent_window
+            for user_id in [u for u, served_at in self._last_served.items() if served_at < cutoff]:
+                del self._last_served[user_id]
+
+    def priority_for(self, user_id, cached=False):
+        """Cold users go first; users with data on screen or a recent scrape wait behind them"""
+        if cached:
+            return PRIORITY_WARM
+        served_at = self._last_served.get(user_id)
+        if served_at is not None and time_module.monotonic() - served_at < self.recent_window:
+            return PRIORITY_WARM
+        return PRIORITY_COLD
+
+    def position(self, future):
+        """1-based position of a queued request among those that will run before it"""
+        entries = sorted(entry for entry in self._queue if not entry[2].done())
+        for index, entry in enumerate(entries):
+            if entry[2] is future:
+                return index + 1
+        return 0
+
+    async def _acquire(self, priority, on_queued):
+        if self._running < self.max_concurrent and not self.queue_depth:
+            self._running += 1
+            return 0.0
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerFull(f"{self.queue_depth} requests already queued")
+
+        entry = (priority, next(self._seq), asyncio.get_running_loop().create_future())
+        future = entry[2]
+        heapq.heappush(self._queue, entry)
+        self.queued += 1
+        start = time_module.monotonic()
+        try:
+            if on_queued:
+                try:
+                    await on_queued(self.position(future))
+                except Exception as e:
+                    logger.error(f"Error reporting queue position: {str(e)}")
+            # The slot is handed over by _release, already counted in _running
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Got a slot before we were cancelled, pass it on
+                self._release()
+            else:
+                future.cancel()
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+            raise
+        return time_module.monotonic() - start
+
+    def _release(self):
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    async def run(self, user_id, func, priority=PRIORITY_COLD, on_queued=None):
+        """Run `func()` once a slot is free
+
+        `on_queued(position)` is awaited once if the request has to wait.
+        """
+        with span('queue_wait', priority=priority) as wait_span:
+            waited = await self._acquire(priority, on_queued)
+            wait_span.set(queued=bool(waited))
+        self.admitted += 1
+        if waited:
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            logger.info(f"Request for {user_id} waited {waited:.1f}s in queue (priority {priority})")
+        try:
+            return await func()
+        finally:
+            if priority != PRIORITY_BACKGROUND:
+                self._last_served[user_id] = time_module.monotonic()
+            self._release()
+
+    def stats(self):
+        return {
+            'running': self._running,
+            'queue_depth': self.queue_depth,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rate_limited': self.rate_limited,
+            'rejected': self.rejected,
+            'avg_wait_s': round(self.total_wait / self.queued, 2) if self.queued else 0.0,
+            'max_wait_s': round(self.max_wait, 2),
+        }
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution
+
+    The first caller for a key starts the work as a task; callers that
+    arrive while it is running await the same task and get the same
+    result or exception. A caller being cancelled does not cancel the
+    shared work unless it was the last one waiting for it.
+    """
+
+    def __init__(self):
+        self._tasks = {}  # key -> asyncio.Task
+        self._waiters = {}  # key -> number of callers awaiting the task
+
+    def in_flight(self, key):
+        return key in self._tasks
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+            self._waiters.pop(key, None)
+
+    async def do(self, key, func):
+        """Run `func()` for `key`, or join the run that is already in flight"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            logger.info(f"Joining in-flight request for {key}")
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._tasks.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    # Nobody is left to receive the result
+                    logger.info(f"Cancelling in-flight request for {key}, no callers left")
+                    task.cancel()
@@ -0,0 +1,144 @@
+import json
+import logging
+import sqlite3
+import threading
+import time as time_module
+
+from attendance_record import ATTENDANCE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+def make_snapshot(report):
+    """Reduce an AttendanceReport to {type: {subject: (total, present, absent, pct_x100)}}
+
+    The percentage is kept in hundredths so the whole snapshot is integers.
+    """
+    return {
+        attendance_type: {
+            subject.subject: (subject.total, subject.present, subject.absent, round(subject.percentage * 100))
+            for subject in subjects
+        }
+        for attendance_type, subjects in report.items()
+    }
+
+
+def encode_snapshot(snapshot):
+    """Compact JSON: [[type, [[subject, total, present, absent, pct_x100], ...]], ...]"""
+    return json.dumps(
+        [
+            [attendance_type, [[subject, *counts] for subject, counts in rows.items()]]
+            for attendance_type, rows in snapshot.items()
+        ],
+        separators=(',', ':'),
+        ensure_ascii=False,
+    )
+
+
+def decode_snapshot(text):
+    return {
+        attendance_type: {row[0]: tuple(row[1:]) for row in rows}
+        for attendance_type, rows in json.loads(text)
+    }
+
+
+def _percent(pct_x100):
+    return f"{pct_x100 / 100:g}%"
+
+
+def diff_snapshots(old, new, threshold=ATTENDANCE_THRESHOLD):
+    """Human readable changes between two snapshots, empty if nothing changed
+
+    Types missing from `new` (e.g. a grid that failed to load) are not
+    reported as removed.
+    """
+    limit = round(threshold * 100)
+    changes = []
+    for attendance_type, rows in new.items():
+        old_rows = old.get(attendance_type)
+        if old_rows is None:
+            continue
+        for subject, (total, present, absent, pct) in rows.items():
+            previous = old_rows.get(subject)
+            if previous is None:
+                changes.append(f"🆕 {attendance_type} · {subject}: {present}/{total}")
+                continue
+            old_total, old_present, old_absent, old_pct = previous
+            if (total, present) != (old_total, old_present):
+                line = f"{attendance_type} · {subject}: present {old_present}/{old_total} → {present}/{total}"
+                if pct >= 0:
+                    line += f" ({_percent(pct)})"
+                changes.append(line)
+            if 0 <= pct < limit <= old_pct:
+                changes.append(f"⚠️ {attendance_type} · {subject} dropped below {threshold:g}% ({_percent(pct)})")
+            elif 0 <= old_pct < limit <= pct:
+                changes.append(f"✅ {attendance_type} · {subject} is back above {threshold:g}% ({_percent(pct)})")
+    return changes
+
+
+class SubscriptionStore:
+    """Opted-in users and the last attendance snapshot each of them was sent"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions ("
+                " user_id INTEGER PRIMARY KEY,"
+                " snapshot TEXT,"
+                " subscribed_at REAL NOT NULL,"
+                " updated_at REAL)"
+            )
+        self._user_ids = {row[0] for row in self._db.execute("SELECT user_id FROM subscriptions")}
+
+    def __contains__(self, user_id):
+        return user_id in self._user_ids
+
+    def __len__(self):
+        return len(self._user_ids)
+
+    def user_ids(self):
+        return list(self._user_ids)
+
+    def subscribe(self, user_id, report=None):
+        """Opt a user in, using `report` as the baseline if given"""
+        snapshot = encode_snapshot(make_snapshot(report)) if report else None
+        now = time_module.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO subscriptions (user_id, snapshot, subscribed_at, updated_at)"
+                " VALUES (?, ?, ?, ?)", (user_id, snapshot, now, now if snapshot else None)
+            )
+        self._user_ids.add(user_id)
+
+    def unsubscribe(self, user_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
+        self._user_ids.discard(user_id)
+
+    def update(self, user_id, report):
+        """Store the new snapshot and return the changes since the previous one"""
+        if user_id not in self._user_ids:
+            return []
+        new = make_snapshot(report)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT snapshot FROM subscriptions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return []
+            old = decode_snapshot(row[0]) if row[0] else None
+            # Keep types that failed to load this time from the previous snapshot
+            merged = dict(old or {}, **new)
+            self._db.execute(
+                "UPDATE subscriptions SET snapshot = ?, updated_at = ? WHERE user_id = ?",
+                (encode_snapshot(merged), time_module.time(), user_id)
+            )
+        return diff_snapshots(old, new) if old else []
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,82 @@
+import os
+import socket
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+# bot.py reads its configuration and creates data/ and logs/ at import time,
+# so point it at a scratch directory and a closed port before anything imports it
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+os.chdir(tempfile.mkdtemp(prefix='erpbot-tests-'))
+os.environ.update({
+    'TELEGRAM_TOKEN': '123456:test-token',
+    'CAPTCHA_API_KEY': 'test',
+    'CAPTCHA_PROVIDER': 'fake',
+    'ERP_URL': f'http://127.0.0.1:{_closed_port()}/pLogin.aspx',
+    'ERP_BACKEND': 'http',
+    'SUBSCRIPTION_INTERVAL': '0',
+})
+
+# bot.py imports the deployment's config.py, which is not in the repository;
+# the values it needs come from the environment above
+if 'config' not in sys.modules:
+    config = types.ModuleType('config')
+    for name in ('TELEGRAM_TOKEN', 'CAPTCHA_API_KEY', 'ERP_URL'):
+        setattr(config, name, os.environ[name])
+    sys.modules['config'] = config
+
+
+@pytest.fixture
+def bot():
+    import bot as bot_module
+    erp_bot = bot_module.ERPBot(
+        bot_module.TELEGRAM_TOKEN, bot_module.CAPTCHA_API_KEY, bot_module.ERP_URL
+    )
+    erp_bot.users.save(1, 'student', 'secret')
+    yield erp_bot
+    for store in (erp_bot.attendance_cache, erp_bot.users, erp_bot.subscriptions,
+                  erp_bot.history, erp_bot.groups):
+        store.close()
+    erp_bot.driver_executor.shutdown(wait=False)
+    for name in ('attendance_cache.db', 'users.db', 'subscriptions.db', 'history.db', 'groups.db'):
+        for suffix in ('', '-wal', '-shm'):
+            path = Path('data') / (name + suffix)
+            if path.exists():
+                path.unlink()
+
+
+class FakeMessage:
+    """Collects the bot's replies instead of sending them to Telegram"""
+
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.replies.append(text)
+        return self
+
+
+@pytest.fixture
+def make_update():
+    def make(user_id=1):
+        return types.SimpleNamespace(
+            effective_user=types.SimpleNamespace(id=user_id),
+            message=FakeMessage(),
+        )
+    return make
@@ -0,0 +1,38 @@
+import asyncio
+import time as time_module
+
+from attendance_record import AttendanceReport, SubjectAttendance
+from http_scraper import ERPScrapeError
+
+
+def stale_report(bot, user_id):
+    report = AttendanceReport()
+    report.add("Theory", [SubjectAttendance("Maths", 10, 8, 2, 80.0)])
+    bot.attendance_cache.put(user_id, report, fetched_at=time_module.time() - bot.attendance_cache.ttl - 1)
+
+
+def test_repeated_attendance_on_stale_entry_is_rate_limited(bot, make_update):
+    stale_report(bot, 1)
+    scrapes = []
+
+    async def failing_scrape(user_id, on_section=None):
+        scrapes.append(user_id)
+        raise ERPScrapeError("ERP returned an error page")
+
+    bot.scrape = failing_scrape
+
+    async def run():
+        updates = [make_update(1) for _ in range(10)]
+        for update in updates:
+            await bot._handle_attendance(update, None)
+            # Let the background refresh finish before the next command
+            await asyncio.gather(*bot.background_tasks)
+        await bot.captcha_pool.stop()
+        return updates
+
+    updates = asyncio.run(run())
+    assert len(scrapes) == bot.scheduler.burst
+    assert bot.scheduler.rate_limited == 10 - bot.scheduler.burst
+    # Every command was still answered from the cache
+    assert all("Maths" in "".join(update.message.replies) for update in updates)
+    assert "refreshing" not in updates[-1].message.replies[0]
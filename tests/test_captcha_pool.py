@@ -0,0 +1,18 @@
+import asyncio
+
+from captcha_pool import CaptchaPool, FakeCaptchaSolver
+
+
+def test_idle_pool_keeps_idle_floor():
+    pool = CaptchaPool(FakeCaptchaSolver(delay=0), min_size=2, idle_size=1)
+    assert pool.target_size() == 1
+
+
+def test_warm_up_stocks_a_token_while_idle():
+    async def run():
+        pool = CaptchaPool(FakeCaptchaSolver(delay=0.01), min_size=1)
+        assert pool.target_size() == 0
+        stocked = await pool.wait_until_stocked(timeout=5, interval=0.01)
+        await pool.stop()
+        return stocked, pool.available
+    assert asyncio.run(run()) == (True, 1)
@@ -0,0 +1,26 @@
+import asyncio
+
+import httpx
+import pytest
+
+from resilience import CircuitOpen
+
+
+def test_breaker_opens_after_http_transport_failures(bot):
+    # ERP_URL points at a closed port: every login attempt is refused
+    threshold = bot.erp_breaker.failure_threshold
+
+    async def attempt():
+        with pytest.raises(httpx.TransportError):
+            await bot.fetch_attendance(1)
+
+    async def run():
+        for _ in range(threshold):
+            await attempt()
+        assert bot.erp_breaker.state == "open"
+        with pytest.raises(CircuitOpen):
+            await bot.fetch_attendance(1)
+        await bot.captcha_pool.stop()
+
+    asyncio.run(run())
+    assert bot.erp_breaker.failures == threshold
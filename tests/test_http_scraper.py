@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+from http_scraper import HttpERPScraper
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from stub_erp import StubERPServer  # noqa: E402
+
+
+def test_no_captcha_spent_when_login_page_is_unreachable():
+    scraper = HttpERPScraper(os.environ['ERP_URL'])
+    tokens_taken = []
+
+    async def get_captcha_token():
+        tokens_taken.append(1)
+        return "token"
+
+    async def run():
+        try:
+            with pytest.raises(httpx.TransportError):
+                await scraper.fetch_attendance(lambda: ("student", "secret"), get_captcha_token)
+        finally:
+            await scraper.aclose()
+
+    asyncio.run(run())
+    assert tokens_taken == []
+
+
+def test_login_against_stub_erp():
+    server = StubERPServer().start()
+    scraper = HttpERPScraper(server.login_url)
+    tokens_taken = []
+
+    async def get_captcha_token():
+        tokens_taken.append(1)
+        return "fake-captcha-token"
+
+    async def run():
+        try:
+            return await scraper.fetch_attendance(lambda: ("student", "password"), get_captcha_token)
+        finally:
+            await scraper.aclose()
+
+    try:
+        sections, session = asyncio.run(run())
+    finally:
+        server.stop()
+    assert list(sections) == ["Theory", "Practical", "Tutorial"]
+    assert session['cookies']
+    assert tokens_taken == [1]
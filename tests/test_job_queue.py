@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from job_queue import DEFERRED, FAILED, JobFailed, JobQueue, JobWorker
+from resilience import CircuitOpen
+
+
+@pytest.fixture
+def queue(tmp_path):
+    job_queue = JobQueue(tmp_path / "jobs.db", max_attempts=3, retry_delay=0)
+    yield job_queue
+    job_queue.close()
+
+
+def run_worker(queue, handle, **kwargs):
+    async def run():
+        stop = asyncio.Event()
+        worker = JobWorker(queue, handle, poll_interval=0.01, **kwargs)
+        task = asyncio.create_task(worker.run(stop))
+        await asyncio.sleep(0.2)
+        stop.set()
+        await task
+    asyncio.run(run())
+
+
+def test_open_circuit_defers_job_without_using_attempts(queue):
+    job_id = queue.enqueue(1)
+
+    async def handle(job):
+        raise CircuitOpen(30)
+
+    run_worker(queue, handle, defer=(CircuitOpen,))
+    assert queue.status(job_id)[0] == DEFERRED
+    assert queue.claim("other") is None  # hidden until the circuit may have closed
+    with pytest.raises(JobFailed) as failed:
+        asyncio.run(queue.wait(job_id, timeout=1))
+    assert failed.value.error_type == "CircuitOpen"
+    assert 25 < failed.value.retry_after <= 30
+    # Asking again joins the deferred job instead of queueing another
+    assert queue.enqueue(1) == job_id
+
+
+def test_permanent_error_fails_on_first_attempt(queue):
+    job_id = queue.enqueue(1)
+    attempts = []
+
+    class Rejected(Exception):
+        pass
+
+    async def handle(job):
+        attempts.append(job.attempts)
+        raise Rejected("bad password")
+
+    run_worker(queue, handle, permanent=(Rejected,))
+    assert attempts == [1]
+    assert queue.status(job_id)[0] == FAILED
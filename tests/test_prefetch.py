@@ -0,0 +1,31 @@
+import asyncio
+import json
+from datetime import datetime, time
+
+from prefetch import PrefetchCrawler, window_start
+
+
+def test_window_start_wraps_midnight():
+    windows = [(time(23, 0), time(2, 0))]
+    assert window_start(windows, datetime(2024, 5, 2, 1, 0)) == datetime(2024, 5, 1, 23, 0)
+    assert window_start(windows, datetime(2024, 5, 2, 3, 0)) is None
+
+
+def test_run_from_an_earlier_window_is_discarded(tmp_path):
+    state_path = tmp_path / "prefetch.json"
+    state_path.write_text(json.dumps({
+        'run_id': 'old', 'started_at': 0, 'finished_at': None,
+        'users': [1, 2], 'done': [1], 'failed': [],
+    }))
+    fetched = []
+
+    async def fetch(user_id):
+        fetched.append(user_id)
+
+    # A window covering the whole day opened at midnight, long after the old run began
+    crawler = PrefetchCrawler(fetch, lambda: [1, 2], state_path, [(time(0, 0), time(23, 59, 59))],
+                              min_interval=0)
+    asyncio.run(crawler.run_once())
+
+    assert crawler.state['run_id'] != 'old'
+    assert sorted(fetched) == [1, 2]
@@ -0,0 +1,19 @@
+import asyncio
+
+from attendance_record import AttendanceReport, SubjectAttendance
+
+
+def test_trend_subject_without_lectures(bot, make_update):
+    report = AttendanceReport()
+    report.add("Theory", [
+        SubjectAttendance("Maths", 10, 8, 2, 80.0),
+        SubjectAttendance("Ethics", 0, 0, 0, 0.0),
+    ])
+    bot.history.record(1, report)
+    update = make_update(1)
+
+    asyncio.run(bot.show_trend(update, None))
+
+    reply = "".join(update.message.replies)
+    assert "Ethics: no lectures yet" in reply
+    assert "Maths: 80.0% (8/10), can miss 0 more" in reply
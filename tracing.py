@@ -0,0 +1,212 @@
+"""Per-request tracing with nested timed spans, logged as JSON lines
+
+Every /attendance gets a trace id; work done on its behalf (queue wait,
+captcha, login, each grid, Telegram edits) is recorded as spans that
+point at their parent. Spans follow asyncio tasks through contextvars,
+so concurrent grid fetches nest correctly.
+
+Span records and the regular log files are written by QueueListener
+threads, so logging never does file I/O on the event loop.
+
+Summarize a trace log:
+    python tracing.py logs/trace.jsonl --top 20
+"""
+import argparse
+import atexit
+import json
+import logging
+import queue
+import sys
+import time as time_module
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+trace_logger = logging.getLogger('trace')
+trace_logger.setLevel(logging.INFO)
+trace_logger.propagate = False
+
+_trace_id = ContextVar('trace_id', default=None)
+_span_id = ContextVar('span_id', default=None)
+
+_listeners = []
+
+
+def queued(*handlers):
+    """Wrap handlers behind a queue drained by a background thread"""
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return QueueHandler(log_queue)
+
+
+def stop_listeners():
+    """Flush and stop every queue listener"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(stop_listeners)
+
+
+def configure(path):
+    """Write span records to `path` as JSON lines"""
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(logging.Formatter('%(message)s'))
+    trace_logger.addHandler(queued(file_handler))
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """A timed unit of work; extra attributes can be set while it runs"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attrs', 'start')
+
+    def __init__(self, trace_id, parent_id, name, attrs):
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time_module.time()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a child of the current span, starting a trace if there is none"""
+    trace_id = _trace_id.get()
+    parent_id = _span_id.get() if trace_id else None
+    current = Span(trace_id or _new_id(), parent_id, name, attrs)
+    trace_token = _trace_id.set(current.trace_id)
+    span_token = _span_id.set(current.span_id)
+    started = time_module.perf_counter()
+    status, error = 'ok', None
+    try:
+        yield current
+    except BaseException as e:
+        status, error = 'error', f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration_ms = (time_module.perf_counter() - started) * 1000
+        _span_id.reset(span_token)
+        _trace_id.reset(trace_token)
+        record = {
+            'trace_id': current.trace_id,
+            'span_id': current.span_id,
+            'parent_id': current.parent_id,
+            'name': name,
+            'start': round(current.start, 3),
+            'duration_ms': round(duration_ms, 1),
+            'status': status,
+        }
+        if error:
+            record['error'] = error
+        if current.attrs:
+            record['attrs'] = current.attrs
+        trace_logger.info(json.dumps(record, default=str))
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Start a new trace with `name` as its root span"""
+    trace_token = _trace_id.set(None)
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        _trace_id.reset(trace_token)
+
+
+def read_spans(path):
+    spans = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+    return spans
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(spans, top=20, name=None):
+    """Per-name latency aggregates and the slowest individual spans"""
+    if name:
+        spans = [s for s in spans if s['name'] == name]
+
+    by_name = defaultdict(list)
+    errors = defaultdict(int)
+    for s in spans:
+        by_name[s['name']].append(s['duration_ms'])
+        if s.get('status') == 'error':
+            errors[s['name']] += 1
+
+    aggregates = sorted(
+        (
+            {
+                'name': span_name,
+                'count': len(durations),
+                'errors': errors[span_name],
+                'p50_ms': percentile(durations, 0.5),
+                'p95_ms': percentile(durations, 0.95),
+                'max_ms': max(durations),
+                'total_ms': round(sum(durations), 1),
+            }
+            for span_name, durations in by_name.items()
+        ),
+        key=lambda row: row['total_ms'],
+        reverse=True,
+    )
+    slowest = sorted(spans, key=lambda s: s['duration_ms'], reverse=True)[:top]
+    return aggregates, slowest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the slowest spans in a trace log")
+    parser.add_argument('path', nargs='?', default='logs/trace.jsonl')
+    parser.add_argument('--top', type=int, default=20, help="number of slowest spans to list")
+    parser.add_argument('--name', help="only look at spans with this name")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of tables")
+    args = parser.parse_args(argv)
+
+    aggregates, slowest = summarize(read_spans(args.path), args.top, args.name)
+    if args.json:
+        print(json.dumps({'spans': aggregates, 'slowest': slowest}, indent=2))
+        return
+
+    print(f"{'span':<28} {'count':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for row in aggregates:
+        print(
+            f"{row['name']:<28} {row['count']:>7} {row['errors']:>6} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['max_ms']:>9.1f}"
+        )
+    print()
+    print(f"Slowest {len(slowest)} spans:")
+    for s in slowest:
+        attrs = " ".join(f"{key}={value}" for key, value in s.get('attrs', {}).items())
+        status = "" if s.get('status') == 'ok' else f" [{s.get('error', 'error')}]"
+        print(f"{s['duration_ms']:>9.1f} ms  {s['name']:<24} trace={s['trace_id']} {attrs}{status}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time as time_module
+
+logger = logging.getLogger(__name__)
+
+
+class UserStore:
+    """Encrypted ERP credentials in SQLite, one row per user
+
+    Every write is a single-row upsert in its own transaction, so a crash
+    can never corrupt other users' credentials. Rows stay encrypted until
+    a login actually needs them.
+    """
+
+    def __init__(self, path, cipher_suite):
+        self.cipher_suite = cipher_suite
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                " user_id INTEGER PRIMARY KEY,"
+                " username TEXT NOT NULL,"
+                " password TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " user_id INTEGER PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+        # Registered ids are kept in memory for cheap membership checks
+        self._user_ids = {row[0] for row in self._db.execute("SELECT user_id FROM users")}
+
+    def __contains__(self, user_id):
+        return user_id in self._user_ids
+
+    def __len__(self):
+        return len(self._user_ids)
+
+    def user_ids(self):
+        return list(self._user_ids)
+
+    def _encrypt(self, data):
+        return self.cipher_suite.encrypt(data.encode()).decode()
+
+    def _decrypt(self, encrypted_data):
+        return self.cipher_suite.decrypt(encrypted_data.encode()).decode()
+
+    def save(self, user_id, username, password):
+        """Encrypt and upsert one user's credentials"""
+        row = (user_id, self._encrypt(username), self._encrypt(password), time_module.time())
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO users (user_id, username, password, updated_at)"
+                " VALUES (?, ?, ?, ?)", row
+            )
+            # Sessions belong to the old credentials
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        self._user_ids.add(user_id)
+
+    def get_credentials(self, user_id):
+        """Decrypt and return (username, password), or None if not registered"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT username, password FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return self._decrypt(row[0]), self._decrypt(row[1])
+
+    def delete(self, user_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        self._user_ids.discard(user_id)
+
+    def save_session(self, user_id, session):
+        """Encrypt and store a user's ERP session ({'url': ..., 'cookies': [...]})"""
+        data = self._encrypt(json.dumps(session, separators=(',', ':')))
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (user_id, data, time_module.time())
+            )
+
+    def get_session(self, user_id):
+        """Return the stored ERP session for a user, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if not row:
+            return None
+        try:
+            return json.loads(self._decrypt(row[0]))
+        except Exception as e:
+            logger.error(f"Dropping unreadable session for user {user_id}: {str(e)}")
+            self.delete_session(user_id)
+            return None
+
+    def delete_session(self, user_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def migrate_from_pickle(self, pickle_path):
+        """Import the old user_data.pkl file, which was encrypted with the same key"""
+        if not os.path.exists(pickle_path):
+            return 0
+        try:
+            with open(pickle_path, 'rb') as f:
+                encrypted_data = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading legacy user data: {str(e)}")
+            os.replace(pickle_path, f"{pickle_path}.corrupt")
+            return 0
+
+        rows = [
+            (user_id, data['username'], data['password'], time_module.time())
+            for user_id, data in encrypted_data.items()
+            if user_id not in self._user_ids
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO users (user_id, username, password, updated_at)"
+                " VALUES (?, ?, ?, ?)", rows
+            )
+        self._user_ids.update(row[0] for row in rows)
+
+        os.replace(pickle_path, f"{pickle_path}.migrated")
+        logger.info(f"Migrated {len(rows)} users from {pickle_path}")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,181 @@
+import asyncio
+import hmac
+import json
+import logging
+from http import HTTPStatus
+
+from metrics import REGISTRY, WEBHOOK_UPDATES
+
+logger = logging.getLogger(__name__)
+
+# Telegram updates are small; anything bigger is not from Telegram
+MAX_BODY_BYTES = 1024 * 1024
+# Idle keep-alive connections are closed after this many seconds
+IDLE_TIMEOUT = 75
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class WebServer:
+    """HTTP/1.1 server on the event loop: Telegram webhook, /healthz and /metrics
+
+    Runs on the bot's event loop, so no extra thread is needed. Routes:
+      GET  /              liveness ping for uptime monitors
+      GET  /healthz       `health()` as JSON, 200 when its status is "ok"
+      GET  /metrics       Prometheus text format
+      POST webhook_path   a Telegram update, handed to `on_update(data)`
+
+    Updates are only accepted with the webhook secret in the
+    X-Telegram-Bot-Api-Secret-Token header. While `overloaded()` returns
+    True they get a 503 with Retry-After, and Telegram delivers them again
+    later, so a full scrape queue slows intake instead of piling up work.
+    """
+
+    def __init__(self, host='0.0.0.0', port=8080, health=None, webhook_path=None, secret_token=None,
+                 on_update=None, overloaded=None, retry_after=5):
+        self.host = host
+        self.port = port
+        self.health = health
+        self.webhook_path = webhook_path
+        self.secret_token = secret_token
+        self.on_update = on_update
+        self.overloaded = overloaded
+        self.retry_after = retry_after
+        self._server = None
+        self._connections = set()  # tasks serving a connection
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        # Port 0 picks a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Web server listening on {self.url}")
+        return self
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # Idle keep-alive connections are parked in readline(), end them here
+        # rather than leaving them to be cancelled when the loop closes
+        tasks = list(self._connections)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _serve_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), IDLE_TIMEOUT)
+                except _BadRequest as e:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, str(e), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    status, content_type, payload, extra_headers = await self._route(method, path, headers, body)
+                except Exception as e:
+                    logger.error(f"Error handling {method} {path}: {str(e)}")
+                    status, content_type, payload, extra_headers = (
+                        HTTPStatus.INTERNAL_SERVER_ERROR, 'text/plain', "Internal error", ()
+                    )
+                await self._respond(
+                    writer, status, payload, content_type, extra_headers, keep_alive, send_body=method != 'HEAD'
+                )
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # stop() is shutting the server down
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader):
+        """(method, path, headers, body), or None when the client closed the connection"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise _BadRequest("Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise _BadRequest("Bad Content-Length")
+        if length < 0 or length > MAX_BODY_BYTES:
+            raise _BadRequest("Body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target.split('?', 1)[0], headers, body
+
+    async def _respond(self, writer, status, payload, content_type='text/plain', extra_headers=(),
+                       keep_alive=True, send_body=True):
+        body = payload if isinstance(payload, bytes) else payload.encode()
+        status = HTTPStatus(status)
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            *(f"{name}: {value}" for name, value in extra_headers),
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + (body if send_body else b''))
+        await writer.drain()
+
+    async def _route(self, method, path, headers, body):
+        if self.webhook_path and path == self.webhook_path:
+            if method != 'POST':
+                return HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', "", (('Allow', 'POST'),)
+            return await self._receive_update(headers, body)
+        if method not in ('GET', 'HEAD'):
+            return HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', "", (('Allow', 'GET'),)
+        if path == '/':
+            return HTTPStatus.OK, 'text/plain', "Bot is alive!", ()
+        if path == '/metrics':
+            return HTTPStatus.OK, 'text/plain; version=0.0.4', REGISTRY.render(), ()
+        if path == '/healthz':
+            health = self.health() if self.health else {'status': 'starting'}
+            status = HTTPStatus.OK if health.get('status') == 'ok' else HTTPStatus.SERVICE_UNAVAILABLE
+            return status, 'application/json', json.dumps(health), ()
+        return HTTPStatus.NOT_FOUND, 'text/plain', "Not found", ()
+
+    async def _receive_update(self, headers, body):
+        secret = headers.get('x-telegram-bot-api-secret-token', '').encode('latin-1')
+        if not self.secret_token or not hmac.compare_digest(secret, self.secret_token.encode()):
+            WEBHOOK_UPDATES.labels(result="unauthorized").inc()
+            return HTTPStatus.UNAUTHORIZED, 'text/plain', "", ()
+        if self.on_update is None or (self.overloaded and self.overloaded()):
+            WEBHOOK_UPDATES.labels(result="rejected").inc()
+            return HTTPStatus.SERVICE_UNAVAILABLE, 'text/plain', "", (('Retry-After', str(self.retry_after)),)
+        try:
+            data = json.loads(body)
+        except ValueError:
+            WEBHOOK_UPDATES.labels(result="invalid").inc()
+            return HTTPStatus.BAD_REQUEST, 'text/plain', "Invalid JSON", ()
+        await self.on_update(data)
+        WEBHOOK_UPDATES.labels(result="accepted").inc()
+        return HTTPStatus.OK, 'text/plain', "", ()